@@ -0,0 +1,278 @@
+"""
+Benchmarks of multiplot entry points on synthetic data.
+
+Each entry point is run in each of its modes on tables of varying size and shape. Drawing is timed separately from
+rendering, which is done by the Agg backend, and peak memory and artist count are recorded. Results are written as
+JSON, so that runs can be compared over time.
+
+Run from the repository root, for instance:
+    python -m benchmarks.bench --rows 1000 100000 --categorical 2 4 --output bench.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from typing import Callable, NamedTuple
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import multiplot
+from multiplot.pairplot import eta2_coefficient
+
+
+def make_data(rows: int, numeric: int = 3, categorical: int = 2, cardinality: int = 5, hue_cardinality: int = 3,
+              seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a table of correlated numeric variables, skewed categorical variables and a categorical hue
+
+    @param rows: Number of rows
+    @param numeric: Number of numeric variables, named n0, n1...
+    @param categorical: Number of categorical variables, named c0, c1...
+    @param cardinality: Number of categories of each categorical variable
+    @param hue_cardinality: Number of categories of the hue variable, named hue
+    @param seed: Seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    hue_codes = rng.choice(hue_cardinality, size=rows, p=zipf_weights(hue_cardinality))
+    common = rng.normal(size=rows)
+    for i in range(numeric):
+        # Shares a common factor, and a shift by hue, with the other numeric variables
+        columns['n%d' % i] = .5 * common + rng.normal(size=rows) + .3 * hue_codes
+    for i in range(categorical):
+        codes = rng.choice(cardinality, size=rows, p=zipf_weights(cardinality))
+        columns['c%d' % i] = pd.Categorical.from_codes(codes, ['c%d_%d' % (i, j) for j in range(cardinality)])
+    columns['hue'] = pd.Categorical.from_codes(hue_codes, ['h%d' % j for j in range(hue_cardinality)])
+    return pd.DataFrame(columns)
+
+
+def zipf_weights(n: int) -> np.ndarray:
+    """
+    Returns the probabilities of n categories, decreasing as 1 / rank, so that some categories are rare
+    """
+    weights = 1 / np.arange(1, n + 1)
+    return weights / weights.sum()
+
+
+class Case(NamedTuple):
+    """
+    An entry point in one of its modes
+    """
+    entry: str
+    mode: str
+    # Draws a figure from the data, or only computes if it returns None
+    run: Callable[[pd.DataFrame], plt.Figure | None]
+
+
+def numeric_vars(data: pd.DataFrame) -> [str]:
+    return [var for var in data.columns if var.startswith('n')]
+
+
+def categorical_vars(data: pd.DataFrame) -> [str]:
+    return [var for var in data.columns if var.startswith('c')]
+
+
+def on_new_axes(plot: Callable[[pd.DataFrame, plt.Axes], object]) -> Callable[[pd.DataFrame], plt.Figure]:
+    def run(data: pd.DataFrame) -> plt.Figure:
+        fig, ax = plt.subplots()
+        plot(data, ax)
+        return fig
+    return run
+
+
+def on_grid(plot: Callable[[pd.DataFrame], object]) -> Callable[[pd.DataFrame], plt.Figure]:
+    def run(data: pd.DataFrame) -> plt.Figure:
+        return plot(data).figure
+    return run
+
+
+def compute_only(compute: Callable[[pd.DataFrame], object]) -> Callable[[pd.DataFrame], None]:
+    def run(data: pd.DataFrame) -> None:
+        compute(data)
+    return run
+
+
+def cases() -> [Case]:
+    """
+    Lists the benchmarked entry points, in each of their modes
+    """
+    def pairplot(**kwargs):
+        return on_grid(lambda data: multiplot.pairplot(data, hue='hue',
+                                                       vars=numeric_vars(data) + categorical_vars(data),
+                                                       rng=np.random.default_rng(0), **kwargs))
+
+    def contingencyplot(data: pd.DataFrame, ax: plt.Axes):
+        x_var, y_var = (categorical_vars(data) * 2)[:2] if categorical_vars(data) else (None, None)
+        multiplot.contingencyplot(data[x_var], data[y_var], hue=data['hue'], ax=ax, rng=np.random.default_rng(0))
+
+    def first_pair(coef_func: Callable[[pd.Series, pd.Series], float], x_vars: Callable, y_vars: Callable):
+        return compute_only(lambda data: coef_func(data[x_vars(data)[0]], data[y_vars(data)[-1]]))
+
+    return [
+        Case('pairplot', 'scatter', pairplot(density=False)),
+        Case('pairplot', 'density', pairplot(density=True)),
+        Case('pairplot', 'raster', pairplot(render='raster')),
+        Case('pairplot', 'matrix', pairplot(layout='matrix')),
+        Case('pairplot_quanti', 'scatter',
+             on_grid(lambda data: multiplot.pairplot_quanti(data[numeric_vars(data) + ['hue']], hue='hue'))),
+        Case('pairplot_quanti', 'density', on_grid(
+            lambda data: multiplot.pairplot_quanti(data[numeric_vars(data) + ['hue']], hue='hue', density=True))),
+        Case('pairplot_quali', 'scatter', on_grid(
+            lambda data: multiplot.pairplot_quali(data, hue='hue', rng=np.random.default_rng(0)))),
+        Case('pairplot_quali', 'density', on_grid(lambda data: multiplot.pairplot_quali(data, density=True))),
+        Case('contingencyplot', 'scatter', on_new_axes(contingencyplot)),
+        Case('parallelplot', 'bezier',
+             on_new_axes(lambda data, ax: multiplot.parallelplot(data, hue='hue', ax=ax, bezier=True))),
+        Case('parallelplot', 'straight',
+             on_new_axes(lambda data, ax: multiplot.parallelplot(data, hue='hue', ax=ax, bezier=False))),
+        Case('association_matrix', 'compute', compute_only(multiplot.association_matrix)),
+        Case('pearson_coefficient', 'compute',
+             first_pair(multiplot.pearson_coefficient, numeric_vars, numeric_vars)),
+        Case('contingence_coefficient', 'compute',
+             first_pair(multiplot.contingence_coefficient, categorical_vars, categorical_vars)),
+        Case('eta2_coefficient', 'compute', first_pair(eta2_coefficient, categorical_vars, numeric_vars)),
+    ]
+
+
+def count_artists(fig: plt.Figure) -> int:
+    """
+    Counts the artists drawn in the axes of a figure: collections, lines, patches, images and texts
+    """
+    return sum(len(ax.collections) + len(ax.lines) + len(ax.patches) + len(ax.images) + len(ax.texts)
+               for ax in fig.axes)
+
+
+def measure(case: Case, data: pd.DataFrame, repeat: int = 1) -> dict:
+    """
+    Runs a case and measures it
+
+    Times are the best of the repeated runs. Peak memory is traced in one more run, as tracing slows down allocations.
+
+    @param case: Entry point and mode to run
+    @param data: Table to run the case on
+    @param repeat: Number of timed runs
+    @return: Time to draw the figure, time to render it with Agg, peak memory and artist count
+    """
+    compute_times, render_times, artists = [], [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = case.run(data)
+        compute_times.append(time.perf_counter() - start)
+        if fig is not None:
+            start = time.perf_counter()
+            fig.canvas.draw()
+            render_times.append(time.perf_counter() - start)
+            artists = count_artists(fig)
+        plt.close('all')
+
+    tracemalloc.start()
+    try:
+        fig = case.run(data)
+        if fig is not None:
+            fig.canvas.draw()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        plt.close('all')
+    return {'compute_s': min(compute_times), 'render_s': min(render_times) if render_times else None,
+            'peak_mb': peak / 2 ** 20, 'artists': artists}
+
+
+def environment() -> dict:
+    """
+    Describes the machine and library versions of the run
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import matplotlib as mpl
+    import seaborn as sns
+    return {'date': datetime.datetime.now(datetime.timezone.utc).isoformat(), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'matplotlib': mpl.__version__,
+            'seaborn': sns.__version__, 'backend': matplotlib.get_backend()}
+
+
+def run(rows: [int], numeric: [int], categorical: [int], cardinality: [int], hue_cardinality: [int],
+        entries: [str] = None, modes: [str] = None, repeat: int = 1, seed: int = 0, log=sys.stderr) -> dict:
+    """
+    Runs every selected case on every combination of table parameters
+
+    @param rows: Numbers of rows
+    @param numeric: Numbers of numeric variables
+    @param categorical: Numbers of categorical variables
+    @param cardinality: Numbers of categories of categorical variables
+    @param hue_cardinality: Numbers of categories of the hue variable
+    @param entries: Entry points to run. All if None
+    @param modes: Modes to run. All if None
+    @param repeat: Number of timed runs of each case
+    @param seed: Seed of the synthetic data
+    @param log: Stream to report progress on. None for silence
+    @return: The environment of the run and one result per case and table
+    """
+    selected = [case for case in cases() if (entries is None or case.entry in entries)
+                and (modes is None or case.mode in modes)]
+    results = []
+    for n_rows, n_numeric, n_categorical, n_categories, n_hue in itertools.product(
+            rows, numeric, categorical, cardinality, hue_cardinality):
+        data = make_data(n_rows, n_numeric, n_categorical, n_categories, n_hue, seed)
+        params = {'rows': n_rows, 'numeric': n_numeric, 'categorical': n_categorical, 'cardinality': n_categories,
+                  'hue_cardinality': n_hue}
+        for case in selected:
+            result = {'entry': case.entry, 'mode': case.mode, **params}
+            try:
+                result.update(measure(case, data, repeat))
+            except Exception as error:
+                result['error'] = '%s: %s' % (type(error).__name__, error)
+                plt.close('all')
+            results.append(result)
+            if log is not None:
+                print(json.dumps(result), file=log, flush=True)
+    return {'environment': environment(), 'results': results}
+
+
+def main(argv: [str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='Numbers of rows, up to 1e7')
+    parser.add_argument('--numeric', type=int, nargs='+', default=[3], help='Numbers of numeric variables')
+    parser.add_argument('--categorical', type=int, nargs='+', default=[2], help='Numbers of categorical variables')
+    parser.add_argument('--cardinality', type=int, nargs='+', default=[5],
+                        help='Numbers of categories of categorical variables')
+    parser.add_argument('--hue-cardinality', type=int, nargs='+', default=[3],
+                        help='Numbers of categories of the hue variable')
+    parser.add_argument('--entries', nargs='+', help='Entry points to run, all by default')
+    parser.add_argument('--modes', nargs='+', help='Modes to run, all by default')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of timed runs of each case')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data')
+    parser.add_argument('--output', help='JSON file to write results to, standard output by default')
+    args = parser.parse_args(argv)
+    # Seaborn warns about ignored palettes in every cell of grids without hue
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    report = run(args.rows, args.numeric, args.categorical, args.cardinality, args.hue_cardinality, args.entries,
+                 args.modes, args.repeat, args.seed)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmarks of the time taken to import multiplot, and to reach its entry points, in fresh interpreters.
+
+Each statement is run in a new interpreter, as a short-lived worker would, and timed from inside it so that
+interpreter startup is excluded. The heavy libraries imported by the statement are listed. Statements can be run
+against several checkouts, to compare versions of the package.
+
+Run from the repository root, for instance:
+    git worktree add /tmp/multiplot-before HEAD~1
+    python -m benchmarks.import_time --paths . /tmp/multiplot-before --output import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    'import multiplot',
+    'from multiplot import association_matrix',
+    'from multiplot import association_significance',
+    # Module of the encodings shared with worker processes
+    'from multiplot.binning import BinningCache',
+    'from multiplot import parallelplot',
+    'from multiplot import pairplot',
+]
+# Libraries whose import is reported
+LIBRARIES = ['numpy', 'pandas', 'matplotlib', 'matplotlib.pyplot', 'seaborn', 'scipy', 'scipy.stats', 'statsmodels',
+             'sklearn', 'pingouin']
+
+# Run in the fresh interpreter: times the statement, and lists the libraries it imported
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'modules': len(sys.modules),
+                  'libraries': [name for name in json.loads(sys.argv[2]) if name in sys.modules]}))
+"""
+
+
+def measure(statement: str, path: str = '.', repeat: int = 5) -> dict:
+    """
+    Runs a statement in fresh interpreters, and measures it
+
+    @param statement: Python statement to time
+    @param path: Directory to import multiplot from
+    @param repeat: Number of interpreters to run the statement in
+    @return: Best and median times, number of loaded modules and imported libraries
+    """
+    # Run from the checkout, as python -c puts the working directory first on the import path
+    path = os.path.abspath(path)
+    env = dict(os.environ, PYTHONPATH=path, MPLBACKEND='Agg')
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE, statement, json.dumps(LIBRARIES)], cwd=path, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    seconds = [run['seconds'] for run in runs]
+    return {'best_s': min(seconds), 'median_s': statistics.median(seconds), 'modules': runs[-1]['modules'],
+            'libraries': runs[-1]['libraries']}
+
+
+def run(paths: [str], statements: [str] = None, repeat: int = 5, log=sys.stderr) -> dict:
+    """
+    Runs every statement against every checkout
+
+    @param paths: Directories to import multiplot from
+    @param statements: Statements to time. All of STATEMENTS if None
+    @param repeat: Number of interpreters to run each statement in
+    @param log: Stream to report progress on. None for silence
+    @return: The python version and one result per checkout and statement
+    """
+    results = []
+    for path in paths:
+        for statement in STATEMENTS if statements is None else statements:
+            result = {'path': path, 'statement': statement}
+            try:
+                result.update(measure(statement, path, repeat))
+            except subprocess.CalledProcessError as error:
+                result['error'] = error.stderr.strip().splitlines()[-1] if error.stderr.strip() else str(error)
+            results.append(result)
+            if log is not None:
+                print(json.dumps(result), file=log, flush=True)
+    return {'python': sys.version, 'results': results}
+
+
+def main(argv: [str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paths', nargs='+', default=['.'], help='Directories to import multiplot from')
+    parser.add_argument('--statements', nargs='+', help='Statements to time, all by default')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of interpreters to run each statement in')
+    parser.add_argument('--output', help='JSON file to write results to, standard output by default')
+    args = parser.parse_args(argv)
+
+    report = run(args.paths, args.statements, args.repeat)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
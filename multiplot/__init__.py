@@ -1,6 +1,82 @@
-from .coefplot import coefplot
-from .contingencyplot import contingencyplot
-from .pairplot_quanti import (pairplot_quanti, pearson_coefficient, lower_plot as lower_plot_quanti)
-from .pairplot_quali import (pairplot_quali, contingence_coefficient, lower_plot as lower_plot_quali)
-from .parallelplot import parallelplot
-from .pairplot import pairplot
+"""
+Multiplot: pair plots mixing numeric and categorical variables.
+
+Submodules are imported on first use of one of their functions, so that importing the package does not import
+matplotlib, seaborn or pandas before plotting anything.
+"""
+import importlib
+import sys
+import types
+from typing import TYPE_CHECKING
+
+# Module of each function of the package, in dependency order
+_exports = {
+    'profile': 'profiling',
+    'PanelStore': 'store',
+    'association_matrix': 'association',
+    'association_significance': 'significance',
+    'coefplot': 'coefplot',
+    'rasterplot': 'raster',
+    'contingencyplot': 'contingencyplot',
+    'pairplot_quanti': 'pairplot_quanti',
+    'pearson_coefficient': 'pairplot_quanti',
+    'lower_plot_quanti': 'pairplot_quanti',
+    'pairplot_quali': 'pairplot_quali',
+    'contingence_coefficient': 'pairplot_quali',
+    'lower_plot_quali': 'pairplot_quali',
+    'parallelplot': 'parallelplot',
+    'matrixplot': 'matrixplot',
+    'pairplot': 'pairplot',
+    'pairplot_chunked': 'streaming',
+    'render_batch': 'batch',
+    'render_groups': 'batch',
+}
+# Functions exported under another name than in their module
+_aliases = {'lower_plot_quanti': 'lower_plot', 'lower_plot_quali': 'lower_plot'}
+
+__all__ = list(_exports)
+
+if TYPE_CHECKING:
+    from .profiling import profile
+    from .store import PanelStore
+    from .association import association_matrix
+    from .significance import association_significance
+    from .coefplot import coefplot
+    from .raster import rasterplot
+    from .contingencyplot import contingencyplot
+    from .pairplot_quanti import (pairplot_quanti, pearson_coefficient, lower_plot as lower_plot_quanti)
+    from .pairplot_quali import (pairplot_quali, contingence_coefficient, lower_plot as lower_plot_quali)
+    from .parallelplot import parallelplot
+    from .matrixplot import matrixplot
+    from .pairplot import pairplot
+    from .streaming import pairplot_chunked
+    from .batch import render_batch, render_groups
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    module = importlib.import_module('.' + _exports[name], __name__)
+    value = getattr(module, _aliases.get(name, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> [str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    """
+    The package module, whose functions keep precedence over the submodules of the same name
+    """
+
+    def __setattr__(self, name: str, value):
+        # The import system binds each submodule to the package once loaded, which would hide functions like pairplot
+        # behind their module
+        if name in _exports and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,326 @@
+import numpy as np
+import pandas as pd
+
+from multiplot.columnar import Table, as_frame
+from multiplot.profiling import phase
+
+
+def association_matrix(data: Table, vars: [str] = None) -> pd.DataFrame:
+    """
+    Computes the association coefficient between every pair of variables, in a single pass over the data.
+
+    The coefficient depends on the variable types:
+    - Numeric - Numeric: Pearson's correlation coefficient, all taken from one co-moment matrix;
+    - Categorical - Categorical: Pearson's contingency coefficient, from crosstabs counted on category codes;
+    - Categorical - Numeric: One-way ANOVA eta-squared, from sums of squares grouped by category codes.
+
+    Rows with a missing value are dropped pair by pair. The diagonal is left empty.
+
+    @param data: Dataframe, structured array or Arrow table containing the variables, see as_frame
+    @param vars: List of variable names to associate. All columns if None
+    @return: Symmetric dataframe of coefficients, indexed by variable names on both axes
+    """
+    data = as_frame(data, vars)
+    vars = list(data.columns if vars is None else vars)
+    with phase('coefficient', cell='grid', rows=len(data)):
+        return AssociationStats(vars, categories_of(data, vars)).update(data).matrix()
+
+
+def categories_of(data: pd.DataFrame, vars: [str]) -> dict[str, pd.Index]:
+    """
+    Returns the categories of each categorical variable
+
+    @param data: Dataframe containing the variables
+    @param vars: List of variable names
+    """
+    return {var: data[var].cat.categories for var in vars if isinstance(data[var].dtype, pd.CategoricalDtype)}
+
+
+def category_codes(series: pd.Series, categories: pd.Index) -> np.ndarray:
+    """
+    Returns the integer code of each value with respect to the given categories, -1 for missing or unknown values
+
+    @param series: Series of values
+    @param categories: Categories, in the order of their codes
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.equals(categories):
+        # Codes of the categorical array itself, as series.cat.codes is a copy
+        return np.asarray(series.array.codes)
+    return pd.Categorical(series, categories=categories).codes
+
+
+# Number of cells above which crosstabs are counted as sparse arrays
+DENSE_CROSSTAB_CELLS = 2 ** 22
+
+
+class AssociationStats:
+    """
+    Sufficient statistics of the association coefficients, accumulated chunk by chunk.
+
+    Keeps co-moments of numeric variables, crosstabs of categorical variables, and sums of numeric variables grouped by
+    categories, so that the association matrix of a table can be computed without holding the table in memory.
+    """
+
+    def __init__(self, vars: [str], categories: dict[str, pd.Index]):
+        """
+        @param vars: List of variable names to associate
+        @param categories: Categories of each categorical variable. Other variables are numeric
+        """
+        self.vars = list(vars)
+        self.categories = categories
+        self.categorical_vars = [var for var in self.vars if var in categories]
+        self.numeric_vars = [var for var in self.vars if var not in categories]
+        n_numeric = len(self.numeric_vars)
+
+        # Numeric values are shifted by a reference, set on first update, to avoid precision loss
+        self.shift = None
+        # [i, j] entries are computed on rows where both variables i and j are present
+        self.count = np.zeros((n_numeric, n_numeric))
+        self.sums = np.zeros((n_numeric, n_numeric))
+        self.squares = np.zeros((n_numeric, n_numeric))
+        self.products = np.zeros((n_numeric, n_numeric))
+        # One crosstab per pair of categorical variables
+        self.crosstabs = {(x_var, y_var): empty_crosstab(len(categories[x_var]), len(categories[y_var]))
+                          for i, x_var in enumerate(self.categorical_vars)
+                          for y_var in self.categorical_vars[i + 1:]}
+        # Count, sum and squares of each numeric variable, grouped by the categories of each categorical variable
+        self.groups = {var: np.zeros((3, n_numeric, len(categories[var]))) for var in self.categorical_vars}
+
+    def update(self, data: pd.DataFrame) -> 'AssociationStats':
+        """
+        Adds the rows of a chunk to the statistics
+
+        @param data: Dataframe containing the variables
+        @return: The statistics themselves
+        """
+        codes = {var: category_codes(data[var], self.categories[var]) for var in self.categorical_vars}
+        return self.update_arrays(data[self.numeric_vars].to_numpy(dtype=float), codes)
+
+    def update_arrays(self, values: np.ndarray, codes: dict[str, np.ndarray]) -> 'AssociationStats':
+        """
+        Adds rows given as arrays to the statistics
+
+        @param values: Array of shape (rows, numeric variables) with the numeric variables, in order
+        @param codes: Integer category codes of each categorical variable, -1 for missing values
+        @return: The statistics themselves
+        """
+        # Numeric - Numeric: co-moments
+        ################################
+        if self.shift is None:
+            self.shift = np.zeros(len(self.numeric_vars))
+            if len(values):
+                present_any = ~np.isnan(values).all(axis=0)
+                self.shift[present_any] = np.nanmean(values[:, present_any], axis=0)
+        present = ~np.isnan(values)
+        values = np.where(present, values - self.shift, 0.)
+        present = present.astype(float)
+        self.count += present.T @ present
+        self.sums += values.T @ present
+        self.squares += (values ** 2).T @ present
+        self.products += values.T @ values
+
+        # Categorical - Categorical: crosstabs
+        #######################################
+        for (x_var, y_var), table in self.crosstabs.items():
+            # Sparse crosstabs are not added in place
+            self.crosstabs[x_var, y_var] = table + crosstab_codes(codes[x_var], codes[y_var], *table.shape)
+
+        # Categorical - Numeric: grouped sums
+        #####################################
+        for var, groups in self.groups.items():
+            groups += grouped_sums(codes[var], groups.shape[2], values, present)
+        return self
+
+    def matrix(self) -> pd.DataFrame:
+        """
+        Returns the association coefficients of the rows added so far
+
+        @return: Symmetric dataframe of coefficients, indexed by variable names on both axes
+        """
+        matrix = pd.DataFrame(np.nan, index=self.vars, columns=self.vars)
+        if self.numeric_vars:
+            matrix.loc[self.numeric_vars, self.numeric_vars] = pearson_from_moments(
+                self.count, self.sums, self.squares, self.products)
+        for (x_var, y_var), table in self.crosstabs.items():
+            matrix.loc[x_var, y_var] = matrix.loc[y_var, x_var] = contingency_from_crosstab(table)
+        if self.numeric_vars:
+            for var, groups in self.groups.items():
+                matrix.loc[var, self.numeric_vars] = matrix.loc[self.numeric_vars, var] = eta2_from_grouped_sums(
+                    *groups)
+        matrix.loc[:, :] = np.where(np.eye(len(self.vars), dtype=bool), np.nan, matrix.to_numpy())
+        return matrix
+
+
+def crosstab_codes(x_codes: np.ndarray, y_codes: np.ndarray, x_len: int, y_len: int) -> np.ndarray:
+    """
+    Counts the occurrences of each pair of categories with a single bincount.
+
+    Crosstabs of more than DENSE_CROSSTAB_CELLS cells, between variables of thousands of categories, are counted as
+    sparse arrays instead, holding only the pairs that occur.
+
+    @param x_codes: Integer category codes of the first variable, -1 for missing values
+    @param y_codes: Integer category codes of the second variable, -1 for missing values
+    @param x_len: Number of categories of the first variable
+    @param y_len: Number of categories of the second variable
+    @return: Array of shape (x_len, y_len) with the counts, dense or SciPy sparse
+    """
+    valid = (x_codes >= 0) & (y_codes >= 0)
+    pair_codes = x_codes[valid].astype(np.int64) * y_len + y_codes[valid]
+    if x_len * y_len <= DENSE_CROSSTAB_CELLS:
+        return np.bincount(pair_codes, minlength=x_len * y_len).reshape(x_len, y_len)
+    from scipy import sparse
+    cells, counts = np.unique(pair_codes, return_counts=True)
+    return sparse.csr_array((counts, np.divmod(cells, y_len)), shape=(x_len, y_len))
+
+
+def empty_crosstab(x_len: int, y_len: int) -> np.ndarray:
+    """
+    Returns a crosstab of zero counts, dense or sparse as crosstab_codes counts it
+
+    @param x_len: Number of categories of the first variable
+    @param y_len: Number of categories of the second variable
+    """
+    if x_len * y_len <= DENSE_CROSSTAB_CELLS:
+        return np.zeros((x_len, y_len), dtype=np.int64)
+    from scipy import sparse
+    return sparse.csr_array((x_len, y_len), dtype=np.int64)
+
+
+def grouped_sums(codes: np.ndarray, n_categories: int, values: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """
+    Counts, sums and sums the squares of several numeric variables grouped by categories, with a single bincount each
+
+    @param codes: Integer category codes of the categorical variable, -1 for missing values
+    @param n_categories: Number of categories of the categorical variable
+    @param values: Array of shape (rows, variables) with the numeric variables, 0 where missing
+    @param present: Array of shape (rows, variables), 1 where the numeric variable is present, else 0
+    @return: Array of shape (3, variables, n_categories) with counts, sums and sums of squares
+    """
+    valid = codes >= 0
+    codes, values, present = codes[valid].astype(np.int64), values[valid], present[valid]
+    n_vars = values.shape[1]
+    group_codes = (codes[:, np.newaxis] + n_categories * np.arange(n_vars)).ravel()
+    return np.stack([np.bincount(group_codes, weights=weights.ravel(), minlength=n_vars * n_categories)
+                    .reshape(n_vars, n_categories) for weights in (present, values, values ** 2)])
+
+
+def pearson_from_moments(count: np.ndarray, sums: np.ndarray, squares: np.ndarray, products: np.ndarray,
+                         sums_y: np.ndarray | None = None, squares_y: np.ndarray | None = None) -> np.ndarray:
+    """
+    Calculates Pearson's correlation coefficients from pairwise co-moments.
+
+    Co-moments can be stacked along leading axes, for instance one matrix per resample.
+
+    @param count: [i, j] is the number of rows where both variables are present
+    @param sums: [i, j] is the sum of variable i where both variables are present
+    @param squares: [i, j] is the sum of squares of variable i where both variables are present
+    @param products: [i, j] is the sum of products of variables i and j
+    @param sums_y: [i, j] is the sum of variable j where both variables are present. Transpose of sums if None
+    @param squares_y: [i, j] is the sum of squares of variable j where both are present. Transpose of squares if None
+    @return: Matrix of coefficients
+    """
+    sums_y = np.swapaxes(sums, -1, -2) if sums_y is None else sums_y
+    squares_y = np.swapaxes(squares, -1, -2) if squares_y is None else squares_y
+    covariance = count * products - sums * sums_y
+    variances = (count * squares - sums ** 2) * (count * squares_y - sums_y ** 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return covariance / np.sqrt(variances)
+
+
+def contingency_from_crosstab(table: np.ndarray) -> float:
+    """
+    Calculates the contingency coefficient from a crosstab of counts.
+
+    Categories that never occur are ignored. As in a chi² independence test, Yates' correction is applied to 2x2
+    tables.
+
+    @param table: 2D array of counts, dense or SciPy sparse
+    @return: Contingency coefficient
+    """
+    if not isinstance(table, np.ndarray):
+        cells = table.tocoo()
+        return float(contingency_from_cells(np.zeros(cells.nnz, dtype=np.int64), cells.row, cells.col, cells.data, 1,
+                                            *table.shape)[0])
+    return float(contingency_from_crosstabs(table[np.newaxis])[0])
+
+
+def contingency_from_crosstabs(tables: np.ndarray) -> np.ndarray:
+    """
+    Calculates the contingency coefficients of crosstabs of the same shape at once, see contingency_from_crosstab
+
+    @param tables: Array of shape (..., rows, columns) of counts
+    @return: Array of shape (...) of contingency coefficients
+    """
+    tables = np.asarray(tables, dtype=float)
+    row_totals, column_totals = tables.sum(axis=-1), tables.sum(axis=-2)
+    n = row_totals.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = row_totals[..., :, np.newaxis] * column_totals[..., np.newaxis, :] / n[..., np.newaxis, np.newaxis]
+    # Categories that never occur have no expected count, and no degree of freedom
+    dof = ((row_totals > 0).sum(axis=-1) - 1) * ((column_totals > 0).sum(axis=-1) - 1)
+    diff = expected - tables
+    yates = (dof == 1)[..., np.newaxis, np.newaxis]
+    tables = np.where(yates, tables + np.sign(diff) * np.minimum(0.5, np.abs(diff)), tables)
+    occurring = expected > 0
+    chi2 = np.where(occurring, (tables - expected) ** 2 / np.where(occurring, expected, 1), 0).sum(axis=(-2, -1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coefs = np.sqrt(chi2 / (chi2 + n * 2))
+    return np.where(n == 0, np.nan, np.where(dof == 0, 0., coefs))
+
+
+def contingency_from_cells(tables: np.ndarray, rows: np.ndarray, columns: np.ndarray, counts: np.ndarray,
+                           n_tables: int, n_rows: int, n_columns: int) -> np.ndarray:
+    """
+    Calculates the contingency coefficients of crosstabs given by their non-zero cells, see contingency_from_crosstab.
+
+    Memory and time are proportional to the number of non-zero cells, not to the number of cells: the chi² statistic
+    is n (sum of counts² / (row total * column total)) - n, summed over non-zero cells only. Tables with 2 occurring
+    rows and columns get Yates' correction, as |observed - expected| is the same on their 4 cells.
+
+    @param tables: Crosstab of each cell, from 0 to n_tables - 1
+    @param rows: Row of each cell
+    @param columns: Column of each cell
+    @param counts: Count of each cell. Cells can be given once at most
+    @param n_tables: Number of crosstabs
+    @param n_rows: Number of rows of the crosstabs
+    @param n_columns: Number of columns of the crosstabs
+    @return: Array of shape (n_tables,) of contingency coefficients
+    """
+    counts = np.asarray(counts, dtype=float)
+    occurring = counts > 0
+    tables, rows, columns = (np.asarray(array)[occurring].astype(np.int64) for array in (tables, rows, columns))
+    counts = counts[occurring]
+    row_totals = np.bincount(tables * n_rows + rows, counts, n_tables * n_rows).reshape(n_tables, n_rows)
+    column_totals = np.bincount(tables * n_columns + columns, counts, n_tables * n_columns).reshape(n_tables, n_columns)
+    n = np.bincount(tables, counts, n_tables)
+    dof = ((row_totals > 0).sum(axis=-1) - 1) * ((column_totals > 0).sum(axis=-1) - 1)
+    expected = row_totals[tables, rows] * column_totals[tables, columns] / n[tables]
+    chi2 = np.maximum(np.bincount(tables, counts ** 2 / expected, n_tables) - n, 0)
+
+    # Yates' correction of 2x2 tables: (|observed - expected| - 0.5)² times the sum of the inverse expected counts
+    deviation = np.zeros(n_tables)
+    deviation[tables] = np.abs(counts - expected)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inverse_rows = np.divide(1, row_totals, out=np.zeros(row_totals.shape), where=row_totals > 0).sum(axis=-1)
+        inverse_columns = np.divide(1, column_totals, out=np.zeros(column_totals.shape),
+                                    where=column_totals > 0).sum(axis=-1)
+        chi2 = np.where(dof == 1, np.maximum(deviation - .5, 0) ** 2 * n * inverse_rows * inverse_columns, chi2)
+        coefs = np.sqrt(chi2 / (chi2 + n * 2))
+    return np.where(n == 0, np.nan, np.where(dof == 0, 0., coefs))
+
+
+def eta2_from_grouped_sums(count: np.ndarray, total: np.ndarray, squares: np.ndarray) -> np.ndarray:
+    """
+    Calculates the one-way ANOVA eta-squared of numeric variables from their sums grouped by categories
+
+    @param count: Array of shape (..., variables, categories) with the number of rows of each group
+    @param total: Array of shape (..., variables, categories) with the sum of each group
+    @param squares: Array of shape (..., variables, categories) with the sum of squares of each group
+    @return: Array of shape (..., variables) with the eta-squared of each numeric variable
+    """
+    n, grand_total = count.sum(axis=-1), total.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        group_means_ss = np.divide(total ** 2, count, out=np.zeros_like(total), where=count > 0).sum(axis=-1)
+        ss_between = group_means_ss - grand_total ** 2 / n
+        ss_total = squares.sum(axis=-1) - grand_total ** 2 / n
+        return ss_between / ss_total
@@ -0,0 +1,289 @@
+import inspect
+import io
+import multiprocessing
+import os
+import re
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator
+
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from multiplot.columnar import Table, as_frame
+
+RESULT_COLUMNS = ['name', 'group', 'plot', 'status', 'seconds', 'path', 'image', 'error', 'traceback']
+
+# Figure reused by the plots drawn on a given axis, in the current process
+_figure = None
+
+
+def render_groups(data: Table, by: str | list[str], plots: dict[str, dict], **options) -> pd.DataFrame:
+    """
+    Renders the same plots for each group of rows of a table, for instance one pairplot and one parallelplot per
+    customer segment.
+
+    >>> render_groups(data, by='segment', plots={'pairplot': dict(vars=vars, hue='cut', density=True),
+    ...                                          'parallelplot': dict(hue='cut')}, output_dir='plots', n_jobs=-1)
+
+    @param data: Dataframe, structured array or Arrow table, see as_frame
+    @param by: Name of the variable, or list of names of the variables, whose values define the groups
+    @param plots: Keyword arguments of each plot, by name of the multiplot function drawing it
+    @param options: Options of render_batch
+    @return: One row per image, see render_batch. Images are named after their group and plot
+    """
+    data = as_frame(data)
+    positions = data.groupby(by, observed=True, sort=True).indices
+    return render_batch(group_specs(data, positions, plots), total=len(positions) * len(plots), **options)
+
+
+def group_specs(data: pd.DataFrame, positions: dict, plots: dict[str, dict]) -> Iterator[dict]:
+    """
+    Yields the plot specs of each group, slicing the rows of a group only when its specs are rendered
+
+    @param data: Dataframe
+    @param positions: Positions of the rows of each group, by group key
+    @param plots: Keyword arguments of each plot, by name of the multiplot function drawing it
+    """
+    for group, rows in positions.items():
+        group_data = data.take(rows)
+        label = '-'.join(str(key) for key in group) if isinstance(group, tuple) else str(group)
+        for plot, kwargs in plots.items():
+            yield {'name': '%s_%s' % (label, plot), 'group': group, 'plot': plot, 'data': group_data,
+                   'kwargs': kwargs}
+
+
+def render_batch(specs: Iterable[dict], format: str = 'png', output_dir: str | os.PathLike | None = None,
+                 n_jobs: int = 1, dpi: float = 100, max_tasks_per_child: int | None = 50,
+                 progress: Callable[[dict, int, int | None], None] | None = None,
+                 total: int | None = None) -> pd.DataFrame:
+    """
+    Renders many plots to PNG or SVG images, in a pool of worker processes on the Agg backend.
+
+    Each spec is a dict with:
+    - 'name': name of the image, and of its file in output_dir;
+    - 'plot': name of a multiplot function, like 'pairplot' or 'parallelplot', or a function picklable by worker
+    processes, drawing a grid or on the axis passed as ax;
+    - 'data': table passed as first argument;
+    - 'kwargs': other keyword arguments of the function. Optional;
+    - 'group': reported as it is. Optional.
+
+    Plots drawing on an axis reuse a single figure per process, cleared between plots, and every other figure is
+    closed as soon as it is rendered, whether the plot succeeded or not. Workers are replaced after
+    max_tasks_per_child plots, bounding the memory they can leak, and at most two specs per worker are sent ahead,
+    so that specs generated lazily are sliced only when needed.
+
+    Failing plots do not stop the batch: their error is reported in their row. Plots whose worker died are rendered
+    once more, one at a time in a new pool, as they may have died with the worker of another plot.
+
+    Workers are started by spawning new interpreters, which import the main module: scripts calling render_batch with
+    n_jobs > 1 need the usual if __name__ == '__main__' guard. They inherit no pyplot state nor figure from the calling
+    process. With n_jobs=1, plots are rendered in the current process on the Agg backend, and its former backend is
+    restored afterwards.
+
+    @param specs: Plot specs, possibly generated lazily
+    @param format: 'png' or 'svg'
+    @param output_dir: Directory to write images into, created if needed. If None, images are returned as bytes
+    @param n_jobs: Number of worker processes. 1 renders in the current process, -1 uses all cores
+    @param dpi: Resolution of PNG images
+    @param max_tasks_per_child: Number of plots a worker renders before being replaced. None to keep workers
+    @param progress: Function called after each plot with its result row, the number of plots rendered and the total
+    number of plots, if known
+    @param total: Number of specs, passed to progress. Read from specs if they have a length
+    @return: One row per spec, in the order they were given: name, group, plot name, status ('ok' or 'error'), seconds
+    taken, path of the file or image bytes, error message and traceback
+    """
+    if format not in ('png', 'svg'):
+        raise ValueError("Images are rendered to 'png' or 'svg', not %r" % format)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    total = len(specs) if total is None and hasattr(specs, '__len__') else total
+    options = {'format': format, 'output_dir': None if output_dir is None else os.fspath(output_dir), 'dpi': dpi}
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    results = {}
+
+    def report(index: int, result: dict):
+        results[index] = result
+        if progress is not None:
+            progress(result, len(results), total)
+
+    if n_jobs == 1:
+        backend = plt.get_backend()
+        _init_worker()
+        try:
+            for index, spec in enumerate(specs):
+                report(index, render_spec(spec, **options))
+        finally:
+            release_figure()
+            plt.switch_backend(backend)
+    else:
+        pool_options = {} if max_tasks_per_child is None else {'max_tasks_per_child': max_tasks_per_child}
+        _render_in_pool(specs, options, n_jobs, pool_options, report)
+    return pd.DataFrame([results[index] for index in sorted(results)], columns=RESULT_COLUMNS)
+
+
+def _render_in_pool(specs: Iterable[dict], options: dict, n_jobs: int, pool_options: dict,
+                    report: Callable[[int, dict], None]):
+    # Specs to render, with whether they can be rendered again if their worker dies
+    items = ((index, spec, True) for index, spec in enumerate(specs))
+    retries, pending, executor = [], {}, None
+    try:
+        while True:
+            # Plots rendered again are rendered alone, so that the one killing its worker fails alone
+            alone = any(not retry for _, _, retry in pending.values()) or bool(retries and pending)
+            item = None if len(pending) >= 2 * n_jobs or alone else retries.pop(0) if retries else next(items, None)
+            if item is None:
+                if not pending:
+                    break
+                retries += _collect(wait(pending, return_when=FIRST_COMPLETED).done, pending, report)
+                continue
+            index, spec, _ = item
+            try:
+                if executor is None:
+                    raise BrokenProcessPool
+                future = executor.submit(render_spec, spec, **options)
+            except BrokenProcessPool:
+                # A dead worker, killed for lack of memory for instance, breaks the pool: the next plots are rendered
+                # by a new one
+                if executor is not None:
+                    executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=_init_worker, **pool_options)
+                future = executor.submit(render_spec, spec, **options)
+            pending[future] = item
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def _collect(done: set, pending: dict, report: Callable[[int, dict], None]) -> list[tuple[int, dict, bool]]:
+    """
+    Reports the results of done futures, and returns the specs to render again
+    """
+    retries = []
+    for future in done:
+        index, spec, retry = pending.pop(future)
+        try:
+            result = future.result()
+        except BrokenProcessPool as error:
+            # Plots rendered alongside the one killing its worker fail with it: they are rendered once more, alone
+            if retry:
+                retries.append((index, spec, False))
+                continue
+            result = failed(spec, error)
+        except Exception as error:
+            # The spec or its result could not be pickled
+            result = failed(spec, error)
+        report(index, result)
+    return retries
+
+
+def render_spec(spec: dict, format: str = 'png', output_dir: str | None = None, dpi: float = 100) -> dict:
+    """
+    Draws and renders one plot spec, see render_batch, closing its figures whatever happens
+
+    @return: Result row of the spec
+    """
+    start = time.perf_counter()
+    figure, opened = None, set(plt.get_fignums())
+    try:
+        plot = resolve_plot(spec['plot'])
+        kwargs = dict(spec.get('kwargs') or {})
+        if 'ax' in inspect.signature(plot).parameters and 'ax' not in kwargs:
+            figure = reused_figure()
+            kwargs['ax'] = figure.add_subplot()
+        drawn = plot(spec['data'], **kwargs)
+        figure = getattr(drawn, 'figure', None) or figure or plt.gcf()
+        result = {'name': spec['name'], 'group': spec.get('group'), 'plot': plot_name(spec['plot']), 'status': 'ok',
+                  'path': None, 'image': None, 'error': None, 'traceback': None}
+        if output_dir is None:
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format=format, dpi=dpi)
+            result['image'] = buffer.getvalue()
+        else:
+            result['path'] = os.path.join(output_dir, '%s.%s' % (file_name(spec['name']), format))
+            figure.savefig(result['path'], format=format, dpi=dpi)
+    except Exception as error:
+        result = failed(spec, error)
+    finally:
+        close_figures(opened)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def failed(spec: dict, error: BaseException) -> dict:
+    """
+    Result row of a spec whose plot failed
+    """
+    return {'name': spec.get('name'), 'group': spec.get('group'), 'plot': plot_name(spec.get('plot')),
+            'status': 'error', 'seconds': 0., 'path': None, 'image': None,
+            'error': '%s: %s' % (type(error).__name__, error),
+            'traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__))}
+
+
+def resolve_plot(plot: str | Callable) -> Callable:
+    """
+    Returns the function drawing a plot, given by its name in multiplot or as a function
+    """
+    if callable(plot):
+        return plot
+    import multiplot
+    if plot not in multiplot.__all__:
+        raise ValueError('Unknown plot %r: pass the name of a multiplot function, or a function' % plot)
+    return getattr(multiplot, plot)
+
+
+def plot_name(plot: str | Callable | None) -> str | None:
+    return plot if plot is None or isinstance(plot, str) else getattr(plot, '__name__', repr(plot))
+
+
+def file_name(name: str) -> str:
+    """
+    Replaces the characters of an image name that are not safe in file names
+    """
+    return re.sub(r'[^\w.=+-]+', '_', str(name)).strip('.') or '_'
+
+
+# Figures of the current process
+#################################
+def reused_figure() -> plt.Figure:
+    """
+    Returns the figure of the current process for plots drawn on an axis, cleared and made current, so that plots
+    drawing through pyplot, like parallelplot's color bar, draw on it
+    """
+    global _figure
+    if _figure is None or not plt.fignum_exists(_figure.number):
+        _figure = plt.figure()
+    _figure.clear()
+    plt.figure(_figure.number)
+    return _figure
+
+
+def close_figures(kept: set[int] = frozenset()):
+    """
+    Closes every figure but the reused one and the kept ones, and clears the reused one
+
+    @param kept: Numbers of the figures to keep, like those opened before plotting in the current process
+    """
+    for number in set(plt.get_fignums()) - set(kept):
+        if _figure is None or number != _figure.number:
+            plt.close(number)
+    if _figure is not None:
+        _figure.clear()
+
+
+def release_figure():
+    """
+    Closes the reused figure
+    """
+    global _figure
+    if _figure is not None:
+        plt.close(_figure)
+        _figure = None
+
+
+def _init_worker():
+    # Workers only render to files or bytes
+    plt.switch_backend('Agg')
@@ -0,0 +1,183 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from multiplot.association import AssociationStats, category_codes
+from multiplot.columnar import float_values
+from multiplot.histograms import numeric_edges, categorical_edges, bin_index, hist1d_counts, hist2d_counts
+from multiplot.profiling import phase
+from multiplot.store import fingerprint
+
+
+class Column(NamedTuple):
+    """
+    A variable reduced to NumPy arrays: values of a numeric variable, or integer codes of a categorical one, and the
+    bin of each row
+    """
+    values: np.ndarray
+    categories: pd.Index | None = None
+    binned: np.ndarray | None = None
+
+
+class BinningCache:
+    """
+    Encodings of the variables of a dataframe, computed once per variable and shared by all the cells of a grid.
+
+    Each variable appears in 2(n-1)+1 cells of a pair grid: its category codes, bin edges and per-row bin index are
+    computed on first use, then reused by the lower, diagonal and upper cells. Histograms are then bincounts over
+    cached indices.
+    """
+
+    def __init__(self, data: pd.DataFrame, hue: str | None = None, bins: int = 20,
+                 categories: dict[str, pd.Index] = None, edges: dict[str, np.ndarray] = None):
+        """
+        @param data: Dataframe containing the variables
+        @param hue: Categorical variable name to split histograms with
+        @param bins: Number of bins of numeric variables
+        @param categories: Categories of categorical variables, by name. Read from categorical dtypes if not given
+        @param edges: Bin edges of numeric variables, by name. Spanning the range of each variable if not given
+        """
+        self.data = data
+        self.hue = hue
+        self.bins = bins
+        self.categories = {var: pd.Index(cats) for var, cats in (categories or {}).items()}
+        self._edges = dict(edges or {})
+        self._columns = {}
+        self._fingerprints = {}
+
+    def column(self, var: str) -> Column:
+        """
+        Returns the encoded column of a variable, computing it on first call
+
+        @param var: Variable name
+        """
+        if var not in self._columns:
+            with phase('binning', cell='variable', x=var, rows=len(self.data)):
+                self._columns[var] = self._encode(var)
+        return self._columns[var]
+
+    def _encode(self, var: str) -> Column:
+        series = self.data[var]
+        categories = self.variable_categories(var)
+        if categories is not None:
+            codes = category_codes(series, categories)
+            return Column(codes, categories, codes)
+        values = float_values(series)
+        return Column(values, None, bin_index(values, self.edges(var, values)))
+
+    def variable_categories(self, var: str) -> pd.Index | None:
+        """
+        Returns the categories of a variable without encoding it, or None if it is numeric
+
+        @param var: Variable name
+        """
+        if var not in self.categories:
+            series = self.data[var]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self.categories[var] = series.cat.categories
+            elif var == self.hue:
+                # Hue is always categorical, its values are coded in sorted order
+                self.categories[var] = pd.Index(sorted(series.dropna().unique()))
+        return self.categories.get(var)
+
+    def fingerprint(self, var: str) -> str:
+        """
+        Returns the fingerprint of a variable and of the categories it is encoded with, see multiplot.store
+
+        @param var: Variable name
+        """
+        if var not in self._fingerprints:
+            self._fingerprints[var] = fingerprint(self.data[var], self.variable_categories(var))
+        return self._fingerprints[var]
+
+    def edges(self, var: str, values: np.ndarray | None = None) -> np.ndarray:
+        """
+        Returns the bin edges of a variable: centered on category codes, or equally spaced over the numeric range
+
+        @param var: Variable name
+        @param values: Values of the numeric variable, if already at hand
+        """
+        if var not in self._edges:
+            if self.variable_categories(var) is not None:
+                self._edges[var] = categorical_edges(len(self.variable_categories(var)))
+            else:
+                values = float_values(self.data[var]) if values is None else values
+                finite = values[np.isfinite(values)]
+                self._edges[var] = numeric_edges(finite.min(), finite.max(), self.bins) if len(finite) \
+                    else numeric_edges(0, 1, self.bins)
+        return self._edges[var]
+
+    def columns(self, vars: [str]) -> dict[str, Column]:
+        """
+        Returns the encoded columns of several variables, and of hue if any
+
+        @param vars: List of variable names
+        """
+        vars = list(dict.fromkeys(list(vars) + ([self.hue] if self.hue is not None else [])))
+        return {var: self.column(var) for var in vars}
+
+    @property
+    def hue_order(self) -> pd.Index | None:
+        return None if self.hue is None else self.variable_categories(self.hue)
+
+    @property
+    def hue_codes(self) -> np.ndarray | None:
+        return None if self.hue is None else self.column(self.hue).values
+
+    @property
+    def n_hue(self) -> int:
+        return 1 if self.hue is None else len(self.hue_order)
+
+    def hist1d(self, var: str) -> np.ndarray:
+        """
+        Counts the rows of each bin of a variable, for each hue value
+
+        @param var: Variable name
+        @return: Array of shape (n_hue, bins)
+        """
+        return hist1d_counts(self.column(var).binned, len(self.edges(var)) - 1, self.hue_codes, self.n_hue)
+
+    def hist2d(self, x_var: str, y_var: str) -> np.ndarray:
+        """
+        Counts the rows of each 2D bin of two variables, for each hue value, with a single bincount
+
+        @param x_var: Abscissa variable name
+        @param y_var: Ordinate variable name
+        @return: Array of shape (n_hue, x bins, y bins)
+        """
+        return hist2d_counts(self.column(x_var).binned, self.column(y_var).binned, len(self.edges(x_var)) - 1,
+                             len(self.edges(y_var)) - 1, self.hue_codes, self.n_hue)
+
+    def update_stats(self, stats: AssociationStats) -> AssociationStats:
+        """
+        Adds the rows of the dataframe to association statistics, from the cached codes and values
+
+        @param stats: Statistics of variables of the dataframe
+        @return: The statistics themselves
+        """
+        values = [self.column(var).values for var in stats.numeric_vars]
+        return stats.update_arrays(np.column_stack(values) if values else np.empty((len(self.data), 0)),
+                                   {var: self.column(var).values for var in stats.categorical_vars})
+
+    def association_stats(self, vars: [str]) -> AssociationStats:
+        """
+        Returns the association statistics of every pair of variables, which more rows can be added to
+
+        @param vars: List of variable names
+        """
+        vars = list(vars)
+        stats = AssociationStats(vars, {var: self.column(var).categories for var in vars
+                                        if self.column(var).categories is not None})
+        with phase('coefficient', cell='grid', rows=len(self.data)):
+            return self.update_stats(stats)
+
+    def association_matrix(self, vars: [str]) -> pd.DataFrame:
+        """
+        Returns the association coefficients between every pair of variables, see multiplot.association_matrix
+
+        @param vars: List of variable names
+        """
+        stats = self.association_stats(vars)
+        with phase('coefficient', cell='grid'):
+            return stats.matrix()
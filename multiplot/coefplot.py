@@ -1,20 +1,27 @@
 from typing import Callable
 import matplotlib as mpl
+import numpy as np
 import matplotlib.pyplot as plt
 
 import pandas as pd
 from matplotlib.patches import Rectangle
 
+from multiplot.profiling import phase
+
 
 def coefplot(x: pd.Series, y: pd.Series, hue: pd.Series | None = None, bg_color: tuple[float, ...] = (0, 0, 0, 1),
              fg_color: tuple[float, ...] = (0, 0, 0, .1), cmap: str = 'RdBu_r', ax: plt.axis = None,
-             coef_func: Callable[[pd.Series, pd.Series], float] = None, **kwargs):
+             coef_func: Callable[[pd.Series, pd.Series], float] = None, coef: float | None = None,
+             p_value: float | None = None, ci: tuple[float, float] | None = None, alpha: float = .05, **kwargs):
     """
     Displays an association coefficient between x and y as a label in a rectangle.
 
     If hue is None, the rectangle color will be linked to the coefficient, with respect to cmap.
     Else, the rectangle size will be linked to the coefficient.
 
+    Given a p-value, the rectangle of a coefficient that is not significant is hatched. Given a confidence interval,
+    it is written under the coefficient.
+
     @param x: Abscissa variable series
     @param y: Ordinate variable series
     @param hue: Categorical variable to distinguish points with
@@ -23,33 +30,92 @@ def coefplot(x: pd.Series, y: pd.Series, hue: pd.Series | None = None, bg_color:
     @param cmap: Color scale of to map coefficients to rectangle colors. (hue = None)
     @param ax: Matplotlib axis on with add the coefficient plot
     @param coef_func: Function to calculate coefficient
+    @param coef: Precomputed coefficient. If None, it is calculated with coef_func
+    @param p_value: P-value of the coefficient, see association_significance
+    @param ci: Bounds of the confidence interval of the coefficient
+    @param alpha: Significance level, under which p-values are significant
     """
     ax = plt.gca() if ax is None else ax
 
     # Adding the coefficient as a label
     #######################################
-    coef = coef_func(x, y)
-    ax.annotate('%.2f' % coef, xy=(0.5, 0.5), xycoords='axes fraction', ha='center', va='center')
+    if coef is None:
+        with phase('coefficient'):
+            coef = coef_func(x, y)
+    label = '%.2f' % coef if ci is None or np.isnan(ci[0]) else '%.2f\n[%.2f, %.2f]' % (coef, *ci)
+    ax.annotate(label, xy=(0.5, 0.5), xycoords='axes fraction', ha='center', va='center')
     ax.axis('off')
 
     # Setting the rectangle around coefficient
     ###############################################
     x_min, x_max, y_min, y_max = plt.axis()
+    if hue is not None:
+        # Rectangle size is mapped from R2, it's color is constant and it has a background
+        bg_rect = Rectangle((x_min, y_min), x_max - x_min, y_max - y_min, fill=False, color=bg_color)
+        ax.add_patch(bg_rect)
+
+    # Adding the foreground rectangle
+    #################################
+    bounds, fg_color = coef_rectangle(coef, (x_min, x_max, y_min, y_max), hue is not None, fg_color, cmap)
+    if p_value is None or p_value < alpha:
+        coef_rect = Rectangle(bounds[:2], *bounds[2:], fill=True, color=fg_color)
+    else:
+        # Hatches are drawn with the edge color, the edge itself being hidden
+        coef_rect = Rectangle(bounds[:2], *bounds[2:], fill=True, facecolor=fg_color, edgecolor=(0, 0, 0, .4),
+                              linewidth=0, hatch='///')
+    ax.add_patch(coef_rect)
+
+
+def coef_rectangle(coef: float, limits: tuple[float, float, float, float], hue: bool = False,
+                   fg_color: tuple[float, ...] = (0, 0, 0, .1),
+                   cmap: str = 'RdBu_r') -> tuple[tuple[float, float, float, float], tuple[float, ...]]:
+    """
+    Returns the foreground rectangle of a coefficient plot.
+
+    If hue is False, the rectangle fills the axis, and its color is mapped from the coefficient with respect to cmap.
+    Else, its size is mapped from the coefficient, and its color is fg_color.
+
+    Coefficients and limits can also be arrays, giving the rectangles of several cells at once.
+
+    @param coef: Association coefficient
+    @param limits: Limits of the axis: x_min, x_max, y_min, y_max
+    @param hue: Whether the plot distinguishes points with hue
+    @param fg_color: Color of the coefficient rectangle. (hue = True)
+    @param cmap: Color scale of to map coefficients to rectangle colors. (hue = False)
+    @return: Bounds of the rectangle (x, y, width, height), and its color
+    """
+    x_min, x_max, y_min, y_max = limits
     x_spread, y_spread = (x_max - x_min), (y_max - y_min)
-    if hue is None:
-        # Rectangle size is maximal, and its color is mapped from coefficient with respect to cmap
+    if not hue:
         width, height = x_spread, y_spread
         norm = mpl.colors.Normalize(vmin=-1, vmax=1)
         # noinspection PyTypeChecker
         fg_color = mpl.cm.ScalarMappable(norm=norm, cmap=cmap).to_rgba(coef)
     else:
-        # Rectangle size is mapped from R2, it's color is constant and it has a background
-        width, height = max(abs(coef), .2) * x_spread * .9, max(abs(coef), .2) * y_spread * .9
-        bg_rect = Rectangle((x_min, y_min), x_spread, y_spread, fill=False, color=bg_color)
-        ax.add_patch(bg_rect)
-
-    # Adding the foreground rectangle
-    #################################
+        size = np.maximum(np.abs(coef), .2) * .9
+        width, height = size * x_spread, size * y_spread
     x_center, y_center = (x_max + x_min) / 2, (y_max + y_min) / 2
-    coef_rect = Rectangle((x_center - width / 2, y_center - height / 2), width, height, fill=True, color=fg_color)
-    ax.add_patch(coef_rect)
+    return (x_center - width / 2, y_center - height / 2, width, height), fg_color
+
+
+def update_coefplot(coef: float, hue: bool = False, cmap: str = 'RdBu_r', ax: plt.Axes = None):
+    """
+    Updates in place the label and rectangles drawn by coefplot, for a new coefficient and the current axis limits.
+
+    The significance of the former coefficient no longer holds: its confidence interval and hatches are removed.
+
+    @param coef: Association coefficient
+    @param hue: Whether the plot was drawn with a hue
+    @param cmap: Color scale of to map coefficients to rectangle colors. (hue = False)
+    @param ax: Matplotlib axis of the coefficient plot
+    """
+    ax = plt.gca() if ax is None else ax
+    ax.texts[0].set_text('%.2f' % coef)
+    limits = ax.axis()
+    coef_rect = ax.patches[-1]
+    if hue:
+        ax.patches[0].set_bounds(limits[0], limits[2], limits[1] - limits[0], limits[3] - limits[2])
+    bounds, fg_color = coef_rectangle(coef, limits, hue, coef_rect.get_facecolor(), cmap)
+    coef_rect.set_bounds(*bounds)
+    coef_rect.set_color(fg_color)
+    coef_rect.set_hatch(None)
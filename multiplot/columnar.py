@@ -0,0 +1,187 @@
+from typing import TYPE_CHECKING, Union
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Tables accepted by entry points: dataframes, NumPy structured arrays and Arrow tables or record batches
+Table = Union[pd.DataFrame, np.ndarray, 'pa.Table', 'pa.RecordBatch']
+
+
+def as_frame(data: Table, vars: [str] = None) -> pd.DataFrame:
+    """
+    Returns a table as a dataframe whose columns share the buffers of the table, or are converted once into a compact
+    form: float32 values for numeric columns, and smallest-width integer codes with a categories index for categorical
+    ones.
+
+    - Dataframes are returned as they are, their columns being already shared;
+    - Floating fields of structured arrays are viewed, not copied. Other numeric fields are converted to float32, and
+    boolean, string or object fields to categorical codes, in sorted order;
+    - Floating Arrow columns are read without copy when they have a single chunk and no null values. Dictionary
+    columns keep their dictionary as categories, and string or boolean columns are dictionary encoded, in sorted order.
+
+    @param data: Dataframe, NumPy structured array, or Arrow table or record batch. Requires pyarrow for the latter
+    @param vars: Names of the columns to convert. All columns if None
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    if isinstance(data, np.ndarray):
+        if data.dtype.names is None:
+            raise TypeError('Only structured arrays, with named fields, can be plotted')
+        names = data.dtype.names if vars is None else vars
+        columns = {name: compact_column(data[name]) for name in names}
+    elif hasattr(data, 'schema') and hasattr(data, 'column'):
+        names = data.schema.names if vars is None else vars
+        columns = {name: arrow_column(data.column(name)) for name in names}
+    else:
+        raise TypeError('Cannot plot a %s: pass a dataframe, a structured array or an Arrow table'
+                        % type(data).__name__)
+    # Columns are kept as separate blocks, instead of being consolidated into a copy
+    return pd.DataFrame(columns, copy=False)
+
+
+def compact_column(values: np.ndarray) -> np.ndarray | pd.Categorical:
+    """
+    Converts a column to its compact form, see as_frame. Floating values are returned as they are
+
+    @param values: 1D array of values
+    """
+    if values.dtype.kind == 'f':
+        return values
+    if values.dtype.kind in 'iu':
+        return values.astype(np.float32)
+    codes, categories = pd.factorize(values, sort=True)
+    return categorical(codes, categories)
+
+
+def categorical(codes: np.ndarray, categories) -> pd.Categorical:
+    """
+    Builds a categorical column on integer codes of the smallest width, without copying them if they already are
+
+    @param codes: Integer category codes, -1 for missing values
+    @param categories: Categories, in the order of their codes
+    """
+    categories = pd.Index(categories)
+    return pd.Categorical.from_codes(smallest_codes(codes, len(categories)), dtype=pd.CategoricalDtype(categories))
+
+
+def smallest_codes(codes: np.ndarray, n_categories: int) -> np.ndarray:
+    """
+    Casts integer category codes to the smallest signed integer type holding every code and -1
+
+    @param codes: Integer category codes, -1 for missing values
+    @param n_categories: Number of categories
+    """
+    return np.asarray(codes).astype(np.min_scalar_type(-max(n_categories, 1)), copy=False)
+
+
+# Categories of high cardinality
+#################################
+def top_categories(series: pd.Series, max_categories: int) -> pd.Index:
+    """
+    Returns the max_categories most frequent categories of a categorical variable, in their order. All its categories
+    if there are no more
+
+    @param series: Categorical series
+    @param max_categories: Number of categories to keep
+    """
+    categories = series.cat.categories
+    if len(categories) <= max_categories:
+        return categories
+    codes = np.asarray(series.array.codes)
+    counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+    return categories[np.sort(np.argsort(-counts, kind='stable')[:max_categories])]
+
+
+def fold_categories(data: pd.DataFrame, kept: dict[str, pd.Index], other: str = 'other') -> pd.DataFrame:
+    """
+    Encodes variables with the categories kept for them, and one last category counting the values of the others
+
+    Kept categories are labelled as strings, so that they can share an axis with the label of the other ones.
+
+    @param data: Dataframe containing the variables
+    @param kept: Categories kept for each variable to encode, see top_categories
+    @param other: Label of the category counting the values of the others
+    @return: Dataframe sharing the other columns of data
+    """
+    if not kept:
+        return data
+    data = data.copy(deep=False)
+    for var, categories in kept.items():
+        # Codes of the values in kept categories, -1 for the others, which pandas no longer accepts in a Categorical
+        if isinstance(data[var].dtype, pd.CategoricalDtype):
+            values = np.asarray(data[var].array.codes)
+            codes = np.where(values >= 0, categories.get_indexer(data[var].cat.categories)[values], -1)
+        else:
+            codes = categories.get_indexer(data[var])
+        codes = np.where((codes < 0) & data[var].notna().to_numpy(), len(categories), codes)
+        labels = categories if categories.inferred_type == 'string' else categories.astype(str)
+        if other in labels:
+            raise ValueError('%r is a category of %r: pass another label for the other categories, like other_label'
+                             % (other, var))
+        data[var] = categorical(codes, labels.append(pd.Index([other])))
+    return data
+
+
+def arrow_column(column) -> np.ndarray | pd.Categorical:
+    """
+    Converts an Arrow array or chunked array to its compact form, see as_frame
+
+    @param column: Arrow array or chunked array
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    kind = column.type
+    if pa.types.is_floating(kind):
+        # Null values are read as NaN
+        return column.to_numpy(zero_copy_only=False) if column.null_count else column.to_numpy()
+    if pa.types.is_integer(kind) or pa.types.is_decimal(kind):
+        return pc.cast(column, pa.float32()).to_numpy(zero_copy_only=False)
+    if not pa.types.is_dictionary(kind):
+        # Chunks are given one dictionary, which is then sorted, as pandas codes values in sorted order
+        column = pc.dictionary_encode(column)
+        if isinstance(column, pa.ChunkedArray):
+            # Chunks may be encoded with dictionaries of their own: their indices are remapped to a common one
+            column = column.unify_dictionaries()
+        chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+        dictionary = np.asarray(chunks[0].dictionary.to_pylist() if chunks else [], dtype=object)
+        categories, rank = np.unique(dictionary, return_inverse=True)
+        codes = arrow_indices(column)
+        if len(rank):
+            codes = np.where(codes >= 0, rank[codes], -1)
+        return categorical(codes, categories)
+    if isinstance(column, pa.ChunkedArray):
+        column = column.unify_dictionaries()
+        dictionary = column.chunks[0].dictionary if column.num_chunks else pa.array([], kind.value_type)
+    else:
+        dictionary = column.dictionary
+    return categorical(arrow_indices(column), dictionary.to_pylist())
+
+
+def arrow_indices(column) -> np.ndarray:
+    """
+    Returns the indices of an Arrow dictionary array or chunked array, -1 for null values
+
+    @param column: Arrow dictionary array, or chunked array whose chunks share their dictionary
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+    indices = [pc.fill_null(chunk.indices, -1).to_numpy(zero_copy_only=False) for chunk in chunks]
+    return np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+
+
+def float_values(series: pd.Series) -> np.ndarray:
+    """
+    Returns the values of a numeric column as floats, without copy if they already are: float32 otherwise
+
+    @param series: Numeric series
+    """
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind == 'f':
+        return series.to_numpy()
+    return series.to_numpy(dtype=np.float32, na_value=np.nan)
+
@@ -1,12 +1,70 @@
 import pandas as pd
 import numpy as np
-from numpy.random import uniform
 import seaborn as sns
+import matplotlib as mpl
 import matplotlib.pyplot as plt
-from typing import Union
+from multiplot.raster import rasterplot
+from multiplot.binning import BinningCache, Column
+from multiplot.lod import ZoomScatter, check_lod
+from multiplot.sampling import strata_codes, stratified_sample
+from multiplot.profiling import phase
 
 
-def x_noise_hue(x: pd.Series, y: pd.Series, hue: pd.Series, square_len: float) -> pd.Series:
+def category_codes(series: pd.Series) -> np.ndarray:
+    """
+    Return the integer code of each value, -1 for missing values. Non categorical values are coded in sorted order
+
+    @param series: Series to code
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return np.asarray(series.array.codes)
+    return pd.factorize(series, sort=True)[0]
+
+
+def hue_jitter(x_codes: np.ndarray, y_codes: np.ndarray, hue_codes: np.ndarray, square_len: float,
+               rng: np.random.Generator) -> np.ndarray:
+    """
+    Return a noise around 0 for each point, so that in each (x, y) cell, each hue value gets a share of the square
+    proportional to its count, in hue order
+
+    Works only on integer codes: counts are taken with a single bincount over the combined (x, y, hue) code. When
+    there are more (x, y) cells than points, between variables of thousands of categories, only the cells that occur
+    are counted.
+
+    @param x_codes: Abscissa integer codes, -1 for missing values
+    @param y_codes: Ordinate integer codes, -1 for missing values
+    @param hue_codes: Hue integer codes, -1 for missing values
+    @param square_len: Length of the square to plot the intersection of 2 values
+    @param rng: Random generator to draw the noise with
+    @return: Noise of each point, NaN where a code is missing
+    """
+    valid = (x_codes >= 0) & (y_codes >= 0) & (hue_codes >= 0)
+    noise = np.full(len(x_codes), np.nan)
+    if not valid.any():
+        return noise
+
+    # Hue shares of each (x, y) cell
+    ##################################
+    n_y, n_hue = int(y_codes.max()) + 1, int(hue_codes.max()) + 1
+    combined = ((x_codes[valid].astype(np.int64) * n_y + y_codes[valid]) * n_hue + hue_codes[valid])
+    n_cells = int(combined.max()) // n_hue + 1
+    if n_cells > len(combined):
+        # Cells renumbered in the order of their codes
+        cells, combined_cells = np.unique(combined // n_hue, return_inverse=True)
+        combined, n_cells = combined_cells * n_hue + combined % n_hue, len(cells)
+    counts = np.bincount(combined, minlength=n_cells * n_hue).reshape(n_cells, n_hue)
+    widths = square_len * counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    upper = np.cumsum(widths, axis=1) - square_len / 2
+    lower = (upper - widths).ravel()
+
+    # Drawing each point inside its hue share
+    ##########################################
+    noise[valid] = lower[combined] + rng.random(len(combined)) * widths.ravel()[combined]
+    return noise
+
+
+def x_noise_hue(x: pd.Series, y: pd.Series, hue: pd.Series, square_len: float,
+                rng: np.random.Generator | None = None) -> pd.Series:
     """
     Return the noise to add to variable x, once mapped to integers
 
@@ -14,35 +72,67 @@ def x_noise_hue(x: pd.Series, y: pd.Series, hue: pd.Series, square_len: float) -
     @param y: Ordinate categorical variable series
     @param hue: Categorical variable to distinguish points with
     @param square_len: Length of the square to plot the intersection of 2 values
+    @param rng: Random generator, for reproducible noise
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    noise = hue_jitter(category_codes(x), category_codes(y), category_codes(hue), square_len, rng)
+    return pd.Series(noise, index=x.index)
+
+
+def contingency_coordinates(x_codes: np.ndarray, y_values: np.ndarray, y_categorical: bool,
+                            hue_codes: np.ndarray | None, square_len: float,
+                            rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the coordinates of each point of a contingency plot: integer codes with added noise for categorical
+    variables, values for a numeric ordinate
+
+    @param x_codes: Abscissa integer codes, -1 for missing values
+    @param y_values: Ordinate integer codes if categorical, else ordinate values
+    @param y_categorical: Whether the ordinate is categorical
+    @param hue_codes: Hue integer codes, -1 for missing values. None if no hue
+    @param square_len: Length of the square to plot the intersection of 2 values
+    @param rng: Random generator to draw the noise with
+    @return: Abscissa and ordinate of each point
     """
-    # Creating min and max each x, y, and hue value
-    ################################################
-    if hue.name not in [x.name, y.name]:
-        data = pd.concat([x, y, hue], axis=1)
+    x_real = np.where(x_codes >= 0, x_codes, np.nan)
+    if hue_codes is None:
+        x_real += rng.uniform(-square_len / 2, square_len / 2, size=len(x_real))
+    else:
+        y_codes = y_values if y_categorical else pd.factorize(y_values, sort=True)[0]
+        x_real += hue_jitter(x_codes, y_codes, hue_codes, square_len / 2, rng)
+    if y_categorical:
+        y_real = np.where(y_values >= 0, y_values, np.nan) + rng.uniform(-square_len / 2, square_len / 2,
+                                                                          size=len(y_values))
     else:
-        data = pd.concat([x, y], axis=1)
-    ptable = pd.pivot_table(data=data.reset_index(), values='index', index=(x.name, y.name), columns=hue.name,
-                            aggfunc='count', observed=False)
-    row_sums = ptable.sum(axis=1)
-    for col in ptable.columns:
-        ptable[col] = square_len * ptable[col] / row_sums
-    ptable_max = ptable.cumsum(axis=1) - square_len / 2
-    ptable_min = ptable_max.shift(periods=1, axis=1).fillna(-square_len / 2)
-    # From table to series (adding column as index)
-    ptable_max, ptable_min = ptable_max.stack(), ptable_min.stack()
-    ptable_max.name, ptable_min.name = 'max', 'min'
-
-    # Adding min/max and noisy x coordinate
-    #########################################
-    data = pd.merge(data, ptable_min, left_on=(x.name, y.name, hue.name), right_index=True)
-    data = pd.merge(data, ptable_max, left_on=(x.name, y.name, hue.name), right_index=True)
-    data['diff'] = data['max'] - data['min']
-    data['rand'] = np.random.uniform(0, 1, size=len(data))
-    return data['rand'] * data['diff'] + data['min']
+        y_real = y_values
+    return x_real, y_real
+
+
+def pair_coordinates(x: Column, y: Column, hue_codes: np.ndarray | None, square_len: float,
+                     rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the coordinates of each point of the scatter or contingency plot of two encoded variables
+
+    @param x: Abscissa column: values if numeric, integer codes if categorical
+    @param y: Ordinate column: values if numeric, integer codes if categorical
+    @param hue_codes: Hue integer codes, -1 for missing values. None if no hue
+    @param square_len: Length of the square to plot the intersection of 2 values
+    @param rng: Random generator to draw the noise with
+    @return: Abscissa and ordinate of each point
+    """
+    if x.categories is None and y.categories is None:
+        return x.values, y.values
+    if x.categories is not None:
+        return contingency_coordinates(x.values, y.values, y.categories is not None, hue_codes, square_len, rng)
+    y_real, x_real = contingency_coordinates(y.values, x.values, False, hue_codes, square_len, rng)
+    return x_real, y_real
 
 
 # noinspection PyUnboundLocalVariable
-def contingencyplot(x: pd.Series, y: pd.Series, hue: pd.Series = None, ax: plt.axis = None, square_len=0.5, **kwargs):
+def contingencyplot(x: pd.Series, y: pd.Series, hue: pd.Series = None, ax: plt.axis = None, square_len=0.5,
+                    rng: np.random.Generator | None = None, render: str = 'points',
+                    cache: BinningCache | None = None, max_points: int | None = None, lod: int | None = None,
+                    **kwargs):
     """
     Scatter plot between 2 categorical variables
 
@@ -53,7 +143,17 @@ def contingencyplot(x: pd.Series, y: pd.Series, hue: pd.Series = None, ax: plt.a
     @param hue: Categorical variable name to distinguish points with
     @param ax: Matplotlib axis to witch add plot
     @param square_len: Length of the square to plot the intersection of 2 values
+    @param rng: Random generator, for reproducible noise
+    @param render: 'points' to draw each point, 'raster' to aggregate them into one image
+    @param cache: Encodings of the variables, by name, so that codes are not computed again for each plot
+    @param max_points: If given, at most about this number of points are drawn, sampled in each (x, y, hue) cell in
+    proportion to its size. Hue shares of each cell are still computed on all points
+    @param lod: If given, at most about this number of points are drawn within the view limits, drawn again from all
+    the points each time the plot is zoomed or panned, see ZoomScatter. max_points is then ignored
     """
+    lod = None if lod is None else check_lod(lod)
+    rng = np.random.default_rng() if rng is None else rng
+
     # Mapping categorical variables to integers
     ###########################################
     # distinct_x, distinct_y: Distinct values for x and y
@@ -63,38 +163,83 @@ def contingencyplot(x: pd.Series, y: pd.Series, hue: pd.Series = None, ax: plt.a
         x, y = y, x
 
     distinct_x: pd.Index = x.cat.categories
-    x_to_int = {val: i for (i, val) in enumerate(distinct_x)}
-    x_real = x.map(x_to_int).astype(int)
+    y_categorical = y.dtype.name == 'category'
+    if cache is not None:
+        x_codes, y_values = cache.column(x.name).values, cache.column(y.name).values
+    else:
+        x_codes, y_values = category_codes(x), category_codes(y) if y_categorical else y.to_numpy()
 
     # Adding noise to have a "crowd feeling"
     ##########################################
     if hue is None:
-        x_real = x_real + uniform(-square_len / 2, square_len / 2, size=len(x_real))
+        hue_codes = None
+    elif cache is not None and cache.hue == hue.name:
+        hue_codes = cache.hue_codes
     else:
-        x_real = x_real + x_noise_hue(x, y, hue, square_len / 2)
+        hue_codes = category_codes(hue)
+    with phase('jitter'):
+        x_real, y_real = contingency_coordinates(x_codes, y_values, y_categorical, hue_codes, square_len, rng)
+    x_real = pd.Series(x_real, index=x.index, name=x.name)
+    y_real = pd.Series(y_real, index=y.index, name=y.name) if y_categorical else y
+    if max_points is not None and render != 'raster' and lod is None:
+        rows = stratified_sample(strata_codes(len(x_codes), x_codes, y_values if y_categorical else None, hue_codes),
+                                 max_points, rng=rng)
+        x_real, y_real = x_real.iloc[rows], y_real.iloc[rows]
+        hue = None if hue is None else hue.iloc[rows]
     ax = plt.gca() if ax is None else ax
-    if y.dtype.name == 'category':
+    if y_categorical:
         distinct_y: pd.Index = y.cat.categories
-        y_to_int = {val: i for (i, val) in enumerate(distinct_y)}
-        y_real = y.map(y_to_int).astype(int)
-        y_real = y_real + uniform(-square_len / 2, square_len / 2, size=len(y_real))
-    else:
-        y_real = y
     if change:
         # y is numerical
         distinct_y = distinct_x
-        y_to_int = x_to_int
         x, y = y, x
         x_real, y_real = y_real, x_real
     if x.dtype.name == 'category':
         ax.set_xticks(range(len(distinct_x)))
-        ax.set_xticklabels(sorted([val for val in distinct_x], key=lambda label: x_to_int[label]))
+        ax.set_xticklabels(distinct_x)
     if y.dtype.name == 'category':
         ax.set_yticks(range(len(distinct_y)))
-        ax.set_yticklabels(sorted([val for val in distinct_y], key=lambda label: y_to_int[label]))
+        ax.set_yticklabels(distinct_y)
     ax.set_xlabel(x.name)
     ax.set_ylabel(y.name)
-    sns.scatterplot(x=x_real, y=y_real, ax=ax, hue=hue, **kwargs)
+    if render == 'raster':
+        rasterplot(x_real, y_real, hue=hue, ax=ax, **{key: kwargs[key] for key in ('hue_order', 'color', 'palette')
+                                                       if key in kwargs})
+    elif lod is not None:
+        zoomable_contingency(x_real, y_real, hue, ax, lod, **kwargs)
+    else:
+        sns.scatterplot(x=x_real, y=y_real, ax=ax, hue=hue, **kwargs)
+
+
+def zoomable_contingency(x_real: pd.Series, y_real: pd.Series, hue: pd.Series | None, ax: plt.Axes, lod: int,
+                         hue_order: [str] = None, palette='Set1', color: tuple[float, ...] | str = (.7, .7, 0),
+                         s: float = None, **kwargs) -> ZoomScatter:
+    """
+    Draws the coordinates of a contingency plot as a zoomable scatter plot, with a legend of hue values as seaborn does
+
+    @param x_real: Abscissa of each point
+    @param y_real: Ordinate of each point
+    @param hue: Categorical variable to distinguish points with
+    @param ax: Matplotlib axis on which draw the points
+    @param lod: Number of points drawn within the view limits, at most about
+    @param hue_order: Order of hue values in palette. Categories order if None
+    @param palette: color map for hue
+    @param color: Used for points if hue=None
+    @param s: Marker size. Matplotlib's default if None
+    """
+    s = mpl.rcParams['lines.markersize'] ** 2 if s is None else s
+    if hue is None:
+        return ZoomScatter(x_real.to_numpy(dtype=float), y_real.to_numpy(dtype=float), None, [color], max_points=lod,
+                           s=s, ax=ax)
+    if hue_order is None:
+        categorical = isinstance(hue.dtype, pd.CategoricalDtype)
+        hue_order = hue.cat.categories if categorical else sorted(hue.dropna().unique())
+    colors = sns.color_palette(palette, len(hue_order))
+    zoomable = ZoomScatter(x_real.to_numpy(dtype=float), y_real.to_numpy(dtype=float),
+                           pd.Categorical(hue, categories=hue_order).codes, colors, max_points=lod, s=s, ax=ax)
+    handles = [mpl.lines.Line2D([], [], linestyle='', marker='o', color=hue_color) for hue_color in colors]
+    ax.legend(handles, list(hue_order), title=hue.name)
+    return zoomable
 
 
 if __name__ == '__main__':
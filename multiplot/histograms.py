@@ -0,0 +1,186 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+
+def numeric_edges(values_min: float, values_max: float, bins: int) -> np.ndarray:
+    """
+    Returns equally spaced bin edges between the minimum and maximum of a numeric variable
+
+    @param values_min: Minimum of the variable
+    @param values_max: Maximum of the variable
+    @param bins: Number of bins
+    """
+    if values_min == values_max:
+        values_min, values_max = values_min - .5, values_max + .5
+    return np.linspace(values_min, values_max, bins + 1)
+
+
+def categorical_edges(n_categories: int) -> np.ndarray:
+    """
+    Returns bin edges centered on the integer code of each category, as categorical axes are drawn by seaborn
+
+    @param n_categories: Number of categories
+    """
+    return np.arange(n_categories + 1) - .5
+
+
+def widen_edges(edges: np.ndarray, values: np.ndarray, max_bins: int | None = None) -> tuple[np.ndarray, int, int]:
+    """
+    Extends equally spaced bin edges with bins of the same width on either side, until they span the values, so that
+    counts of the former bins stay valid once padded with zeros
+
+    @param edges: Equally spaced bin edges
+    @param values: Numeric values to span. Missing values are ignored
+    @param max_bins: Number of bins the edges can be extended to, at most. Unbounded if None
+    @return: The edges, extended or not, and the number of bins added before and after them
+    """
+    finite = values[np.isfinite(values)]
+    bins = len(edges) - 1
+    if not len(finite):
+        return edges, 0, 0
+    width = (edges[-1] - edges[0]) / bins
+    before = max(int(np.ceil((edges[0] - finite.min()) / width)), 0)
+    after = max(int(np.ceil((finite.max() - edges[-1]) / width)), 0)
+    if max_bins is not None:
+        before = min(before, max(max_bins - bins, 0))
+        after = min(after, max(max_bins - bins - before, 0))
+    if not (before or after):
+        return edges, 0, 0
+    return edges[0] + width * np.arange(-before, bins + after + 1), before, after
+
+
+def bin_index(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Returns the bin of each value, for equally spaced edges. Missing values and values out of the edges get -1.
+
+    @param values: Numeric values
+    @param edges: Equally spaced bin edges
+    """
+    bins = len(edges) - 1
+    index = np.floor((values - edges[0]) / (edges[-1] - edges[0]) * bins)
+    # The last edge belongs to the last bin
+    index[values == edges[-1]] = bins - 1
+    index[~((index >= 0) & (index < bins))] = -1
+    return index.astype(np.int64)
+
+
+def hist1d_counts(index: np.ndarray, n_bins: int, hue_codes: np.ndarray | None = None,
+                  n_hue: int = 1) -> np.ndarray:
+    """
+    Counts the rows in each bin, for each hue value, with a single bincount
+
+    @param index: Bin of each row, -1 for rows out of the histogram
+    @param n_bins: Number of bins
+    @param hue_codes: Hue category code of each row, -1 for missing values. None if no hue
+    @param n_hue: Number of hue categories
+    @return: Array of shape (n_hue, n_bins)
+    """
+    hue_codes = np.zeros_like(index) if hue_codes is None else hue_codes
+    valid = (index >= 0) & (hue_codes >= 0)
+    combined = hue_codes[valid].astype(np.int64) * n_bins + index[valid]
+    return np.bincount(combined, minlength=n_hue * n_bins).reshape(n_hue, n_bins)
+
+
+def hist2d_counts(x_index: np.ndarray, y_index: np.ndarray, x_bins: int, y_bins: int,
+                  hue_codes: np.ndarray | None = None, n_hue: int = 1) -> np.ndarray:
+    """
+    Counts the rows in each 2D bin, for each hue value, with a single bincount over combined indices
+
+    @param x_index: Abscissa bin of each row, -1 for rows out of the histogram
+    @param y_index: Ordinate bin of each row, -1 for rows out of the histogram
+    @param x_bins: Number of abscissa bins
+    @param y_bins: Number of ordinate bins
+    @param hue_codes: Hue category code of each row, -1 for missing values. None if no hue
+    @param n_hue: Number of hue categories
+    @return: Array of shape (n_hue, x_bins, y_bins)
+    """
+    hue_codes = np.zeros_like(x_index) if hue_codes is None else hue_codes
+    valid = (x_index >= 0) & (y_index >= 0) & (hue_codes >= 0)
+    combined = (hue_codes[valid].astype(np.int64) * x_bins + x_index[valid]) * y_bins + y_index[valid]
+    return np.bincount(combined, minlength=n_hue * x_bins * y_bins).reshape(n_hue, x_bins, y_bins)
+
+
+def hue_colormaps(n_hue: int, cmap: str = 'Greens', palette: str = 'Set1', hue: bool = False) -> list:
+    """
+    Returns the color map of each hue layer: cmap if there is no hue, else a light map of each palette color
+
+    @param n_hue: Number of hue categories
+    @param cmap: Color map for densities without hue
+    @param palette: Palette to color hue categories with
+    @param hue: Whether the layers are hue categories
+    """
+    import seaborn as sns
+    import matplotlib as mpl
+
+    if not hue:
+        return [mpl.colormaps[cmap] if isinstance(cmap, str) else cmap]
+    return [sns.light_palette(color, as_cmap=True) for color in sns.color_palette(palette, n_hue)]
+
+
+def draw_hist2d(counts: np.ndarray, x_edges: np.ndarray, y_edges: np.ndarray, cmaps: list,
+                ax: 'plt.Axes' = None) -> list:
+    """
+    Draws precomputed bivariate histograms with a logarithmic color scale, one mesh per hue layer
+
+    @param counts: Array of shape (n_hue, x_bins, y_bins)
+    @param x_edges: Abscissa bin edges
+    @param y_edges: Ordinate bin edges
+    @param cmaps: Color map of each hue layer
+    @param ax: Matplotlib axis on which draw the histograms
+    @return: The meshes, one per hue layer
+    """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+
+    ax = plt.gca() if ax is None else ax
+    norm = mpl.colors.LogNorm(vmin=1, vmax=max(counts.max(), 1))
+    meshes = []
+    for layer, cmap in zip(counts, cmaps):
+        layer = np.ma.masked_equal(layer.T, 0)
+        meshes.append(ax.pcolormesh(x_edges, y_edges, layer, cmap=cmap, norm=norm))
+    return meshes
+
+
+def draw_hist1d(counts: np.ndarray, edges: np.ndarray, colors: list, ax: 'plt.Axes' = None) -> list:
+    """
+    Draws precomputed histograms, stacking hue layers
+
+    @param counts: Array of shape (n_hue, bins)
+    @param edges: Bin edges
+    @param colors: Color of each hue layer
+    @param ax: Matplotlib axis on which draw the histograms
+    @return: The bar containers, one per hue layer
+    """
+    import matplotlib.pyplot as plt
+
+    ax = plt.gca() if ax is None else ax
+    bottom = np.zeros(counts.shape[1])
+    bars = []
+    for layer, color in zip(counts, colors):
+        bars.append(ax.bar(edges[:-1], layer, width=np.diff(edges), bottom=bottom, align='edge', color=color,
+                           alpha=.75, edgecolor='white', linewidth=.5))
+        bottom = bottom + layer
+    return bars
+
+
+def set_categorical_ticks(categories: pd.Index, axis: str = 'x', ax: 'plt.Axes' = None, invert_y: bool = True):
+    """
+    Labels the integer positions of a categorical axis with its categories
+
+    @param categories: Categories, in the order of their codes
+    @param axis: 'x' or 'y'
+    @param ax: Matplotlib axis to label
+    @param invert_y: Whether to draw categorical ordinates from top to bottom, as seaborn histograms do
+    """
+    import matplotlib.pyplot as plt
+
+    ax = plt.gca() if ax is None else ax
+    getattr(ax, 'set_%sticks' % axis)(range(len(categories)))
+    getattr(ax, 'set_%sticklabels' % axis)(categories)
+    if axis == 'y' and invert_y and not ax.yaxis_inverted():
+        ax.invert_yaxis()
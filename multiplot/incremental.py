@@ -0,0 +1,308 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection, QuadMesh
+
+from multiplot.association import AssociationStats
+from multiplot.binning import BinningCache
+from multiplot.coefplot import update_coefplot
+from multiplot.columnar import Table, as_frame, float_values, fold_categories
+from multiplot.contingencyplot import pair_coordinates
+from multiplot.histograms import (bin_index, hist2d_counts, hue_colormaps, draw_hist1d, draw_hist2d,
+                                  set_categorical_ticks, widen_edges)
+from multiplot.lod import ZoomScatter
+from multiplot.raster import raster_counts, shade, draw_raster
+from multiplot.profiling import phase
+
+# Factor by which the bins of histograms and images can grow, as new values fall out of their range
+MAX_WIDENING = 4
+
+
+class GridUpdater:
+    """
+    Running statistics of a pair grid, to add rows to it without drawing it again.
+
+    Each cell keeps what it is drawn from: counts of the diagonal histograms, of the bivariate histograms and of the
+    raster images, and co-moments, crosstabs and grouped sums for the coefficients of the upper diagonal. New rows are
+    binned with the edges and categories of the grid and added to these statistics, then the artists of each cell are
+    updated in place: scatter offsets, mesh values, bar heights, images and coefficient labels. An update thus costs
+    in proportion to the new rows, not to the rows already drawn.
+
+    Statistics the grid was not drawn from are computed once, from its rows, on first update. Histograms drawn by
+    seaborn are then replaced by histograms with the bins of the grid. Histograms and images keep the width of their
+    bins, and are extended with bins of that width for new values out of their range, up to MAX_WIDENING times their
+    initial number of bins: values beyond are left out of them, with a warning. Categories unknown to the grid are
+    left out of every cell.
+    """
+
+    def __init__(self, grid: sns.PairGrid, data: pd.DataFrame, hue: str | None = None, bins: int = 20,
+                 density=False, render: str = 'points', color: tuple[float, ...] | str = (.7, .7, 0),
+                 cmap='Greens', palette='Set1', coef_cmap: str = 'RdBu_r', rng: np.random.Generator | None = None,
+                 max_points: int | None = None, cache: BinningCache | None = None,
+                 stats: AssociationStats | None = None, payloads: dict | None = None, square_len: float = .5,
+                 collapsed: dict[str, pd.Index] | None = None, other_label: str = 'other'):
+        """
+        @param grid: Square PairGrid drawn from data
+        @param data: Dataframe the grid was drawn from
+        @param hue: Categorical variable name the grid distinguishes points with
+        @param bins: Bins for histograms of numeric variables
+        @param density: Whether lower cells display the density of points
+        @param render: For scatter plots, 'points' if each point is drawn, 'raster' if they are aggregated into images
+        @param color: Used for markers and histograms if hue=None
+        @param cmap: color map for densities
+        @param palette: color map for hue
+        @param coef_cmap: Color scale the coefficients of the upper diagonal were drawn with. (hue = None)
+        @param rng: Random generator, for contingency noise and sampling of new rows
+        @param max_points: If given, scatter and contingency plots draw new rows at the rate they drew the rows of data
+        @param cache: Encodings of the variables of data, whose edges and categories new rows are binned with
+        @param stats: Association statistics of data, if the grid was drawn from them
+        @param payloads: Payloads the cells were drawn from, by key, if the grid was drawn from payloads
+        @param square_len: Length of the squares of contingency plots
+        @param collapsed: Categories kept for the variables whose least frequent categories were folded into one,
+        see fold_categories. The values of new rows are folded the same way
+        @param other_label: Label of the category the others were folded into
+        """
+        self.grid = grid
+        self.data = data
+        self.hue = hue
+        self.bins = bins
+        self.vars = list(grid.x_vars)
+        self.density = density
+        self.render = render
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.square_len = square_len
+        self.sample_rate = None if max_points is None else min(1., max_points / max(len(data), 1))
+        self.cache = BinningCache(data, hue, bins) if cache is None else cache
+        self.stats = stats
+        self.payloads = payloads or {}
+        self.collapsed = collapsed or {}
+        self.other_label = other_label
+        n_hue = self.cache.n_hue
+        self.colors = mpl.colors.to_rgba_array([color] if hue is None else sns.color_palette(palette, n_hue))
+        self.cmaps = hue_colormaps(n_hue, cmap, palette, hue=hue is not None)
+        self.coef_cmap = coef_cmap
+        # State of each cell, set on first update
+        self.cells = None
+
+    def update(self, new_rows: Table) -> sns.PairGrid:
+        """
+        Adds rows to the grid, updating its artists and its association matrix in place
+
+        @param new_rows: Dataframe, structured array or Arrow table with the variables of the grid, and its hue, see
+        as_frame
+        @return: The grid
+        """
+        if self.cells is None:
+            self._prepare()
+        new_rows = as_frame(new_rows, list(dict.fromkeys(self.vars + ([self.hue] if self.hue is not None else []))))
+        new_rows = fold_categories(new_rows, self.collapsed, self.other_label)
+        widened = self._widen_edges(new_rows)
+        cache = BinningCache(new_rows, self.hue, self.bins, categories=self.categories, edges=self.edges)
+        with phase('coefficient', cell='grid', rows=len(new_rows)):
+            cache.update_stats(self.stats)
+            self.grid.association_matrix = self.stats.matrix()
+        for cell in self.cells:
+            kind, ax = cell['kind'], cell['ax']
+            with phase('artists', cell=cell['key'][0], x=cell['key'][1], y=(cell['key'][2:] or [None])[0],
+                       rows=len(new_rows), ax=ax):
+                if kind == 'hist1d':
+                    self._update_hist1d(cell, cache, widened)
+                elif kind == 'hist2d':
+                    self._update_hist2d(cell, cache, widened)
+                elif kind == 'raster':
+                    self._update_raster(cell, cache)
+                elif kind == 'points':
+                    self._update_points(cell, cache)
+        # Coefficient rectangles span the limits of their axis, which new points may have extended
+        for i, y_var in enumerate(self.vars):
+            for j, x_var in enumerate(self.vars[i + 1:], i + 1):
+                update_coefplot(self.grid.association_matrix.loc[x_var, y_var], hue=self.hue is not None,
+                                cmap=self.coef_cmap, ax=self.grid.axes[i, j])
+        return self.grid
+
+    def _prepare(self):
+        """
+        Sets the state of each cell from the rows of the grid, replacing histograms drawn by seaborn
+        """
+        cache = self.cache
+        columns = cache.columns(self.vars)
+        self.categories = {var: column.categories for var, column in columns.items() if column.categories is not None}
+        self.edges = {var: cache.edges(var) for var in self.vars}
+        self.max_bins = {var: MAX_WIDENING * (len(edges) - 1) for var, edges in self.edges.items()}
+        if self.stats is None:
+            self.stats = cache.association_stats(self.vars)
+        self.cells = []
+        for i, y_var in enumerate(self.vars):
+            ax = self.grid.diag_axes[i]
+            payload = self.payloads.get(('diag', y_var))
+            if payload is None:
+                counts = cache.hist1d(y_var)
+                clear(ax)
+                bars = draw_hist1d(counts, self.edges[y_var], self.colors, ax=ax)
+                if y_var in self.categories:
+                    set_categorical_ticks(self.categories[y_var], 'x', ax=ax)
+            else:
+                counts, bars = payload['counts'], list(ax.containers)
+            self.cells.append({'key': ('diag', y_var), 'kind': 'hist1d', 'ax': ax, 'counts': counts, 'bars': bars})
+            for j, x_var in enumerate(self.vars[:i]):
+                self.cells.append(self._prepare_lower(self.grid.axes[i, j], x_var, y_var))
+        # The rows of the grid are no longer needed
+        self.data = self.cache = None
+
+    def _prepare_lower(self, ax: plt.Axes, x_var: str, y_var: str) -> dict:
+        cache = self.cache
+        key = ('lower', x_var, y_var)
+        payload = self.payloads.get(key, {})
+        kind = payload.get('kind', 'hist2d' if self.density else 'raster' if self.render == 'raster' else 'points')
+        cell = {'key': key, 'kind': kind, 'ax': ax}
+        if kind == 'hist2d':
+            if payload:
+                cell['counts'], meshes = payload['counts'], [mesh for mesh in ax.collections
+                                                             if isinstance(mesh, QuadMesh)]
+            else:
+                cell['counts'] = cache.hist2d(x_var, y_var)
+                clear(ax)
+                meshes = draw_hist2d(cell['counts'], self.edges[x_var], self.edges[y_var], self.cmaps, ax=ax)
+            cell['meshes'] = meshes
+        elif kind == 'raster':
+            if payload:
+                cell.update(counts=payload['counts'], x_edges=payload['x_edges'], y_edges=payload['y_edges'])
+            elif ax.images:
+                # Pixel edges are read from the image, and pixels counted again from the rows of the grid
+                x_min, x_max, y_min, y_max = ax.images[0].get_extent()
+                y_pixels, x_pixels = ax.images[0].get_array().shape[:2]
+                cell.update(x_edges=np.linspace(x_min, x_max, x_pixels + 1),
+                            y_edges=np.linspace(y_min, y_max, y_pixels + 1))
+                x_real, y_real = self._coordinates(cache, x_var, y_var)
+                cell['counts'] = hist2d_counts(bin_index(x_real, cell['x_edges']), bin_index(y_real, cell['y_edges']),
+                                               x_pixels, y_pixels, cache.hue_codes, cache.n_hue)
+            else:
+                cell.update(zip(('counts', 'x_edges', 'y_edges'),
+                                raster_counts(*self._coordinates(cache, x_var, y_var), cache.hue_codes, cache.n_hue)))
+            cell['image'] = ax.images[0] if ax.images else None
+            cell['max_bins'] = (MAX_WIDENING * cell['counts'].shape[1], MAX_WIDENING * cell['counts'].shape[2])
+        else:
+            collections = [collection for collection in ax.collections if isinstance(collection, PathCollection)]
+            cell['points'] = collections[0] if collections else None
+        return cell
+
+    def _widen_edges(self, new_rows: pd.DataFrame) -> dict[str, tuple[int, int]]:
+        """
+        Extends the bin edges of numeric variables to the values of new rows, see widen_edges
+
+        @param new_rows: Dataframe with the variables of the grid
+        @return: Number of bins added before and after the edges of each variable whose edges were extended
+        """
+        widened = {}
+        for var in self.vars:
+            if var in self.categories:
+                continue
+            values = float_values(new_rows[var])
+            edges, before, after = widen_edges(self.edges[var], values, self.max_bins[var])
+            if before or after:
+                self.edges[var], widened[var] = edges, (before, after)
+            left_out_warning(values, edges, var)
+        return widened
+
+    def _coordinates(self, cache: BinningCache, x_var: str, y_var: str) -> tuple[np.ndarray, np.ndarray]:
+        return pair_coordinates(cache.column(x_var), cache.column(y_var), cache.hue_codes, self.square_len, self.rng)
+
+    def _update_hist1d(self, cell: dict, cache: BinningCache, widened: dict[str, tuple[int, int]]):
+        var = cell['key'][1]
+        pad = widened.get(var, (0, 0))
+        cell['counts'] = np.pad(cell['counts'], ((0, 0), pad)) + cache.hist1d(var)
+        if any(pad):
+            # Bars are drawn again over the extended bins
+            for bars in cell['bars']:
+                bars.remove()
+            cell['bars'] = draw_hist1d(cell['counts'], self.edges[var], self.colors, ax=cell['ax'])
+        else:
+            bottom = np.zeros(cell['counts'].shape[1])
+            for layer, bars in zip(cell['counts'], cell['bars']):
+                for bar, height, y in zip(bars, layer, bottom):
+                    bar.set_y(y)
+                    bar.set_height(height)
+                bottom = bottom + layer
+        cell['ax'].relim()
+        # Diagonal axes share their abscissa with their column, which is only extended with the bins
+        cell['ax'].autoscale_view(scalex=any(pad))
+
+    def _update_hist2d(self, cell: dict, cache: BinningCache, widened: dict[str, tuple[int, int]]):
+        x_var, y_var = cell['key'][1:]
+        x_pad, y_pad = widened.get(x_var, (0, 0)), widened.get(y_var, (0, 0))
+        counts = cell['counts'] = np.pad(cell['counts'], ((0, 0), x_pad, y_pad)) + cache.hist2d(x_var, y_var)
+        if any(x_pad + y_pad):
+            # Meshes are drawn again over the extended bins
+            for mesh in cell['meshes']:
+                mesh.remove()
+            cell['meshes'] = draw_hist2d(counts, self.edges[x_var], self.edges[y_var], self.cmaps, ax=cell['ax'])
+            cell['ax'].autoscale_view()
+            return
+        for layer, mesh in zip(counts, cell['meshes']):
+            mesh.set_array(np.ma.masked_equal(layer.T, 0))
+        if cell['meshes']:
+            # Layers share their logarithmic norm
+            cell['meshes'][0].norm.vmax = max(counts.max(), 1)
+
+    def _update_raster(self, cell: dict, cache: BinningCache):
+        x_real, y_real = self._coordinates(cache, *cell['key'][1:])
+        x_edges, *x_pad = widen_edges(cell['x_edges'], x_real, cell['max_bins'][0])
+        y_edges, *y_pad = widen_edges(cell['y_edges'], y_real, cell['max_bins'][1])
+        left_out_warning(x_real, x_edges, cell['key'][1])
+        left_out_warning(y_real, y_edges, cell['key'][2])
+        counts = cell['counts'] = np.pad(cell['counts'], ((0, 0), x_pad, y_pad))
+        cell['x_edges'], cell['y_edges'] = x_edges, y_edges
+        counts += hist2d_counts(bin_index(x_real, x_edges), bin_index(y_real, y_edges),
+                                counts.shape[1], counts.shape[2], cache.hue_codes, cache.n_hue)
+        if cell['image'] is not None:
+            cell['image'].set_data(shade(counts.transpose(0, 2, 1), self.colors))
+            cell['image'].set_extent((x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+        elif counts.any():
+            cell['image'] = draw_raster(counts, cell['x_edges'], cell['y_edges'], self.colors, ax=cell['ax'])
+
+    def _update_points(self, cell: dict, cache: BinningCache):
+        points, ax = cell['points'], cell['ax']
+        if points is None:
+            return
+        x_real, y_real = self._coordinates(cache, *cell['key'][1:])
+        zoomable = ZoomScatter.of(points)
+        if zoomable is not None:
+            # Every new row is indexed, the view bounds the points drawn
+            zoomable.append(x_real, y_real, cache.hue_codes)
+            return
+        drawn = np.isfinite(x_real) & np.isfinite(y_real)
+        if self.hue is not None:
+            drawn &= cache.hue_codes >= 0
+        if self.sample_rate is not None:
+            drawn &= self.rng.random(len(drawn)) < self.sample_rate
+        offsets = np.column_stack([x_real[drawn], y_real[drawn]])
+        points.set_offsets(np.concatenate([np.asarray(points.get_offsets()), offsets]))
+        if self.hue is not None:
+            points.set_facecolors(np.concatenate([points.get_facecolors(), self.colors[cache.hue_codes[drawn]]]))
+        ax.update_datalim(offsets)
+        ax.autoscale_view()
+
+
+def left_out_warning(values: np.ndarray, edges: np.ndarray, var: str):
+    """
+    Warns about the values out of bin edges, once they cannot be extended further
+    """
+    left_out = np.count_nonzero((values < edges[0]) | (values > edges[-1]))
+    if left_out:
+        warnings.warn('%d new values of %r are out of the range of its bins, which cannot grow beyond %d times their '
+                      'initial number: they are left out of its histograms' % (left_out, var, MAX_WIDENING),
+                      RuntimeWarning, stacklevel=3)
+
+
+def clear(ax: plt.Axes):
+    """
+    Removes the bars, patches and collections of an axis, keeping its labels and ticks
+    """
+    for container in list(ax.containers):
+        container.remove()
+    for artist in list(ax.patches) + list(ax.collections):
+        artist.remove()
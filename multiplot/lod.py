@@ -0,0 +1,221 @@
+import numbers
+import weakref
+
+import numpy as np
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.backend_bases import TimerBase
+from matplotlib.collections import PathCollection
+
+from multiplot.profiling import phase
+
+# Zoomable scatter plots, by the collection of the points they draw
+_scatters = weakref.WeakKeyDictionary()
+
+
+def check_lod(lod: int, name: str = 'lod') -> int:
+    """
+    Returns a number of points drawn within a view, raising a ValueError unless it is a positive integer
+
+    @param lod: Number of points
+    @param name: Name of the argument, for the error message
+    """
+    if isinstance(lod, bool) or not isinstance(lod, numbers.Integral) or lod <= 0:
+        raise ValueError('%s is the number of points drawn within a view, a positive integer like 20000: got %r'
+                         % (name, lod))
+    return int(lod)
+
+
+class ZoomScatter:
+    """
+    Scatter plot drawing at most about max_points of its points within the view limits of its axis, drawn again from
+    all the points each time the axis is zoomed or panned: the overview stays light, and zooming into a dense region
+    shows its points in full detail.
+
+    Each point gets a random priority, and each view draws the points of lowest priority within it, so that the
+    points of an overview remain drawn in the views zoomed into it. Points are indexed once:
+    - by cell of a grid spanning them, by priority inside each cell. Views holding many points read the first points of
+    each cell they overlap, in proportion to the number of points of the cell, at a cost proportional to max_points;
+    - by abscissa. Views holding few points, zoomed in, read every point of their abscissa range.
+
+    Zooming or panning fires many limit changes: points are drawn again once the limits stay still for debounce
+    seconds, or at once on backends without an event loop, like Agg. The plot stops listening to them once disconnected,
+    its figure closed or its points removed from the axis.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, hue_codes: np.ndarray | None = None,
+                 colors: list = ((.7, .7, 0),), max_points: int = 20_000, s: float = 5, ax: plt.Axes = None,
+                 cells: int = 64, debounce: float = .2, rng: np.random.Generator | None = None):
+        """
+        @param x: Abscissa of each point
+        @param y: Ordinate of each point
+        @param hue_codes: Hue category code of each point, -1 for missing values. None if no hue
+        @param colors: Color of each hue category, or the color of every point if no hue
+        @param max_points: Number of points drawn within a view, at most about
+        @param s: Marker size
+        @param ax: Matplotlib axis on which draw the points
+        @param cells: Number of cells of the index grid along each axis
+        @param debounce: Seconds the limits of the axis stay still before points are drawn again, on interactive
+        backends
+        @param rng: Random generator of the priorities of points
+        """
+        self.ax = plt.gca() if ax is None else ax
+        self.colors = mpl.colors.to_rgba_array(colors)
+        self.max_points = check_lod(max_points, 'max_points')
+        self.cells = cells
+        self.debounce = debounce
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.x, self.y = np.empty(0), np.empty(0)
+        self.hue_codes = None if hue_codes is None else np.empty(0, dtype=np.int64)
+        self.priority = np.empty(0)
+        # Points by cell then priority: sorted cell + priority keys, and positions of the points
+        self.cell_keys, self.cell_order = np.empty(0), np.empty(0, dtype=np.intp)
+        # Points by abscissa: sorted abscissas, and positions of the points
+        self.x_keys, self.x_order = np.empty(0), np.empty(0, dtype=np.intp)
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        finite = np.isfinite(x) & np.isfinite(y)
+        # The grid spans the first points, later points out of it are indexed in its border cells
+        self.x_range = (x[finite].min(), x[finite].max()) if finite.any() else (0., 1.)
+        self.y_range = (y[finite].min(), y[finite].max()) if finite.any() else (0., 1.)
+        self.points = self.ax.scatter(np.empty(0), np.empty(0), s=s, color=self.colors[0], edgecolors='w',
+                                      linewidths=.08 * np.sqrt(s))
+        _scatters[self.points] = self
+        self.view = None
+        self._timer, self._canvas = None, None
+        self.append(x, y, hue_codes)
+        # Registries are kept with callback ids: clearing the axis replaces its registry
+        self._callbacks = [(self.ax.callbacks, self.ax.callbacks.connect(signal, self._limits_changed))
+                           for signal in ('xlim_changed', 'ylim_changed')]
+        canvas = self.ax.figure.canvas
+        self._callbacks.append((canvas.callbacks, canvas.mpl_connect('close_event', lambda event: self.disconnect())))
+
+    @classmethod
+    def of(cls, points: PathCollection) -> 'ZoomScatter | None':
+        """
+        Returns the zoomable scatter plot drawing a collection of points, if any
+        """
+        return _scatters.get(points)
+
+    def append(self, x: np.ndarray, y: np.ndarray, hue_codes: np.ndarray | None = None):
+        """
+        Adds points to the index, and draws the points of the current view again
+
+        @param x: Abscissa of each new point
+        @param y: Ordinate of each new point
+        @param hue_codes: Hue category code of each new point, -1 for missing values. None if no hue
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        indexed = np.isfinite(x) & np.isfinite(y)
+        if self.hue_codes is not None:
+            indexed &= hue_codes >= 0
+        x, y = x[indexed], y[indexed]
+        positions = len(self.x) + np.arange(len(x))
+        priority = self.rng.random(len(x))
+        self.x, self.y = np.concatenate([self.x, x]), np.concatenate([self.y, y])
+        if self.hue_codes is not None:
+            self.hue_codes = np.concatenate([self.hue_codes, hue_codes[indexed]])
+        self.priority = np.concatenate([self.priority, priority])
+
+        # Merging the new points into the sorted keys, at a cost linear in the points
+        ###############################################################################
+        for keys_name, order_name, keys in (('cell_keys', 'cell_order', self.cell_of(x, y) + priority),
+                                            ('x_keys', 'x_order', x)):
+            new_order = np.argsort(keys, kind='stable')
+            keys = keys[new_order]
+            at = np.searchsorted(getattr(self, keys_name), keys, side='right')
+            setattr(self, keys_name, np.insert(getattr(self, keys_name), at, keys))
+            setattr(self, order_name, np.insert(getattr(self, order_name), at, positions[new_order]))
+        if len(x):
+            self.ax.update_datalim([(x.min(), y.min()), (x.max(), y.max())])
+            self.ax.autoscale_view()
+        self.refresh()
+
+    def cell_of(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Returns the index cell of points, as a single integer code per point
+        """
+        return self._cell_index(x, self.x_range) * self.cells + self._cell_index(y, self.y_range)
+
+    def _cell_index(self, values: np.ndarray, bounds: tuple[float, float]) -> np.ndarray:
+        low, high = bounds
+        scale = self.cells / (high - low) if high > low else 0.
+        return np.clip(((values - low) * scale).astype(np.int64), 0, self.cells - 1)
+
+    def query(self, xlim: tuple[float, float], ylim: tuple[float, float]) -> np.ndarray:
+        """
+        Returns the positions of the points drawn within view limits: those of lowest priority, at most max_points
+
+        @param xlim: Abscissa limits of the view, in any order
+        @param ylim: Ordinate limits of the view, in any order
+        @return: Sorted positions of the points
+        """
+        (x_min, x_max), (y_min, y_max) = sorted(xlim), sorted(ylim)
+        # Candidates: at least 4 times the points drawn, so that most points of lowest priority are among them
+        budget = 4 * self.max_points
+        start, stop = np.searchsorted(self.x_keys, x_min, 'left'), np.searchsorted(self.x_keys, x_max, 'right')
+        if stop - start <= 4 * budget:
+            # Zoomed in: every point of the abscissa range
+            candidates = self.x_order[start:stop]
+        else:
+            # First points of each cell overlapped by the view, in proportion to the points of the cell
+            x_cells = np.arange(*self._cell_index(np.array([x_min, x_max]), self.x_range) + [0, 1])
+            y_cells = np.arange(*self._cell_index(np.array([y_min, y_max]), self.y_range) + [0, 1])
+            cells = (x_cells[:, np.newaxis] * self.cells + y_cells).ravel()
+            starts = np.searchsorted(self.cell_keys, cells, 'left')
+            counts = np.searchsorted(self.cell_keys, cells + 1, 'left') - starts
+            quotas = np.minimum(counts, np.ceil(counts * budget / max(counts.sum(), 1)).astype(np.int64))
+            offsets = np.repeat(starts - (np.cumsum(quotas) - quotas), quotas)
+            candidates = self.cell_order[offsets + np.arange(len(offsets))]
+        x, y = self.x[candidates], self.y[candidates]
+        inside = candidates[(x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)]
+        if len(inside) > self.max_points:
+            inside = inside[np.argpartition(self.priority[inside], self.max_points)[:self.max_points]]
+        return np.sort(inside)
+
+    def refresh(self):
+        """
+        Draws the points of the current view limits, if they changed since the last drawing
+        """
+        view = (self.ax.get_xlim(), self.ax.get_ylim(), len(self.x))
+        if view == self.view:
+            return
+        self.view = view
+        with phase('jitter', rows=len(self.x)):
+            rows = self.query(*view[:2])
+        self.points.set_offsets(np.column_stack([self.x[rows], self.y[rows]]))
+        if self.hue_codes is not None:
+            self.points.set_facecolors(self.colors[self.hue_codes[rows]])
+
+    def disconnect(self):
+        """
+        Stops drawing the points again as the axis is zoomed or panned, keeping those drawn
+        """
+        for registry, callback in self._callbacks:
+            registry.disconnect(callback)
+        self._callbacks = []
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+    def _limits_changed(self, ax: plt.Axes):
+        if self.points.axes is None:
+            # Points removed from the axis, or the axis cleared
+            self.disconnect()
+            return
+        canvas = self.ax.figure.canvas
+        if self._timer is None or self._canvas is not canvas:
+            self._canvas, self._timer = canvas, canvas.new_timer(interval=int(self.debounce * 1000))
+            self._timer.single_shot = True
+            self._timer.add_callback(self._redraw)
+        if type(self._timer) is TimerBase:
+            # No event loop to run the timer: the view is drawn at once
+            self.refresh()
+            return
+        # Started again on each change, so that points are only drawn once the limits stay still
+        self._timer.stop()
+        self._timer.start()
+
+    def _redraw(self):
+        self.refresh()
+        self._canvas.draw_idle()
+
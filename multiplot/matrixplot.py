@@ -0,0 +1,222 @@
+import os
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+
+from multiplot.binning import BinningCache
+from multiplot.coefplot import coef_rectangle
+from multiplot.columnar import Table, as_frame, fold_categories, top_categories
+from multiplot.panels import memoized_panels
+from multiplot.profiling import phase, profilable
+from multiplot.raster import shade
+from multiplot.significance import association_significance
+from multiplot.store import PanelStore, as_store
+
+
+class MatrixGrid:
+    """
+    Pair matrix of many variables drawn on a single axis, see matrixplot. Row i and column j hold the cell of the
+    ordinate vars[i] and the abscissa vars[j], as in a PairGrid, each cell being a unit square of the axis
+    """
+
+    def __init__(self, ax: plt.Axes, vars: [str], association_matrix: pd.DataFrame,
+                 significance: pd.DataFrame | None = None):
+        """
+        @param ax: Matplotlib axis of the matrix
+        @param vars: List of variable names, in the order of rows and columns
+        @param association_matrix: Coefficients of the upper triangle, indexed by variable names
+        @param significance: P-values and confidence intervals of the coefficients, see association_significance
+        """
+        self.ax = ax
+        self.figure = ax.figure
+        self.x_vars = self.y_vars = list(vars)
+        self.association_matrix = association_matrix
+        self.significance = significance
+
+
+@profilable
+def matrixplot(data: Table, hue: str | None = None, vars: [str] = None, color: tuple[float, ...] | str = (.7, .7, 0),
+               palette='Set1', cmap: str = 'RdBu_r', thumbnails=True, thumbnail_size: int | None = None,
+               annot: bool | None = None, rng: np.random.Generator | None = None, n_jobs: int = 1,
+               significance=False, n_resamples: int = 999, store: str | os.PathLike | PanelStore | None = None,
+               max_categories: int | None = None, other_label: str = 'other', ax: plt.Axes = None,
+               profile=False) -> MatrixGrid:
+    """
+    Displays the pair plot of many variables on a single axis, so that figures of hundreds of variables are built
+    and drawn in seconds, instead of an axis per cell with its own ticks and artists:
+    - The coefficients of the upper triangle are one collection of rectangles, colored or sized as by coefplot;
+    - The histograms of the lower triangle and of the diagonal are thumbnails of thumbnail_size pixels, shaded as by
+    rasterplot, then gathered into one image;
+    - Variable names are the tick labels of the axis, shared by all the cells of a row or a column.
+
+    @param data: Dataframe, structured array or Arrow table containing the variables, see as_frame
+    @param hue: Categorical variable name to split thumbnails with
+    @param vars: List of variable names to display
+    @param color: Color of thumbnails if hue=None
+    @param palette: color map for hue
+    @param cmap: Color scale to map coefficients to rectangle colors. (hue = None)
+    @param thumbnails: Whether to draw the thumbnails of the lower triangle and of the diagonal. Only coefficients are
+    drawn otherwise
+    @param thumbnail_size: Number of pixels along each side of a thumbnail, which is also the number of bins of numeric
+    variables. From 4 to 32, as the figure allows, if None
+    @param annot: Whether to write coefficients in their cells. Only for 20 variables or less if None
+    @param rng: Random generator, for reproducible significance tests
+    @param n_jobs: Number of worker processes computing thumbnails and significance tests, -1 for all cores
+    @param significance: Whether to test the coefficients, see pairplot. Coefficients that are not significant at the
+    5% level are hatched
+    @param n_resamples: Number of permutations and bootstrap resamples of each coefficient. (significance = True)
+    @param store: Directory, or PanelStore, keeping the thumbnail histograms and significance tests on disk, see
+    pairplot
+    @param max_categories: If given, categorical variables, hue included, keep their max_categories most frequent
+    categories, the others being folded into an 'other' category
+    @param other_label: Label of the category the others are folded into. (max_categories given)
+    @param ax: Matplotlib axis on which draw the matrix. A new square figure if None
+    @param profile: Whether to time each phase of the plot, and its rendering, see pairplot
+    @return: The MatrixGrid, with the coefficients of the upper triangle in its association_matrix attribute, and their
+    p-values and confidence intervals in its significance attribute if tested
+    """
+    data = as_frame(data, None if vars is None else list(dict.fromkeys(list(vars) + ([hue] if hue else []))))
+    vars = list(data.columns if vars is None else vars)
+    if max_categories is not None:
+        data = fold_categories(data, {var: top_categories(data[var], max_categories)
+                                      for var in dict.fromkeys(vars + [hue])
+                                      if var is not None and isinstance(data[var].dtype, pd.CategoricalDtype)
+                                      and len(data[var].cat.categories) > max_categories}, other_label)
+    n_vars = len(vars)
+    if ax is None:
+        size = min(max(6., .25 * n_vars), 30.)
+        ax = plt.figure(figsize=(size, size)).add_subplot()
+    cell_points = ax.get_window_extent().height * 72 / ax.figure.dpi / n_vars
+    thumbnail_size = int(np.clip(cell_points * ax.figure.dpi / 72, 4, 32)) if thumbnail_size is None \
+        else thumbnail_size
+    store = as_store(store)
+    # Numeric variables are binned once per pixel of thumbnails
+    cache = BinningCache(data, hue, thumbnail_size)
+
+    # Coefficients, as one collection
+    ###################################
+    coefs = cache.association_matrix(vars)
+    rows, columns = np.triu_indices(n_vars, 1)
+    values = coefs.to_numpy()[rows, columns]
+    with phase('artists', cell='upper', rows=len(data)):
+        bounds, colors = coef_rectangle(values, (columns, columns + 1, rows, rows + 1), hue is not None, cmap=cmap)
+        ax.add_collection(rectangles(bounds, facecolors=colors, linewidths=0))
+    tests = None
+    if significance:
+        tests = association_significance(data, vars, n_resamples,
+                                         seed=None if rng is None else int(rng.integers(2 ** 32)), n_jobs=n_jobs,
+                                         store=store)
+        # Rows of the table are in the order of the upper triangle
+        hatched = (tests['p_value'] >= .05).to_numpy()
+        with phase('artists', cell='upper', rows=len(data)):
+            # Hatches are drawn with the edge color, the edge itself being hidden
+            ax.add_collection(rectangles([bound[hatched] for bound in bounds], facecolors='none',
+                                         edgecolors=(0, 0, 0, .4), linewidths=0, hatch='///'))
+    if annot or annot is None and n_vars <= 20:
+        labels = ['%.2f' % coef if tests is None or np.isnan(tests['ci_low'].iloc[k]) else
+                  '%.2f\n[%.2f, %.2f]' % (coef, tests['ci_low'].iloc[k], tests['ci_high'].iloc[k])
+                  for k, coef in enumerate(values)]
+        # Characters are about .6 times as wide as the font size: the longest line fits in its cell
+        width = max((len(line) for label in labels for line in label.split('\n')), default=1)
+        fontsize = np.clip(.9 * cell_points / (.6 * width), 1, 10)
+        for row, column, label in zip(rows, columns, labels):
+            ax.text(column + .5, row + .5, label, ha='center', va='center', fontsize=fontsize)
+
+    # Thumbnails, as one image
+    ############################
+    if thumbnails:
+        tasks = [{'key': ('diag', var), 'kind': 'hist1d', 'x': var, 'hue': hue, 'edges': cache.edges(var)}
+                 for var in vars]
+        tasks += [{'key': ('lower', vars[column], vars[row]), 'kind': 'hist2d', 'x': vars[column], 'y': vars[row],
+                   'hue': hue, 'x_edges': cache.edges(vars[column]), 'y_edges': cache.edges(vars[row])}
+                  for row, column in zip(*np.tril_indices(n_vars, -1))]
+        payloads = memoized_panels(cache, vars, tasks, n_jobs, store)
+        hue_colors = mpl.colors.to_rgba_array([color] if hue is None else sns.color_palette(palette, cache.n_hue))
+        with phase('artists', cell='grid', rows=len(data)):
+            mosaic = np.zeros((n_vars * thumbnail_size, n_vars * thumbnail_size, 4), dtype=np.float32)
+            positions = {var: i for i, var in enumerate(vars)}
+            for task, payload in zip(tasks, payloads):
+                row, column = positions[task.get('y', task['x'])], positions[task['x']]
+                if task['kind'] == 'hist1d':
+                    thumbnail = bar_thumbnail(payload['counts'], hue_colors, thumbnail_size)
+                else:
+                    thumbnail = density_thumbnail(payload['counts'], hue_colors, thumbnail_size)
+                mosaic[row * thumbnail_size:(row + 1) * thumbnail_size,
+                       column * thumbnail_size:(column + 1) * thumbnail_size] = thumbnail
+            ax.imshow(mosaic, extent=(0, n_vars, n_vars, 0), interpolation='nearest', aspect='auto')
+
+    # Shared ticks
+    ################
+    ax.set_xlim(0, n_vars)
+    ax.set_ylim(n_vars, 0)
+    ticks, fontsize = np.arange(n_vars) + .5, np.clip(cell_points * .8, 1, 10)
+    ax.set_xticks(ticks, vars, rotation=90, fontsize=fontsize)
+    ax.set_yticks(ticks, vars, fontsize=fontsize)
+    ax.tick_params(length=0)
+    ax.vlines(np.arange(1, n_vars), 0, n_vars, colors='.85', linewidths=.5)
+    ax.hlines(np.arange(1, n_vars), 0, n_vars, colors='.85', linewidths=.5)
+    return MatrixGrid(ax, vars, coefs, tests)
+
+
+def rectangles(bounds: tuple[np.ndarray, ...], **kwargs) -> PolyCollection:
+    """
+    Returns a single collection of rectangles, built from arrays of vertices rather than from a patch per rectangle
+
+    @param bounds: Arrays of the abscissa, ordinate, width and height of each rectangle
+    @param kwargs: Keyword arguments of PolyCollection, like facecolors
+    """
+    x, y, width, height = (np.asarray(bound, dtype=float) for bound in bounds)
+    vertices = np.stack([np.column_stack(corner) for corner in ((x, y), (x + width, y), (x + width, y + height),
+                                                                 (x, y + height))], axis=1)
+    return PolyCollection(vertices, **kwargs)
+
+
+def resample_bins(counts: np.ndarray, size: int, axis: int) -> np.ndarray:
+    """
+    Resamples counts along an axis to a number of pixels: adjacent bins are summed into a pixel if there are more bins
+    than pixels, and a bin spans several pixels otherwise
+
+    @param counts: Counts by bin along axis
+    @param size: Number of pixels
+    @param axis: Axis of the bins
+    """
+    starts = np.arange(size) * counts.shape[axis] // size
+    if counts.shape[axis] >= size:
+        return np.add.reduceat(counts, starts, axis=axis)
+    return np.take(counts, starts, axis=axis)
+
+
+def density_thumbnail(counts: np.ndarray, colors: np.ndarray, size: int) -> np.ndarray:
+    """
+    Shades a bivariate histogram into a square RGBA thumbnail, see shade
+
+    @param counts: Array of shape (n_hue, x bins, y bins)
+    @param colors: Array of shape (n_hue, 4) with the color of each hue
+    @param size: Number of pixels along each side
+    @return: Array of shape (size, size, 4), the largest ordinates on the first row
+    """
+    counts = resample_bins(resample_bins(counts, size, 1), size, 2)
+    return shade(counts.transpose(0, 2, 1)[:, ::-1], colors)
+
+
+def bar_thumbnail(counts: np.ndarray, colors: np.ndarray, size: int) -> np.ndarray:
+    """
+    Draws a histogram into a square RGBA thumbnail: a bar per pixel column, colored by the blend of its hue colors
+
+    @param counts: Array of shape (n_hue, bins)
+    @param colors: Array of shape (n_hue, 4) with the color of each hue
+    @param size: Number of pixels along each side
+    @return: Array of shape (size, size, 4), the bottom of bars on the last row
+    """
+    counts = resample_bins(counts, size, 1)
+    total = counts.sum(axis=0)
+    heights = np.ceil(total / max(total.max(), 1) * size)
+    thumbnail = np.zeros((size, size, 4))
+    thumbnail[..., :3] = (np.tensordot(counts, colors[:, :3], axes=(0, 0)) / np.maximum(total, 1)[:, np.newaxis])
+    thumbnail[..., 3] = .75
+    thumbnail[np.arange(size)[::-1, np.newaxis] >= heights] = 0
+    return thumbnail
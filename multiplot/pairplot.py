@@ -1,16 +1,33 @@
 from multiplot import (contingencyplot, coefplot, pearson_coefficient, contingence_coefficient,
                        lower_plot_quanti, lower_plot_quali)
-from pingouin import welch_anova
+from multiplot.association import eta2_from_grouped_sums, grouped_sums
+from multiplot.binning import BinningCache
+from multiplot.columnar import Table, as_frame, fold_categories, top_categories
+from multiplot.contingencyplot import category_codes
+from multiplot.sampling import strata_codes, stratified_sample
+from multiplot.profiling import phase, profilable, profiled_cell
+from multiplot.panels import map_panels
+from multiplot.significance import association_significance, significance_of
+from multiplot.incremental import GridUpdater
+from multiplot.lod import check_lod
+from multiplot.matrixplot import matrixplot
+from multiplot.store import PanelStore, as_store
+import os
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib as mlp
 
 
-def pairplot(data: pd.DataFrame, hue: str | None = None, vars: [str] = None,
+@profilable
+def pairplot(data: Table, hue: str | None = None, vars: [str] = None,
              color: tuple[float, ...] | str = (.7, .7, 0), s: int = 5, density=False, cmap='Greens', palette='Set1',
-             bins: int = 20):
+             coef_cmap: str = 'RdBu_r', bins: int = 20, rng: np.random.Generator | None = None, render: str = 'points',
+             n_jobs: int | None = None, max_points: int | None = None, significance=False, n_resamples: int = 999,
+             store: str | os.PathLike | PanelStore | None = None, max_categories: int | None = None,
+             other_label: str = 'other', lod: int | None = None, layout: str = 'grid', profile=False):
     """
-    @param data: Dataframe containing the variables. Only quantitative variables are kept
+    @param data: Dataframe, structured array or Arrow table containing the variables, see as_frame
     @param hue: Categorical variable name to distinguish points with
     @param vars: List of variable names to display
     @param color: Used for markers if hue=None
@@ -18,22 +35,90 @@ def pairplot(data: pd.DataFrame, hue: str | None = None, vars: [str] = None,
     @param density: Whether to display the points or their density
     @param palette: color map for densities
     @param cmap: color map for densities
-    @param bins: Bins for bivariate histograms
+    @param coef_cmap: Color scale to map coefficients of the upper diagonal to rectangle colors. (hue = None)
+    @param bins: Bins for histograms of numeric variables. With density=True, n_jobs, store or lod, diagonal histograms
+    use them too, rather than the automatic bins of seaborn
+    @param rng: Random generator, for reproducible contingency plots
+    @param render: For scatter plots, 'points' to draw each point, 'raster' to aggregate them into one image per plot
+    @param n_jobs: If given, cells are computed in this number of worker processes (-1 for all cores), then drawn.
+    Histograms are always computed before being drawn, in the current process if None
+    @param max_points: If given, scatter and contingency plots draw at most about this number of points, sampled by
+    hue and by category cell in proportion to their size. Coefficients and diagonal histograms use all points
+    @param significance: Whether to test the coefficients, with permutation p-values and bootstrap 95% confidence
+    intervals computed in n_jobs processes. Intervals are written under coefficients, and coefficients that are not
+    significant at the 5% level are hatched
+    @param n_resamples: Number of permutations and bootstrap resamples of each coefficient. (significance = True)
+    @param store: Directory, or PanelStore, keeping the histograms, coordinates, coefficients and significance tests
+    of cells on disk. Drawing the same data again with the same computation parameters, but another style, reads them
+    instead of binning the variables and computing statistics. Cells are then computed as with n_jobs
+    @param max_categories: If given, categorical variables, hue included, keep their max_categories most frequent
+    categories, the others being folded into an 'other' category. Histograms, ticks, coefficients and rows added by
+    update all count the folded categories as one
+    @param other_label: Label of the category the others are folded into. (max_categories given)
+    @param lod: If given, scatter and contingency plots draw at most about this number of points within their view
+    limits, drawn again from all the rows each time they are zoomed or panned, see ZoomScatter. Cells are then computed
+    as with n_jobs, and max_points is ignored
+    @param layout: 'grid' to draw each cell on its own axis, 'matrix' to draw every cell on a single axis, for tables
+    of many variables, see matrixplot. Lower cells are then histogram thumbnails, and s, density, cmap, bins, render,
+    max_points and lod are ignored
+    @param profile: Whether to time each phase of each cell, and the rendering of the grid. The report is kept in the
+    profile attribute of the grid, as a dataframe with one row per phase of each cell
+    @return: The PairGrid, with the coefficients of the upper diagonal in its association_matrix attribute, their
+    p-values and confidence intervals in its significance attribute if tested, and an update method adding rows to it
+    in place, see GridUpdater. The MatrixGrid if layout='matrix'
     """
+    lod = None if lod is None else check_lod(lod)
+    if layout == 'matrix':
+        return matrixplot(data, hue=hue, vars=vars, color=color, palette=palette, cmap=coef_cmap, rng=rng,
+                          n_jobs=1 if n_jobs is None else n_jobs, significance=significance, n_resamples=n_resamples,
+                          store=store, max_categories=max_categories, other_label=other_label)
+    data = as_frame(data, None if vars is None else list(dict.fromkeys(list(vars) + ([hue] if hue else []))))
     if vars is None:
         vars = data.columns
+    collapsed = {}
+    if max_categories is not None:
+        collapsed = {var: top_categories(data[var], max_categories) for var in dict.fromkeys(list(vars) + [hue])
+                     if var is not None and isinstance(data[var].dtype, pd.CategoricalDtype)
+                     and len(data[var].cat.categories) > max_categories}
+        data = fold_categories(data, collapsed, other_label)
     hue_order = data[hue].cat.categories if hue is not None else None
-    grig = sns.PairGrid(data, hue=hue, hue_order=hue_order, vars=vars, diag_sharey=False)
+    with phase('artists', cell='grid', rows=len(data)):
+        grig = sns.PairGrid(data, hue=hue, hue_order=hue_order, vars=vars, diag_sharey=False)
+    # Codes, bin edges and bin indices of each variable, shared by all the cells
+    cache = BinningCache(data, hue, bins)
+    store = as_store(store)
+    tests = None
+    if significance:
+        tests = association_significance(data, list(grig.x_vars), n_resamples,
+                                         seed=None if rng is None else int(rng.integers(2 ** 32)),
+                                         n_jobs=1 if n_jobs is None else n_jobs, store=store)
+    grig.significance = tests
+    updater = dict(grid=grig, data=data, hue=hue, bins=bins, density=density, render=render, color=color, cmap=cmap,
+                   palette=palette, coef_cmap=coef_cmap, rng=rng, max_points=max_points, cache=cache, collapsed=collapsed,
+                   other_label=other_label)
+    if n_jobs is not None or density or store is not None or lod is not None:
+        payloads = map_panels(grig, data, hue=hue, density=density, bins=bins, render=render, rng=rng,
+                              n_jobs=1 if n_jobs is None else n_jobs, color=color, s=s, cmap=cmap, palette=palette,
+                              cache=cache, max_points=max_points, significance=tests, store=store,
+                              lod=lod, coef_cmap=coef_cmap)
+        grig.update = GridUpdater(payloads=payloads, **updater).update
+        return grig
     hue = hue if hue is None else data[hue]
-    grig.map_lower(lower_plot, hue=hue, c=color, s=s, density=density, cmap=cmap, palette=palette, bins=bins,
-                   stranger=1)
-    grig.map_diag(sns.histplot, color=color, hue=hue, hue_order=hue_order, palette=palette, multiple='stack')
-    grig.map_upper(upper_plot)
+    grig.map_lower(profiled_cell(lower_plot, 'lower'), hue=hue, c=color, s=s, density=density, cmap=cmap, palette=palette, bins=bins,
+                   rng=rng, render=render, cache=cache, max_points=max_points, stranger=1)
+    grig.map_diag(profiled_cell(sns.histplot, 'diag'), color=color, hue=hue, hue_order=hue_order, palette=palette, multiple='stack')
+    stats = cache.association_stats(grig.x_vars)
+    grig.association_matrix = stats.matrix()
+    grig.map_upper(profiled_cell(upper_plot, 'upper'), coefs=grig.association_matrix, significance=tests,
+                   cmap=coef_cmap)
+    grig.update = GridUpdater(stats=stats, **updater).update
     return grig
 
 
 def lower_plot(x: pd.Series, y: pd.Series, hue=None, hue_order=None, c: tuple[float, ...] | str = (.7, .7, 0),
-               s: int = 5, density=False, cmap='Greens', palette='Set1', bins: int = 20, **kwargs):
+               s: int = 5, density=False, cmap='Greens', palette='Set1', bins: int = 20,
+               rng: np.random.Generator | None = None, render: str = 'points', cache: BinningCache | None = None,
+               max_points: int | None = None, **kwargs):
     del kwargs['stranger']
     color = c
     if isinstance(x.dtype, pd.CategoricalDtype):
@@ -41,29 +126,42 @@ def lower_plot(x: pd.Series, y: pd.Series, hue=None, hue_order=None, c: tuple[fl
             if density:
                 return lower_plot_quali(x, y, color=color, density=density, cmap=cmap, hue=hue, hue_order=hue_order, palette=palette, **kwargs)
             else:
-                return lower_plot_quali(x, y, color=color, s=s, hue=hue, density=density, palette=palette, hue_order=hue_order, **kwargs)
+                return lower_plot_quali(x, y, color=color, s=s, hue=hue, density=density, palette=palette, hue_order=hue_order,
+                                        rng=rng, render=render, cache=cache, max_points=max_points, **kwargs)
         if density:
             norm = mlp.colors.LogNorm()
             return sns.histplot(x=x, y=y, cmap=cmap, vmin=None, vmax=None, norm=norm, bins=bins, hue=hue,
                                 palette=palette, hue_order=hue_order, **kwargs)
         else:
-            return contingencyplot(x=x, y=y, hue=hue, hue_order=hue_order, color=color, s=s, **kwargs)
+            return contingencyplot(x=x, y=y, hue=hue, hue_order=hue_order, palette=palette, color=color, s=s, rng=rng,
+                                   render=render, cache=cache, max_points=max_points, **kwargs)
     elif isinstance(y.dtype, pd.CategoricalDtype):
         if density:
             norm = mlp.colors.LogNorm()
             return sns.histplot(x=x, y=y, cmap=cmap, vmin=None, vmax=None, norm=norm, bins=bins, hue=hue,
                                 palette=palette, hue_order=hue_order, **kwargs)
         else:
-            return contingencyplot(x=x, y=y, hue=hue, hue_order=hue_order, color=color, s=s, **kwargs)
+            return contingencyplot(x=x, y=y, hue=hue, hue_order=hue_order, palette=palette, color=color, s=s, rng=rng,
+                                   render=render, cache=cache, max_points=max_points, **kwargs)
     else:
         if not density:
-            return lower_plot_quanti(x, y, color=color, s=s, density=density, palette=palette, hue=hue, hue_order=hue_order, **kwargs)
+            if max_points is not None and render == 'points':
+                # Only drawn points are decimated, keeping hue proportions
+                hue_codes = None if hue is None else category_codes(hue)
+                rows = stratified_sample(strata_codes(len(x), hue_codes), max_points, rng=rng)
+                x, y, hue = x.iloc[rows], y.iloc[rows], None if hue is None else hue.iloc[rows]
+            return lower_plot_quanti(x, y, color=color, s=s, density=density, palette=palette, hue=hue, hue_order=hue_order,
+                                     render=render, **kwargs)
         else:
             return lower_plot_quanti(x, y, color=color, density=density, palette=palette, hue=hue, hue_order=hue_order, cmap=cmap, bins=bins,
                               **kwargs)
 
 
-def upper_plot(x: pd.Series, y: pd.Series, hue=None, **kwargs):
+def upper_plot(x: pd.Series, y: pd.Series, hue=None, coefs: pd.DataFrame | None = None,
+               significance: pd.DataFrame | None = None, **kwargs):
+    if coefs is not None:
+        return coefplot(x, y, hue=hue, coef=coefs.loc[x.name, y.name], **significance_of(significance, x.name, y.name),
+                        **kwargs)
     if isinstance(x.dtype, pd.CategoricalDtype):
         if isinstance(y.dtype, pd.CategoricalDtype):
             coef_func = contingence_coefficient
@@ -76,13 +174,27 @@ def upper_plot(x: pd.Series, y: pd.Series, hue=None, **kwargs):
     return coefplot(x, y, hue=hue, coef_func=coef_func, **kwargs)
 
 
-def eta2_coefficient(x: pd.Series, y: pd.Series):
+def eta2_coefficient(x: pd.Series, y: pd.Series) -> float:
+    """
+    Calculates the one-way ANOVA eta-squared between a categorical and a numeric variable: the share of the variance of
+    the numeric variable explained by the categories. Rows where either is missing are ignored
+
+    @param x: Categorical or numeric series
+    @param y: Numeric or categorical series, of the other type
+    @return: Eta-squared
+    """
     if isinstance(x.dtype, pd.CategoricalDtype):
         y, x = x, y
-    data = pd.concat([x, y], axis=1)
-    # noinspection PyTypeChecker
-    res = welch_anova(dv=x.name, between=y.name, data=data)
-    return res['np2'].iloc[0]
+    codes = category_codes(y)
+    values = x.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    if not present.any():
+        return np.nan
+    # Values are shifted by their mean, to avoid precision loss in sums of squares
+    values = np.where(present, values - values[present].mean(), 0.)
+    sums = grouped_sums(codes, int(codes.max(initial=-1)) + 1, values[:, np.newaxis],
+                        present[:, np.newaxis].astype(float))
+    return float(eta2_from_grouped_sums(*sums)[0])
 
 
 def map_lower():
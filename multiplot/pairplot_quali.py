@@ -1,13 +1,18 @@
-from math import sqrt
 import seaborn as sns
-from contingencyplot import contingencyplot
-from pingouin import chi2_independence
+import numpy as np
 import pandas as pd
-from multiplot import coefplot
-
-
-def pairplot_quali(data: pd.DataFrame, hue: str = None, color=(.7, .7, 0), s=1, density=False, palette='Set1',
-                   cmap='Greens'):
+from multiplot import coefplot, contingencyplot, association_matrix
+from multiplot.association import contingency_from_crosstab, crosstab_codes
+from multiplot.columnar import Table, as_frame, fold_categories, top_categories
+from multiplot.contingencyplot import category_codes
+from multiplot.pairplot_quanti import upper_plot
+from multiplot.profiling import phase, profilable, profiled_cell
+
+
+@profilable
+def pairplot_quali(data: Table, hue: str = None, color=(.7, .7, 0), s=1, density=False, palette='Set1',
+                   cmap='Greens', rng: np.random.Generator | None = None, render: str = 'points',
+                   max_categories: int | None = None, other_label: str = 'other', profile=False):
     """
     Similar to pair plot seaborn function, but for categorical variables.
 
@@ -18,29 +23,45 @@ def pairplot_quali(data: pd.DataFrame, hue: str = None, color=(.7, .7, 0), s=1,
     - Kernel density estimates at the diagonal;
     - Heatmap or sizemap at the top diagonal, representing the Pearson's coefficients.
 
-    @param data: Dataframe containing the variables. Only quantitative variables are kept
+    @param data: Dataframe, structured array or Arrow table containing the variables, see as_frame. Only categorical
+    variables are kept
     @param hue: Categorical variable name to distinguish points with
     @param color: Used for markers if hue=None
     @param s: Marker size
     @param density: Whether to display the points or their density
     @param palette: color map for contingency plot and diagonal histograms
     @param cmap: Color map for heatmap
+    @param rng: Random generator, for reproducible contingency plots
+    @param render: For contingency plots, 'points' to draw each point, 'raster' to aggregate them into one image per
+    plot
+    @param max_categories: If given, variables, hue included, keep their max_categories most frequent categories, the
+    others being folded into an 'other' category
+    @param other_label: Label of the category the others are folded into. (max_categories given)
+    @param profile: Whether to time each phase of each cell, and the rendering of the grid. The report is kept in the
+    profile attribute of the grid, as a dataframe with one row per phase of each cell
+    @return: The PairGrid, with the contingency coefficients in its association_matrix attribute
     """
+    data = as_frame(data)
     categorical_vars = data.select_dtypes('category').columns
+    if max_categories is not None:
+        data = fold_categories(data, {var: top_categories(data[var], max_categories) for var in categorical_vars
+                                      if len(data[var].cat.categories) > max_categories}, other_label)
 
-    grid = sns.PairGrid(data, hue=hue, vars=categorical_vars, palette=palette, diag_sharey=False)
+    with phase('artists', cell='grid', rows=len(data)):
+        grid = sns.PairGrid(data, hue=hue, vars=categorical_vars, palette=palette, diag_sharey=False)
     hue = hue if hue is None else data[hue]
     if density:
         # Plotting heatmaps
         ###################
-        grid.map_lower(lower_plot, color=color, density=density, cmap=cmap)
+        grid.map_lower(profiled_cell(lower_plot, 'lower'), color=color, density=density, cmap=cmap)
     else:
         # Plotting contingency plots
         #############################
-        grid.map_lower(lower_plot, color=color, s=s, density=density)
-    grid.map_diag(sns.histplot, color=color, hue=hue, multiple='stack')
+        grid.map_lower(profiled_cell(lower_plot, 'lower'), color=color, s=s, density=density, rng=rng, render=render)
+    grid.map_diag(profiled_cell(sns.histplot, 'diag'), color=color, hue=hue, multiple='stack')
     hue = hue if not density else None
-    grid.map_upper(coefplot, hue=hue, fg_color=color, coef_func=contingence_coefficient)
+    grid.association_matrix = association_matrix(data, categorical_vars)
+    grid.map_upper(profiled_cell(upper_plot, 'upper'), hue=hue, fg_color=color, coefs=grid.association_matrix)
     return grid
 
 
@@ -70,16 +91,16 @@ def lower_plot(x: pd.Series, y: pd.Series, hue: pd.Series = None, density: bool
 
 def contingence_coefficient(x: pd.Series, y: pd.Series) -> float:
     """
-    Calculates the contingency coefficient between 2 categorical variables
+    Calculates the contingency coefficient between 2 categorical variables, from the chi² statistic of their crosstab.
+    As in a chi² independence test, Yates' correction is applied to 2x2 crosstabs. Missing values are ignored
+
     @param x: Abscissa categorical series
     @param y: Ordinate categorical series
     @return: Contingency coefficient
     """
-    data = pd.concat([x, y], axis=1)
-    # noinspection PyTypeChecker
-    _, _, chi2 = chi2_independence(data, x.name, y.name)
-    chi2 = chi2.loc[0, 'chi2']
-    return sqrt(chi2 / (chi2 + len(data) * len(data.columns)))
+    x_codes, y_codes = category_codes(x), category_codes(y)
+    return float(contingency_from_crosstab(crosstab_codes(x_codes, y_codes, int(x_codes.max(initial=-1)) + 1,
+                                                          int(y_codes.max(initial=-1)) + 1)))
 
 
 if __name__ == '__main__':
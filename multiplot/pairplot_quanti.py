@@ -1,13 +1,21 @@
+import numpy as np
 import seaborn as sns
-from scipy.stats import pearsonr
 import pandas as pd
 from multiplot import coefplot
+from multiplot.binning import BinningCache
+from multiplot.columnar import Table, as_frame
+from multiplot.incremental import GridUpdater
+from multiplot.raster import rasterplot
+from multiplot.profiling import phase, profilable, profiled_cell
+from multiplot.significance import significance_of
 import matplotlib as mlp
 import matplotlib.pyplot as plt
 
 
-def pairplot_quanti(data: pd.DataFrame, hue: str | None = None, color: tuple[float, ...] | str = (.7, .7, 0),
-                    s: int = 5, density=False, palette='Set1', cmap='Greens', bins: int = 20):
+@profilable
+def pairplot_quanti(data: Table, hue: str | None = None, color: tuple[float, ...] | str = (.7, .7, 0),
+                    s: int = 5, density=False, palette='Set1', cmap='Greens', coef_cmap: str = 'RdBu_r', bins: int = 20,
+                    render: str = 'points', profile=False):
     """
     Similar to pair plot seaborn function, but upper diagonal graphs are made with this module's pearson_plot.
 
@@ -16,42 +24,87 @@ def pairplot_quanti(data: pd.DataFrame, hue: str | None = None, color: tuple[flo
     - Kernel density estimates at the diagonal;
     - Heatmap or sizemap at the top diagonal, representing the Pearson's coefficients.
 
-    @param data: Dataframe containing the variables. Only quantitative variables are kept
+    @param data: Dataframe, structured array or Arrow table containing the variables, see as_frame. Only quantitative
+    variables are kept
     @param hue: Categorical variable name to distinguish points with
     @param color: Used for markers if hue=None
     @param s: Marker size
     @param density: Whether to display the points or their density
     @param palette: color map for densities
     @param cmap: Color map for bivariate histograms (2dbins)
+    @param coef_cmap: Color scale to map Pearson's coefficients to rectangle colors. (hue = None)
     @param bins: Bins for bivariate histograms (2dbins)
+    @param render: For scatter plots, 'points' to draw each point, 'raster' to aggregate them into one image per plot
+    @param profile: Whether to time each phase of each cell, and the rendering of the grid. The report is kept in the
+    profile attribute of the grid, as a dataframe with one row per phase of each cell
+    @return: The PairGrid, with the Pearson's coefficients in its association_matrix attribute, and an update method
+    adding rows to it in place, see GridUpdater
     """
-    grid = sns.PairGrid(data, hue=hue, diag_sharey=False)
+    data = as_frame(data)
+    with phase('artists', cell='grid', rows=len(data)):
+        grid = sns.PairGrid(data, hue=hue, diag_sharey=False)
     hue = hue if hue is None else data[hue]
     if not density:
         # Scatter plot
         ###############
-        grid.map_lower(lower_plot, color=color, s=s, density=density, palette=palette, hue=hue)
+        grid.map_lower(profiled_cell(lower_plot, 'lower'), color=color, s=s, density=density, palette=palette, hue=hue, render=render)
     else:
         # Histogram bivariate (2dbins)
         #############################
-        grid.map_lower(lower_plot, color=color, density=density, palette=palette, hue=hue, cmap=cmap, bins=bins)
-    grid.map_diag(sns.histplot, hue=hue, palette=palette, color=color, multiple='stack')
-    grid.map_upper(coefplot, hue=hue, coef_func=pearson_coefficient)
+        grid.map_lower(profiled_cell(lower_plot, 'lower'), color=color, density=density, palette=palette, hue=hue, cmap=cmap, bins=bins)
+    grid.map_diag(profiled_cell(sns.histplot, 'diag'), hue=hue, palette=palette, color=color, multiple='stack')
+    cache = BinningCache(data, hue.name if hue is not None else None, bins)
+    stats = cache.association_stats(grid.x_vars)
+    grid.association_matrix = stats.matrix()
+    grid.map_upper(profiled_cell(upper_plot, 'upper'), hue=hue, coefs=grid.association_matrix, cmap=coef_cmap)
+    grid.update = GridUpdater(grid, data, hue=cache.hue, bins=bins, density=density, render=render, color=color,
+                              cmap=cmap, palette=palette, coef_cmap=coef_cmap, cache=cache, stats=stats).update
     return grid
 
 
-def lower_plot(x: pd.Series, y: pd.Series, hue: pd.Series = None, **kwargs):
+def lower_plot(x: pd.Series, y: pd.Series, hue: pd.Series = None, render: str = 'points', **kwargs):
     density = kwargs.pop('density')
     if density:
         norm = mlp.colors.LogNorm()
         return sns.histplot(x=x, y=y, vmin=None, vmax=None, norm=norm, hue=hue, **kwargs)
+    elif render == 'raster':
+        return rasterplot(x=x, y=y, hue=hue, **{key: kwargs[key] for key in ('hue_order', 'color', 'palette')
+                                                if key in kwargs})
     else:
         return sns.scatterplot(x=x, y=y, hue=hue, **kwargs)
 
 
-def pearson_coefficient(x: pd.Series, y: pd.Series):
-    r2, p_val = pearsonr(x, y)
-    return r2
+def upper_plot(x: pd.Series, y: pd.Series, coefs: pd.DataFrame, hue: pd.Series = None,
+               significance: pd.DataFrame | None = None, **kwargs):
+    """
+    Display the coefficient between x and y, read from a precomputed association matrix
+
+    Made to be used in Seaborn PairGrid.map_upper method
+
+    @param x: Abscissa series
+    @param y: Ordinate series
+    @param coefs: Association matrix, indexed by variable names
+    @param hue: Categorical series to distinguish points with
+    @param significance: P-values and confidence intervals of the pairs of variables, see association_significance
+    """
+    return coefplot(x, y, hue=hue, coef=coefs.loc[x.name, y.name], **significance_of(significance, x.name, y.name),
+                    **kwargs)
+
+
+def pearson_coefficient(x: pd.Series, y: pd.Series) -> float:
+    """
+    Calculates Pearson's correlation coefficient between 2 numeric variables, on rows where both are present
+
+    @param x: Abscissa numeric series
+    @param y: Ordinate numeric series
+    @return: Correlation coefficient
+    """
+    values = np.column_stack([x.to_numpy(dtype=float), y.to_numpy(dtype=float)])
+    values = values[~np.isnan(values).any(axis=1)]
+    if len(values) < 2:
+        return np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return float(np.corrcoef(values, rowvar=False)[0, 1])
 
 
 if __name__ == '__main__':
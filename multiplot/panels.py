@@ -0,0 +1,414 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+from multiplot.association import AssociationStats, category_codes
+from multiplot.binning import Column, BinningCache
+from multiplot.contingencyplot import pair_coordinates
+from multiplot.histograms import (bin_index, hist1d_counts, hist2d_counts, hue_colormaps, draw_hist1d, draw_hist2d,
+                                  set_categorical_ticks)
+from multiplot.lod import ZoomScatter
+from multiplot.raster import raster_counts, draw_raster
+from multiplot.sampling import strata_codes, stratified_sample
+from multiplot.store import PanelStore
+from multiplot.profiling import current_profiler, profiled_cell
+from multiplot.pairplot_quanti import upper_plot
+
+
+class SharedColumns:
+    """
+    Columns copied once into shared memory blocks, so that worker processes read them without copying them
+    """
+
+    def __init__(self, columns: dict[str, Column]):
+        """
+        @param columns: Columns to share, by variable name
+        """
+        self.blocks = []
+        # What a worker needs to attach each column: values and bin index specs, and categories
+        self.specs = {}
+        for var, column in columns.items():
+            values = self.share(column.values)
+            # Categorical columns are their own bin index
+            binned = None if column.binned is None or column.binned is column.values else self.share(column.binned)
+            self.specs[var] = (values, binned, column.categories)
+
+    def share(self, array: np.ndarray) -> tuple[str, str, int]:
+        """
+        Copies a 1D array into a new shared memory block
+
+        @return: Block name, dtype and length, to attach the array with
+        """
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+        self.blocks.append(block)
+        return block.name, array.dtype.str, len(array)
+
+    def close(self):
+        """
+        Frees the shared memory blocks
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self) -> 'SharedColumns':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Shared blocks and columns attached by the current worker process
+_worker_blocks = []
+_worker_columns = {}
+
+
+def _attach_array(name: str, dtype: str, length: int) -> np.ndarray:
+    block = shared_memory.SharedMemory(name=name)
+    _worker_blocks.append(block)
+    return np.ndarray((length,), dtype, buffer=block.buf)
+
+
+def _attach_columns(specs: dict):
+    for var, (values, binned, categories) in specs.items():
+        values = _attach_array(*values)
+        binned = values if binned is None and categories is not None else \
+            None if binned is None else _attach_array(*binned)
+        _worker_columns[var] = Column(values, categories, binned)
+    # Run as the worker exits, whether it was forked or spawned, unlike atexit handlers in forked workers
+    util.Finalize(None, _detach_columns, exitpriority=10)
+
+
+def _detach_columns():
+    # Columns are views of the blocks, which can only be closed once they are released
+    _worker_columns.clear()
+    for block in _worker_blocks:
+        try:
+            block.close()
+        except BufferError:
+            pass
+    _worker_blocks.clear()
+
+
+def _compute_in_worker(task: dict) -> tuple[dict, float]:
+    return timed_compute_panel(task, _worker_columns)
+
+
+# Profiling phase of each kind of task
+TASK_PHASES = {'hist1d': 'binning', 'hist2d': 'binning', 'raster': 'binning', 'points': 'jitter',
+               'coef': 'coefficient'}
+
+
+def compute_panel(task: dict, columns: dict[str, Column]) -> dict:
+    """
+    Computes the payload of one grid cell: everything its drawing needs, and nothing that depends on style.
+
+    Pure function of the task and the columns, so that it can run in any process. Task kinds are:
+    - 'hist1d': histogram of 'x', with 'edges';
+    - 'hist2d': bivariate histogram of 'x' and 'y', with 'x_edges' and 'y_edges';
+    - 'points': coordinates of the scatter or contingency plot of 'x' and 'y', drawn with 'seed'. With 'max_points',
+    only a sample of rows stratified by hue and category cell, whose positions are in 'rows';
+    - 'raster': pixel counts of the scatter or contingency plot of 'x' and 'y', with 'resolution';
+    - 'coef': association coefficient between 'x' and 'y'.
+    Histograms and rasters are split by 'hue' when given. They reuse the bin index of columns, computed with the same
+    edges, when there is one.
+
+    @param task: Description of the computation
+    @param columns: Columns, by variable name
+    @return: Payload, with the kind of the task
+    """
+    kind = task['kind']
+    hue = columns[task['hue']] if task.get('hue') is not None else None
+    hue_codes, n_hue = (None, 1) if hue is None else (hue.values, len(hue.categories))
+    x = columns[task['x']]
+    if kind == 'hist1d':
+        edges = task['edges']
+        index = x.binned if x.binned is not None else bin_index(x.values, edges)
+        return {'kind': kind, 'counts': hist1d_counts(index, len(edges) - 1, hue_codes, n_hue), 'edges': edges}
+
+    y = columns[task['y']]
+    if kind == 'hist2d':
+        x_edges, y_edges = task['x_edges'], task['y_edges']
+        x_index = x.binned if x.binned is not None else bin_index(x.values, x_edges)
+        y_index = y.binned if y.binned is not None else bin_index(y.values, y_edges)
+        counts = hist2d_counts(x_index, y_index, len(x_edges) - 1, len(y_edges) - 1, hue_codes, n_hue)
+        return {'kind': kind, 'counts': counts, 'x_edges': x_edges, 'y_edges': y_edges}
+    if kind == 'coef':
+        stats = AssociationStats([task['x'], task['y']], {var: column.categories for var, column
+                                                          in ((task['x'], x), (task['y'], y))
+                                                          if column.categories is not None})
+        numeric = [column.values for column in (x, y) if column.categories is None]
+        codes = {var: column.values for var, column in ((task['x'], x), (task['y'], y))
+                 if column.categories is not None}
+        stats.update_arrays(np.column_stack(numeric) if numeric else np.empty((len(x.values), 0)), codes)
+        return {'kind': kind, 'coef': stats.matrix().iloc[0, 1]}
+
+    # Scatter or contingency coordinates
+    #####################################
+    rng = np.random.default_rng(task.get('seed'))
+    x_real, y_real = pair_coordinates(x, y, hue_codes, task.get('square_len', .5), rng)
+    if kind == 'points':
+        if task.get('max_points') is None:
+            return {'kind': kind, 'x': x_real, 'y': y_real}
+        rows = stratified_sample(strata_codes(len(x_real), *(column.values for column in (x, y)
+                                                             if column.categories is not None), hue_codes),
+                                 task['max_points'], rng=rng)
+        return {'kind': kind, 'x': x_real[rows], 'y': y_real[rows], 'rows': rows}
+    counts, x_edges, y_edges = raster_counts(x_real, y_real, hue_codes, n_hue, task.get('resolution', 256))
+    return {'kind': kind, 'counts': counts, 'x_edges': x_edges, 'y_edges': y_edges}
+
+
+def timed_compute_panel(task: dict, columns: dict[str, Column]) -> tuple[dict, float]:
+    """
+    Computes the payload of one grid cell, see compute_panel, and the time it took
+    """
+    start = time.perf_counter()
+    payload = compute_panel(task, columns)
+    return payload, time.perf_counter() - start
+
+
+def compute_panels(columns: dict[str, Column], tasks: [dict], n_jobs: int = 1) -> [dict]:
+    """
+    Computes the payloads of several grid cells, in a pool of worker processes reading shared columns
+
+    @param columns: Columns, by variable name
+    @param tasks: Descriptions of the computations, see compute_panel
+    @param n_jobs: Number of worker processes. 1 computes in the current process, -1 uses all cores
+    @return: The payload of each task, in order
+    """
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if n_jobs == 1 or len(tasks) <= 1:
+        results = [timed_compute_panel(task, columns) for task in tasks]
+    else:
+        with SharedColumns(columns) as shared, ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_columns,
+                                                                   initargs=(shared.specs,)) as executor:
+            results = list(executor.map(_compute_in_worker, tasks))
+    profiler = current_profiler()
+    if profiler is not None:
+        # Tasks are timed where they run, possibly in another process
+        for task, (_, seconds) in zip(tasks, results):
+            cell, x_var, y_var = task['key'][0], task['x'], task.get('y')
+            if cell == 'coef':
+                # Coefficients are drawn in the upper cell, where variables are swapped
+                cell, x_var, y_var = 'upper', y_var, x_var
+            profiler.record(TASK_PHASES[task['kind']], seconds, cell=cell, x=x_var, y=y_var,
+                            rows=len(columns[task['x']].values))
+    return [payload for payload, _ in results]
+
+
+def memoized_panels(cache: BinningCache, vars: [str], tasks: [dict], n_jobs: int = 1,
+                    store: PanelStore | None = None) -> [dict]:
+    """
+    Computes the payloads of several grid cells, see compute_panels, reading those already in a store
+
+    @param cache: Encodings of the variables, only computed for payloads missing from the store
+    @param vars: List of variable names of the tasks
+    @param tasks: Descriptions of the computations, see compute_panel
+    @param n_jobs: Number of worker processes. 1 computes in the current process, -1 uses all cores
+    @param store: Payloads stored on disk. Computed payloads are stored in it. Nothing is read nor stored if None
+    @return: The payload of each task, in order
+    """
+    if store is None:
+        return compute_panels(cache.columns(vars), tasks, n_jobs)
+    fingerprints = {var: cache.fingerprint(var) for var in list(vars) + ([] if cache.hue is None else [cache.hue])}
+    return store.memoize(tasks, fingerprints, lambda missing: compute_panels(cache.columns(vars), missing, n_jobs))
+
+
+def plan_panels(cache: BinningCache, vars: [str], density=False, render: str = 'points',
+                rng: np.random.Generator | None = None, max_points: int | None = None) -> tuple[list[dict], dict]:
+    """
+    Lists the computations of a pair grid, one task per cell, and the payloads that need no computation
+
+    @param cache: Encodings of the variables, whose bin edges are used by histograms
+    @param vars: List of variable names of the grid
+    @param density: Whether to display the points or their density
+    @param render: For scatter plots, 'points' to draw each point, 'raster' to aggregate them into one image per plot
+    @param rng: Random generator, for reproducible contingency plots
+    @param max_points: If given, scatter and contingency plots draw at most about this number of points
+    @return: Tasks, each with its 'key' in the grid, and payloads by key
+    """
+    hue, categories = cache.hue, {var: cache.variable_categories(var) for var in vars}
+    edges = {var: cache.edges(var) for var in vars}
+    tasks, payloads = [], {}
+    for i, y_var in enumerate(vars):
+        tasks.append({'key': ('diag', y_var), 'kind': 'hist1d', 'x': y_var, 'hue': hue, 'edges': edges[y_var]})
+        for x_var in vars[:i]:
+            tasks.append({'key': ('coef', x_var, y_var), 'kind': 'coef', 'x': x_var, 'y': y_var})
+            key = ('lower', x_var, y_var)
+            if density:
+                tasks.append({'key': key, 'kind': 'hist2d', 'x': x_var, 'y': y_var, 'hue': hue,
+                              'x_edges': edges[x_var], 'y_edges': edges[y_var]})
+            elif render == 'raster':
+                tasks.append({'key': key, 'kind': 'raster', 'x': x_var, 'y': y_var, 'hue': hue,
+                              'seed': None if rng is None else int(rng.integers(2 ** 32))})
+            elif categories[x_var] is None and categories[y_var] is None and max_points is None:
+                # Scatter plots are drawn from the data itself
+                payloads[key] = {'kind': 'points'}
+            else:
+                tasks.append({'key': key, 'kind': 'points', 'x': x_var, 'y': y_var, 'hue': hue,
+                              'seed': None if rng is None else int(rng.integers(2 ** 32)), 'max_points': max_points})
+    return tasks, payloads
+
+
+def coefficient_matrix(payloads: dict, vars: [str]) -> pd.DataFrame:
+    """
+    Gathers the coefficients of 'coef' payloads into a symmetric association matrix
+
+    @param payloads: Payloads, by key
+    @param vars: List of variable names
+    """
+    matrix = pd.DataFrame(np.nan, index=list(vars), columns=list(vars))
+    for key, payload in payloads.items():
+        if key[0] == 'coef':
+            matrix.loc[key[1], key[2]] = matrix.loc[key[2], key[1]] = payload['coef']
+    return matrix
+
+
+def map_panels(grid: sns.PairGrid, data: pd.DataFrame, hue: str | None = None, density=False, bins: int = 20,
+               render: str = 'points', rng: np.random.Generator | None = None, n_jobs: int = 1,
+               color: tuple[float, ...] | str = (.7, .7, 0), s: int = 5, cmap='Greens', palette='Set1',
+               cache: BinningCache | None = None, max_points: int | None = None,
+               significance: pd.DataFrame | None = None, store: PanelStore | None = None,
+               lod: int | None = None, coef_cmap: str = 'RdBu_r') -> dict:
+    """
+    Fills a pair grid in two steps: cells are computed in a pool of worker processes, then drawn in this process
+
+    @param grid: Square PairGrid to fill
+    @param data: Dataframe containing the variables
+    @param hue: Categorical variable name to distinguish points with
+    @param density: Whether to display the points or their density
+    @param bins: Bins for histograms of numeric variables
+    @param render: For scatter plots, 'points' to draw each point, 'raster' to aggregate them into one image per plot
+    @param rng: Random generator, for reproducible contingency plots
+    @param n_jobs: Number of worker processes. 1 computes in the current process, -1 uses all cores
+    @param color: Used for markers and histograms if hue=None
+    @param s: Marker size
+    @param cmap: color map for densities
+    @param palette: color map for hue
+    @param cache: Encodings of the variables of data, shared with other grids. Computed here if None
+    @param max_points: If given, scatter and contingency plots draw at most about this number of points, sampled by
+    hue and by category cell. Coefficients and diagonal histograms use all points
+    @param significance: P-values and confidence intervals of the coefficients, see association_significance
+    @param store: Payloads stored on disk by previous grids. Payloads found there are read, others are computed and
+    stored. Variables are only encoded if a payload is missing
+    @param lod: If given, scatter and contingency plots draw at most about this number of points within their view,
+    drawn again from all the rows as they are zoomed or panned, see ZoomScatter. max_points is then ignored
+    @param coef_cmap: Color scale to map coefficients to rectangle colors. (hue = None)
+    @return: The payloads drawn, by key
+    """
+    vars = list(grid.x_vars)
+    cache = BinningCache(data, hue, bins) if cache is None else cache
+    tasks, payloads = plan_panels(cache, vars, density, render, rng, max_points if lod is None else None)
+    payloads.update(zip((task['key'] for task in tasks), memoized_panels(cache, vars, tasks, n_jobs, store)))
+    categories = {var: cache.variable_categories(var) for var in vars
+                  if cache.variable_categories(var) is not None}
+    draw_panels(grid, payloads, coefficient_matrix(payloads, vars), categories,
+                hue=None if hue is None else data[hue], hue_order=cache.hue_order, color=color, s=s, cmap=cmap,
+                palette=palette, significance=significance, lod=lod, coef_cmap=coef_cmap)
+    return payloads
+
+
+def draw_panels(grid: sns.PairGrid, payloads: dict, coefs: pd.DataFrame, categories: dict,
+                hue: pd.Series | None = None, hue_order: pd.Index | None = None,
+                color: tuple[float, ...] | str = (.7, .7, 0), s: int = 5, cmap='Greens', palette='Set1',
+                significance: pd.DataFrame | None = None, lod: int | None = None, coef_cmap: str = 'RdBu_r'):
+    """
+    Draws precomputed payloads in a pair grid, and the coefficients of its upper diagonal
+
+    @param grid: Square PairGrid to fill
+    @param payloads: Payloads by key: ('lower', x, y) for lower cells, ('diag', x) for diagonal cells
+    @param coefs: Association matrix, indexed by variable names. Kept in the grid's association_matrix attribute
+    @param categories: Categories of categorical variables, by name
+    @param hue: Categorical series to distinguish points with
+    @param hue_order: Categories of hue, in the order of the hue layers of payloads
+    @param color: Used for markers and histograms if hue=None
+    @param s: Marker size
+    @param cmap: color map for densities
+    @param palette: color map for hue
+    @param significance: P-values and confidence intervals of the coefficients, see association_significance
+    @param lod: If given, scatter and contingency plots draw at most about this number of points within their view
+    @param coef_cmap: Color scale to map coefficients to rectangle colors. (hue = None)
+    """
+    n_hue = 1 if hue_order is None else len(hue_order)
+    colors = [color] if hue_order is None else sns.color_palette(palette, n_hue)
+    hue_codes = None if hue is None or lod is None else category_codes(hue, hue_order)
+    grid.map_lower(profiled_cell(lower_panel, 'lower'), payloads=payloads, categories=categories, colors=colors, hue=hue,
+                   hue_order=hue_order, palette=palette, s=s, color=color,
+                   cmaps=hue_colormaps(n_hue, cmap, palette, hue=hue_order is not None), lod=lod, hue_codes=hue_codes)
+    grid.map_diag(profiled_cell(diag_panel, 'diag'), payloads=payloads, categories=categories, colors=colors, hue=hue)
+    grid.association_matrix = coefs
+    grid.map_upper(profiled_cell(upper_plot, 'upper'), coefs=coefs, significance=significance, cmap=coef_cmap)
+
+
+def lower_panel(x: pd.Series, y: pd.Series, payloads: dict, categories: dict, colors: list, cmaps: list,
+                hue: pd.Series = None, hue_order: pd.Index = None, palette='Set1', s: int = 5,
+                color: tuple[float, ...] | str = (.7, .7, 0), lod: int | None = None,
+                hue_codes: np.ndarray | None = None, **kwargs):
+    """
+    Draws the precomputed payload of the cell of x and y
+
+    Made to be used in Seaborn PairGrid.map_lower method. The hue layers are already in the payloads
+
+    @param x: Abscissa series. Only its name is used, except for scatter plots
+    @param y: Ordinate series. Only its name is used, except for scatter plots
+    @param payloads: Payloads, by key
+    @param categories: Categories of categorical variables, by name
+    @param colors: Color of each hue layer
+    @param cmaps: Color map of each hue layer, for histograms
+    @param hue: Categorical series to distinguish points with, for scatter plots
+    @param hue_order: Categories of hue
+    @param palette: color map for hue, for scatter plots
+    @param s: Marker size, for scatter plots
+    @param color: Used for markers if hue=None
+    @param lod: If given, scatter plots draw at most about this number of points within their view, see ZoomScatter
+    @param hue_codes: Hue category codes of the rows, in the order of colors. (lod != None)
+    """
+    ax = plt.gca()
+    payload = payloads['lower', x.name, y.name]
+    kind = payload['kind']
+    if kind == 'hist2d':
+        draw_hist2d(payload['counts'], payload['x_edges'], payload['y_edges'], cmaps, ax=ax)
+    elif kind == 'raster':
+        draw_raster(payload['counts'], payload['x_edges'], payload['y_edges'], colors, ax=ax)
+    else:
+        if 'rows' in payload:
+            x, y = x.iloc[payload['rows']], y.iloc[payload['rows']]
+            hue = None if hue is None else hue.iloc[payload['rows']]
+        x_real = x if 'x' not in payload else pd.Series(payload['x'], index=x.index, name=x.name)
+        y_real = y if 'y' not in payload else pd.Series(payload['y'], index=y.index, name=y.name)
+        palette = palette if hue is not None else None
+        if lod is not None:
+            ZoomScatter(x_real.to_numpy(dtype=float), y_real.to_numpy(dtype=float), hue_codes, colors, max_points=lod,
+                        s=s, ax=ax)
+        else:
+            sns.scatterplot(x=x_real, y=y_real, hue=hue, hue_order=hue_order, palette=palette, color=color, s=s,
+                            ax=ax)
+    for var, axis in ((x.name, 'x'), (y.name, 'y')):
+        if var in categories:
+            # As seaborn does, histograms draw categorical ordinates from top to bottom
+            set_categorical_ticks(categories[var], axis, ax=ax, invert_y=kind == 'hist2d')
+
+
+def diag_panel(x: pd.Series, payloads: dict, categories: dict, colors: list, hue=None, **kwargs):
+    """
+    Draws the precomputed histogram of x, stacking hue layers
+
+    Made to be used in Seaborn PairGrid.map_diag method. The hue layers are already in the payloads
+
+    @param x: Series, only its name is used
+    @param payloads: Payloads, by key
+    @param categories: Categories of categorical variables, by name
+    @param colors: Color of each hue layer
+    """
+    ax = plt.gca()
+    payload = payloads['diag', x.name]
+    draw_hist1d(payload['counts'], payload['edges'], colors, ax=ax)
+    if x.name in categories:
+        set_categorical_ticks(categories[x.name], 'x', ax=ax)
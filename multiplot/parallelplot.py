@@ -2,95 +2,292 @@ import matplotlib.colors
 import matplotlib.pyplot as plt
 import pandas as pd
 from matplotlib.path import Path
-import matplotlib.patches as patches
+from matplotlib.lines import Line2D
 import numpy as np
-from matplotlib import cm, colors, rc
+from matplotlib import cm, colors, collections, rc
 import matplotlib as mpl
 
+from multiplot.columnar import Table, as_frame, float_values
+from multiplot.contingencyplot import category_codes
+from multiplot.histograms import numeric_edges, bin_index
+from multiplot.raster import shade, log_opacity
+from multiplot.sampling import strata_codes, stratified_sample
 
-def bezier_curve(x: pd.Series, y: pd.Series, c: np.ndarray):
-    control_x = np.linspace(x.iloc[0], x.iloc[-1], len(y) * 3 - 2, endpoint=True)
-    control_y = np.repeat(y, 3)[1:-1]
-    control_pts = list(zip(list(control_x), control_y))
-    codes = [Path.MOVETO] + [Path.CURVE4] * (len(control_pts) - 1)
-    path = Path(control_pts, codes)
-    return patches.PathPatch(path, facecolor='none', lw=1, edgecolor=c)
 
+def bezier_curves(y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the vertices of one cubic Bezier curve per row, all rows at once.
+
+    Between two adjacent axes, the control points keep the ordinate of their closest axis, so curves leave and reach
+    each axis horizontally.
+
+    @param y: Array of shape (rows, axes) with the ordinates of each row on each axis
+    @return: Array of shape (rows, 3 * axes - 2, 2) with the vertices, and the matching path codes
+    """
+    n_rows, n_axes = y.shape
+    control_x = np.linspace(0, n_axes - 1, n_axes * 3 - 2, endpoint=True)
+    control_y = np.repeat(y, 3, axis=1)[:, 1:-1]
+    vertices = np.empty((n_rows, len(control_x), 2))
+    vertices[:, :, 0] = control_x
+    vertices[:, :, 1] = control_y
+    codes = np.full(len(control_x), Path.CURVE4, dtype=Path.code_type)
+    codes[0] = Path.MOVETO
+    return vertices, codes
+
+
+def compound_paths(vertices: np.ndarray, codes: np.ndarray, row_colors: np.ndarray,
+                   rows_per_path: int = 16) -> tuple[list[Path], np.ndarray]:
+    """
+    Joins the curves of rows of the same color into compound paths, each curve starting with a MOVETO, so that a
+    collection holds a path per color and block of rows rather than a path per row.
+
+    Paths are built as views of a single array of vertices. Blocks are bounded: Agg rasterizes a path at once, and
+    slows down, then fails, on paths of hundreds of thousands of curves.
 
-def axis_for_each_col(data: pd.DataFrame, ax: plt.Axes) -> [plt.Axes]:
-    col_min, col_max = data.min(axis=0), data.max(axis=0)
+    @param vertices: Array of shape (rows, vertices, 2) with the vertices of each row, see bezier_curves
+    @param codes: Path codes of the vertices of a row
+    @param row_colors: Array of shape (rows, 4) with the RGBA color of each row
+    @param rows_per_path: Number of rows of each path, at most
+    @return: The paths, and the color of each path
+    """
+    group_colors, groups = np.unique(row_colors, axis=0, return_inverse=True)
+    groups = groups.ravel()
+    order = np.argsort(groups, kind='stable')
+    # First row of each block, blocks not spanning two colors
+    group_starts = np.searchsorted(groups[order], np.arange(len(group_colors) + 1))
+    starts = np.unique(np.concatenate([np.arange(0, len(order), rows_per_path), group_starts[:-1]]))
+    stops = np.append(starts[1:], len(order))
+    n_vertices = vertices.shape[1]
+    vertices = vertices[order].reshape(-1, 2)
+    block_codes = np.tile(codes, rows_per_path)
+    paths = [Path(vertices[start * n_vertices:stop * n_vertices], block_codes[:(stop - start) * n_vertices])
+             for start, stop in zip(starts, stops)]
+    return paths, group_colors[groups[order[starts]]]
+
+
+def gap_density(y_left: np.ndarray, y_right: np.ndarray, y_edges: np.ndarray, x_pixels: int, bezier=True,
+                layers: np.ndarray | None = None, n_layers: int = 1, weights: np.ndarray | None = None,
+                chunk_size: int = 2 ** 22) -> np.ndarray:
+    """
+    Rasterizes the lines joining rows between two adjacent axes into an accumulation buffer.
+
+    In each pixel column, a line covers every pixel between its ordinates at the edges of the column, so that steep
+    lines leave no holes. Coverage is accumulated as differences along the ordinate, added with a single bincount per
+    chunk of rows, then summed up: the cost grows with rows times columns of pixels, not with the height of lines.
+
+    @param y_left: Ordinate of each row on the left axis, in the scale of the pixel edges. NaN for rows left out
+    @param y_right: Ordinate of each row on the right axis, in the scale of the pixel edges. NaN for rows left out
+    @param y_edges: Equally spaced pixel edges along the ordinate. Lines out of them are clipped to the border pixels
+    @param x_pixels: Number of pixel columns between the axes
+    @param bezier: Whether lines are the Bezier cubic curves of bezier_curves, or straight lines
+    @param layers: Layer of each row, like its hue code, -1 for rows left out. A single layer if None
+    @param n_layers: Number of layers
+    @param weights: Value each row adds to the pixels it covers. 1 if None
+    @param chunk_size: Number of pixel columns of rows processed at once, bounding temporary memory
+    @return: Array of shape (n_layers, x_pixels, y_pixels) with the coverage of each pixel, by abscissa then ordinate
+    """
+    y_pixels = len(y_edges) - 1
+    kept = np.isfinite(y_left) & np.isfinite(y_right)
+    if layers is not None:
+        kept &= layers >= 0
+    if weights is not None:
+        kept &= np.isfinite(weights)
+    y_left, y_right = y_left[kept], y_right[kept]
+    layers = np.zeros(len(y_left), dtype=np.int64) if layers is None else layers[kept].astype(np.int64)
+    weights = None if weights is None else weights[kept]
+    # Share of the way from the left ordinate to the right one, at each column edge. Control points of Bezier curves
+    # keep the ordinate of their closest axis, so curves follow the smoothstep polynomial
+    t = np.linspace(0, 1, x_pixels + 1)
+    shares = 3 * t ** 2 - 2 * t ** 3 if bezier else t
+    size = n_layers * x_pixels * (y_pixels + 1)
+    differences = np.zeros(size)
+    chunk_rows = max(chunk_size // (x_pixels + 1), 1)
+    for start in range(0, len(y_left), chunk_rows):
+        left = y_left[start:start + chunk_rows, np.newaxis]
+        right = y_right[start:start + chunk_rows, np.newaxis]
+        index = np.floor((left + (right - left) * shares - y_edges[0]) / (y_edges[-1] - y_edges[0]) * y_pixels)
+        np.clip(index, 0, y_pixels - 1, out=index)
+        index = index.astype(np.int64)
+        bottom, top = np.minimum(index[:, :-1], index[:, 1:]), np.maximum(index[:, :-1], index[:, 1:])
+        # Flat index of the bottom of each column of each row, the top being one pixel above its last covered one
+        base = (layers[start:start + chunk_rows, np.newaxis] * x_pixels + np.arange(x_pixels)) * (y_pixels + 1)
+        chunk_weights = None if weights is None else \
+            np.repeat(weights[start:start + chunk_rows], x_pixels)
+        differences += np.bincount((base + bottom).ravel(), chunk_weights, minlength=size)
+        differences -= np.bincount((base + top + 1).ravel(), chunk_weights, minlength=size)
+    return np.cumsum(differences.reshape(n_layers, x_pixels, y_pixels + 1), axis=2)[:, :, :-1]
+
+
+def axis_for_each_col(columns: pd.Index, col_min: np.ndarray, col_max: np.ndarray, ax: plt.Axes) -> [plt.Axes]:
     col_spread = col_max - col_min
 
-    axes = [ax] + [ax.twinx() for _ in range(len(data.columns) - 1)]
+    axes = [ax] + [ax.twinx() for _ in range(len(columns) - 1)]
     for i, axis in enumerate(axes):
-        axis.set_ylim(col_min.iloc[i] - 0.05 * col_spread.iloc[i], col_max.iloc[i] + 0.05 * col_spread.iloc[i])
+        axis.set_ylim(col_min[i] - 0.05 * col_spread[i], col_max[i] + 0.05 * col_spread[i])
         axis.spines['top'].set_visible(False)
         axis.spines['bottom'].set_visible(False)
         if axis != ax:
             axis.spines['left'].set_visible(False)
             axis.yaxis.set_ticks_position('right')
-            axis.spines["right"].set_position(("axes", i / (len(data.columns) - 1)))
+            axis.spines["right"].set_position(("axes", i / (len(columns) - 1)))
 
-    ax.set_xlim(0, len(data.columns) - 1)
-    ax.set_xticks(range(len(data.columns)))
-    ax.set_xticklabels(data.columns)
+    ax.set_xlim(0, len(columns) - 1)
+    ax.set_xticks(range(len(columns)))
+    ax.set_xticklabels(columns)
     ax.spines['right'].set_visible(False)
     ax.xaxis.tick_top()
     return axes
 
 
-def parallelplot(data: pd.DataFrame, hue: str, cmap: str = None, ax: plt.Axes = None, bezier=True):
+def parallelplot(data: Table, hue: str, cmap: str = None, ax: plt.Axes = None, bezier=True,
+                 max_points: int | None = None, rng: np.random.Generator | None = None, density=False,
+                 resolution: tuple[int, int] = (64, 256)):
     """
     Creates a parallel coordinates plot.
 
     Field values are scaled to first field, and plotted in first axis.
 
-    @param data: A list containing one array per parallel axis, each containing N data points.
+    @param data: Dataframe, structured array or Arrow table, with one quantitative column per parallel axis, see
+    as_frame
     @param hue: The field name to distinguish rows with. Can be a categorical or a numeric field.
     @param cmap: Name of the color map
     @param ax: Axis on which draw the plot
     @param bezier: Whether draw Bezier cubic curves or straight lines
+    @param max_points: If given, at most about this number of rows are drawn, sampled in each hue category (or in
+    each of 10 equal-width ranges of a numeric hue) in proportion to its size. Axes and colors span all rows
+    @param rng: Random generator, for reproducible samples
+    @param density: Whether to draw the density of lines instead of each line: lines are accumulated into one image
+    per gap between adjacent axes, whose opacity grows with the logarithm of the number of lines in each pixel. Pixels
+    blend the colors of hue categories by their number of lines, or take the color of the mean of a numeric hue. Drawing
+    cost and file size then depend on the resolution, not on the number of rows. max_points is ignored
+    @param resolution: Number of pixels of each image, between adjacent axes and along them. (density = True)
     """
     # Selecting quantitative variables
     ###################################
+    # Each column is copied once, into a single float32 array of the values to draw
+    data = as_frame(data)
     hue = data[hue]
-    data = data[data.columns.difference(pd.Index([hue.name]))].copy()  # Removing hue
-    data = data.select_dtypes('number').astype(float)
+    columns = pd.Index([var for var in data.columns if var != hue.name and is_quantitative(data[var])])
+    values = np.empty((len(data), len(columns)), dtype=np.float32)
+    for i, var in enumerate(columns):
+        values[:, i] = float_values(data[var])
+    col_min, col_max = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
 
     # Initializing axes and color mapper
     #####################################
     ax = ax if ax is not None else plt.subplots()[1]
-    axes = axis_for_each_col(data, ax)
+    axes = axis_for_each_col(columns, col_min, col_max, ax)
     if cmap is None:
         cmap = 'Set1' if isinstance(hue.dtype, pd.CategoricalDtype) else 'Blues'
-    hue_min, hue_max = (1, hue.nunique()) if isinstance(hue.dtype, pd.CategoricalDtype) else (hue.min(), hue.max())
+    if isinstance(hue.dtype, pd.CategoricalDtype):
+        hue_min, hue_max = 0, max(len(hue.cat.categories) - 1, 1)
+    else:
+        hue_min, hue_max = hue.min(), hue.max()
     norm = colors.Normalize(vmin=hue_min, vmax=hue_max, clip=True)
     mapper = cm.ScalarMappable(norm=norm, cmap=mpl.colormaps[cmap])
 
     # Transform data to fit first axis
     ###################################
-    col_min, col_max = data.min(axis=0), data.max(axis=0)
     col_spread = col_max - col_min
-    data.iloc[:, 1:] = (data.iloc[:, 1:] - col_min.iloc[1:]) / col_spread.iloc[1:]
-    data.iloc[:, 1:] = col_min.iloc[0] + data.iloc[:, 1:] * col_spread.iloc[0]
+    values[:, 1:] -= col_min[1:]
+    values[:, 1:] *= col_spread[0] / col_spread[1:]
+    values[:, 1:] += col_min[0]
 
     # Drawing lines with respect to first axis
     ###########################################
-    for ind_row in range(len(data)):
-        hue_val = hue.cat.codes.iloc[ind_row] if isinstance(hue.dtype, pd.CategoricalDtype) else hue.iloc[ind_row]
-        x, y, color = pd.Series(range(len(data.columns))), data.iloc[ind_row, :], mapper.to_rgba(hue_val)
-        ax.plot(x, y, c=color) if not bezier else ax.add_patch(bezier_curve(x, y, c=color))
+    # All rows are drawn by a single collection, colored at once from hue
+    hue_values = category_codes(hue) if isinstance(hue.dtype, pd.CategoricalDtype) else hue.to_numpy()
+    drawn_hue = hue_values
+    if density:
+        n_hue = len(hue.cat.categories) if isinstance(hue.dtype, pd.CategoricalDtype) else None
+        draw_density(values, hue_values, n_hue, mapper, col_min[0], col_max[0], bezier, resolution, ax)
+    elif max_points is not None:
+        # Only drawn rows are decimated, keeping hue proportions
+        hue_strata = hue_values if isinstance(hue.dtype, pd.CategoricalDtype) else \
+            bin_index(hue_values.astype(float), numeric_edges(hue_min, hue_max, 10))
+        drawn = stratified_sample(strata_codes(len(hue_values), hue_strata), max_points, rng=rng)
+        values, drawn_hue = values[drawn], hue_values[drawn]
+    if not density:
+        row_colors = mapper.to_rgba(drawn_hue)
+        if bezier:
+            # Compound paths of rows of the same color, rather than one path per row
+            paths, path_colors = compound_paths(*bezier_curves(values), row_colors)
+            lines = collections.PathCollection(paths, facecolors='none', edgecolors=path_colors, linewidths=1)
+        else:
+            segments = np.empty(values.shape + (2,))
+            segments[:, :, 0] = np.arange(len(columns))
+            segments[:, :, 1] = values
+            lines = collections.LineCollection(segments, colors=row_colors)
+        ax.add_collection(lines, autolim=False)
 
     # Adding legend or color scale
     ################################
     if isinstance(hue.dtype, pd.CategoricalDtype):
-        plot_hue = pd.DataFrame(zip(ax.get_children(), hue)).drop_duplicates(subset=[1])
-        ax.legend(plot_hue[0], plot_hue[1], loc='lower center', bbox_to_anchor=(0.5, -0.18),
-                  ncol=len(plot_hue), fancybox=True, shadow=True)
+        # One legend entry per category present in hue
+        hue_codes = np.flatnonzero(np.bincount(hue_values[hue_values >= 0], minlength=len(hue.cat.categories)))
+        handles = [Line2D([], [], color=mapper.to_rgba(code)) for code in hue_codes]
+        ax.legend(handles, hue.cat.categories[hue_codes], loc='lower center', bbox_to_anchor=(0.5, -0.18),
+                  ncol=len(handles), fancybox=True, shadow=True)
     else:
         plt.colorbar(mapper, ax=ax, location='right', label=hue.name)
 
 
+def draw_density(values: np.ndarray, hue_values: np.ndarray, n_hue: int | None, mapper: cm.ScalarMappable,
+                 y_min: float, y_max: float, bezier=True, resolution: tuple[int, int] = (64, 256),
+                 ax: plt.Axes = None) -> [mpl.image.AxesImage]:
+    """
+    Draws the density of the lines of a parallel coordinates plot, as one image per gap between adjacent axes
+
+    @param values: Array of shape (rows, axes) with the ordinates of each row, scaled to the first axis
+    @param hue_values: Hue of each row: category codes, -1 for missing values, or numeric values
+    @param n_hue: Number of hue categories. None for a numeric hue
+    @param mapper: Color mapper of hue values
+    @param y_min: Minimum ordinate of the first axis
+    @param y_max: Maximum ordinate of the first axis
+    @param bezier: Whether lines are Bezier cubic curves or straight lines
+    @param resolution: Number of pixels of each image, between adjacent axes and along them
+    @param ax: First axis of the plot
+    @return: The image of each gap
+    """
+    ax = plt.gca() if ax is None else ax
+    x_pixels, y_pixels = resolution
+    y_edges = numeric_edges(y_min, y_max, y_pixels)
+    if n_hue is not None:
+        hue_colors = mapper.to_rgba(np.arange(n_hue))
+        counts = [gap_density(values[:, i], values[:, i + 1], y_edges, x_pixels, bezier, hue_values, n_hue)
+                  for i in range(values.shape[1] - 1)]
+    else:
+        # Rows are counted, and their hue summed up, in the pixels they cover
+        hue_values = hue_values.astype(float)
+        layers = np.where(np.isnan(hue_values), -1, 0)
+        counts = [gap_density(values[:, i], values[:, i + 1], y_edges, x_pixels, bezier, layers) for i in
+                  range(values.shape[1] - 1)]
+        sums = [gap_density(values[:, i], values[:, i + 1], y_edges, x_pixels, bezier, layers, weights=hue_values)
+                for i in range(values.shape[1] - 1)]
+    # Images share their logarithmic scale
+    vmax = max((gap.sum(axis=0).max() for gap in counts), default=0)
+    images = []
+    for i, gap in enumerate(counts):
+        if n_hue is not None:
+            image = shade(gap.transpose(0, 2, 1), hue_colors, vmax)
+        else:
+            total = gap[0].T
+            with np.errstate(invalid='ignore', divide='ignore'):
+                image = mapper.to_rgba(np.where(total > 0, sums[i][0].T / total, np.nan))
+            image[..., 3] = log_opacity(total, vmax)
+        images.append(ax.imshow(image, origin='lower', aspect='auto', interpolation='nearest',
+                                extent=(i, i + 1, y_edges[0], y_edges[-1])))
+    return images
+
+
+def is_quantitative(series: pd.Series) -> bool:
+    """
+    Whether a column is drawn on its own parallel axis: numeric, but neither boolean nor categorical
+    """
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series) and \
+        not isinstance(series.dtype, pd.CategoricalDtype)
+
+
 if __name__ == '__main__':
     import seaborn as sns
 
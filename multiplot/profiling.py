@@ -0,0 +1,204 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
+# Phases of the work of a grid: computing coefficients, binning or coding variables, drawing jitter, creating artists in
+# each cell, and rendering the figure
+PHASES = ('coefficient', 'binning', 'jitter', 'artists', 'draw')
+REPORT_COLUMNS = ['cell', 'x', 'y', 'phase', 'seconds', 'rows', 'artists']
+
+_profiler: ContextVar['Profiler | None'] = ContextVar('multiplot_profiler', default=None)
+
+
+class Profiler:
+    """
+    Records the elapsed time, rows processed and artists created by each phase of the work of each grid cell.
+
+    Phases can be nested: the time of a phase excludes the time of the phases opened inside it, so that times add up
+    to the total. Phases opened without a cell are attributed to the cell of the enclosing phase.
+    """
+
+    def __init__(self):
+        self.records = []
+        # Open phases: their record, and the time spent in phases opened inside them
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name: str, cell: str | None = None, x: str | None = None, y: str | None = None,
+              rows: int | None = None, ax: 'plt.Axes' = None) -> Iterator[dict]:
+        """
+        Times the code run inside the context
+
+        @param name: Phase name, see PHASES
+        @param cell: Kind of cell: 'lower', 'diag', 'upper', 'variable' for work shared by the cells of a variable,
+        'grid' for work shared by all cells, 'figure' for rendering. The cell of the enclosing phase if None
+        @param x: Abscissa variable name of the cell
+        @param y: Ordinate variable name of the cell
+        @param rows: Number of rows processed
+        @param ax: Axis of the cell, to count the artists created in it
+        """
+        if cell is None and self._stack:
+            # Work done for the enclosing cell
+            parent = self._stack[-1][0]
+            cell, x, y, rows = parent['cell'], parent['x'], parent['y'], parent['rows'] if rows is None else rows
+        record = {'cell': cell, 'x': x, 'y': y, 'phase': name, 'seconds': 0., 'rows': rows, 'artists': None}
+        artists = None if ax is None else count_artists(ax)
+        frame = [record, 0.]
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            record['seconds'] = elapsed - frame[1]
+            if ax is not None:
+                record['artists'] = count_artists(ax) - artists
+            self.records.append(record)
+
+    def record(self, name: str, seconds: float, cell: str | None = None, x: str | None = None, y: str | None = None,
+               rows: int | None = None, artists: int | None = None):
+        """
+        Adds a phase timed elsewhere, for instance in a worker process
+        """
+        self.records.append({'cell': cell, 'x': x, 'y': y, 'phase': name, 'seconds': seconds, 'rows': rows,
+                             'artists': artists})
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns the records, one row per phase of each cell, in the order phases ended
+        """
+        return pd.DataFrame(self.records, columns=REPORT_COLUMNS)
+
+
+@contextmanager
+def profile() -> Iterator[Profiler]:
+    """
+    Records the phases of the grids drawn inside the context, whichever function draws them.
+
+    >>> with profile() as profiler:
+    ...     grid = pairplot(data)
+    >>> profiler.report().groupby(['x', 'y'])['seconds'].sum().nlargest(5)
+    """
+    profiler = Profiler()
+    token = _profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _profiler.reset(token)
+
+
+def current_profiler() -> Profiler | None:
+    """
+    Returns the profiler of the enclosing profile context, None if not profiling
+    """
+    return _profiler.get()
+
+
+def phase(name: str, **fields):
+    """
+    Times a phase in the current profiler, see Profiler.phase. Does nothing if not profiling
+    """
+    profiler = _profiler.get()
+    return nullcontext() if profiler is None else profiler.phase(name, **fields)
+
+
+def count_artists(ax: 'plt.Axes') -> int:
+    """
+    Counts the artists drawn in an axis: collections, lines, patches, images and texts
+    """
+    return len(ax.collections) + len(ax.lines) + len(ax.patches) + len(ax.images) + len(ax.texts)
+
+
+def profiled_cell(func: Callable, cell: str) -> Callable:
+    """
+    Wraps a function drawing one cell of a PairGrid, so that its artist creation is timed when profiling.
+
+    The wrapper keeps the signature of the function, which PairGrid inspects to pass hue.
+
+    @param func: Function called by PairGrid.map_lower, map_diag or map_upper
+    @param cell: Kind of cell: 'lower', 'diag' or 'upper'
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _profiler.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        import matplotlib.pyplot as plt
+
+        x = kwargs['x'] if 'x' in kwargs else args[0]
+        y = kwargs['y'] if 'y' in kwargs else args[1] if len(args) > 1 else None
+        with profiler.phase('artists', cell=cell, x=getattr(x, 'name', None), y=getattr(y, 'name', None),
+                            rows=len(x), ax=kwargs.get('ax') or plt.gca()):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def draw_grid(grid: 'sns.PairGrid'):
+    """
+    Renders a grid, timing the drawing of each of its cells, and of the rest of the figure
+    """
+    profiler = _profiler.get()
+    if profiler is None:
+        grid.figure.canvas.draw()
+        return
+    if not hasattr(grid, 'axes'):
+        # Grids drawn on a single axis, like MatrixGrid, have no cells to time apart
+        with profiler.phase('draw', cell='figure'):
+            grid.figure.canvas.draw()
+        return
+    cells = {}
+    for i, y_var in enumerate(grid.y_vars):
+        for j, x_var in enumerate(grid.x_vars):
+            ax = grid.axes[i, j]
+            if ax is not None:
+                cell = 'diag' if x_var == y_var else 'lower' if i > j else 'upper'
+                cells[ax] = (cell, x_var, None if cell == 'diag' else y_var)
+
+    def timed(ax: 'plt.Axes', draw: Callable) -> Callable:
+        @functools.wraps(draw)
+        def wrapper(renderer, *args, **kwargs):
+            cell, x_var, y_var = cells[ax]
+            with profiler.phase('draw', cell=cell, x=x_var, y=y_var):
+                return draw(renderer, *args, **kwargs)
+        return wrapper
+
+    for ax in cells:
+        # Instance attributes take precedence over the method when the figure draws its axes
+        ax.draw = timed(ax, ax.draw)
+    try:
+        with profiler.phase('draw', cell='figure'):
+            grid.figure.canvas.draw()
+    finally:
+        for ax in cells:
+            del ax.draw
+
+
+def profilable(func: Callable) -> Callable:
+    """
+    Decorates a function returning a grid, which takes a profile argument: if true, the grid is drawn and rendered
+    while profiling, and the report is kept in its profile attribute
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not signature.bind(*args, **kwargs).arguments.get('profile', False):
+            return func(*args, **kwargs)
+        with profile() as profiler:
+            grid = func(*args, **kwargs)
+            draw_grid(grid)
+        grid.profile = profiler.report()
+        return grid
+    return wrapper
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+
+from multiplot.association import category_codes
+from multiplot.histograms import numeric_edges, bin_index, hist2d_counts
+from multiplot.profiling import phase
+
+
+def shade(counts: np.ndarray, colors: np.ndarray, vmax: float | None = None) -> np.ndarray:
+    """
+    Turns per-hue pixel counts into an RGBA image.
+
+    Each pixel color is the blend of hue colors weighted by their counts, and its opacity grows with the logarithm of
+    its total count. Empty pixels are transparent.
+
+    @param counts: Array of shape (n_hue, rows, columns) with the number of points of each hue in each pixel
+    @param colors: Array of shape (n_hue, 3 or 4) with the color of each hue
+    @param vmax: Total count of opaque pixels, to shade several images alike. Largest total count of counts if None
+    @return: Array of shape (rows, columns, 4)
+    """
+    total = counts.sum(axis=0)
+    image = np.zeros(total.shape + (4,))
+    filled = total > 0
+    image[..., :3] = np.tensordot(counts, np.asarray(colors)[:, :3], axes=(0, 0))
+    image[filled, :3] /= total[filled, np.newaxis]
+    image[..., 3] = log_opacity(total, vmax)
+    return image
+
+
+def log_opacity(total: np.ndarray, vmax: float | None = None) -> np.ndarray:
+    """
+    Returns the opacity of pixels from their count: growing with its logarithm, and 0 for empty pixels
+
+    @param total: Count of each pixel
+    @param vmax: Count of opaque pixels. Largest count if None
+    """
+    vmax = total.max() if vmax is None else vmax
+    opacity = np.zeros(total.shape)
+    filled = total > 0
+    opacity[filled] = .3 + .7 * np.log1p(total[filled]) / np.log1p(vmax)
+    return opacity
+
+
+def raster_counts(x: np.ndarray, y: np.ndarray, hue_codes: np.ndarray | None = None, n_hue: int = 1,
+                  resolution: int = 256) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Counts the points of each hue in each pixel of a fixed-resolution grid spanning the points
+
+    @param x: Abscissa of each point
+    @param y: Ordinate of each point
+    @param hue_codes: Hue category code of each point, -1 for missing values. None if no hue
+    @param n_hue: Number of hue categories
+    @param resolution: Number of pixels along each axis
+    @return: Array of shape (n_hue, resolution, resolution) with counts by abscissa then ordinate, and pixel edges
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        return np.zeros((n_hue, resolution, resolution), dtype=np.int64), np.linspace(0, 1, resolution + 1), \
+            np.linspace(0, 1, resolution + 1)
+    x_edges = numeric_edges(x[finite].min(), x[finite].max(), resolution)
+    y_edges = numeric_edges(y[finite].min(), y[finite].max(), resolution)
+    counts = hist2d_counts(bin_index(x, x_edges), bin_index(y, y_edges), resolution, resolution, hue_codes, n_hue)
+    return counts, x_edges, y_edges
+
+
+def draw_raster(counts: np.ndarray, x_edges: np.ndarray, y_edges: np.ndarray, colors: list,
+                ax: plt.Axes = None) -> mpl.image.AxesImage:
+    """
+    Draws precomputed pixel counts as one image
+
+    @param counts: Array of shape (n_hue, x_pixels, y_pixels)
+    @param x_edges: Abscissa pixel edges
+    @param y_edges: Ordinate pixel edges
+    @param colors: Color of each hue layer
+    @param ax: Matplotlib axis on which draw the image
+    """
+    ax = plt.gca() if ax is None else ax
+    return ax.imshow(shade(counts.transpose(0, 2, 1), colors), origin='lower', aspect='auto', interpolation='nearest',
+                     extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+
+
+def rasterplot(x: pd.Series, y: pd.Series, hue: pd.Series = None, hue_order: [str] = None,
+               color: tuple[float, ...] | str = (.7, .7, 0), palette='Set1', ax: plt.Axes = None,
+               resolution: int = 256, **kwargs):
+    """
+    Scatter plot aggregated into a fixed-resolution image, so that drawing cost scales with pixels, not points
+
+    @param x: Abscissa numeric series
+    @param y: Ordinate numeric series
+    @param hue: Categorical series to color points with. Colors of points in the same pixel are blended
+    @param hue_order: Order of hue values in palette. Categories order if None
+    @param color: Used for points if hue=None
+    @param palette: color map for hue
+    @param ax: Matplotlib axis on which draw the plot
+    @param resolution: Number of pixels along each axis
+    """
+    ax = plt.gca() if ax is None else ax
+    if hue is None:
+        hue_codes, colors = None, [mpl.colors.to_rgb(color)]
+    else:
+        hue = pd.Series(hue)
+        if hue_order is None:
+            categorical = isinstance(hue.dtype, pd.CategoricalDtype)
+            hue_order = hue.cat.categories if categorical else sorted(hue.dropna().unique())
+        hue_codes, colors = category_codes(hue, pd.Index(hue_order)), sns.color_palette(palette, len(hue_order))
+    with phase('binning'):
+        counts, x_edges, y_edges = raster_counts(np.asarray(x, dtype=float), np.asarray(y, dtype=float), hue_codes,
+                                                 len(colors), resolution)
+    if counts.any():
+        draw_raster(counts, x_edges, y_edges, colors, ax=ax)
+    for axis, var in (('x', x), ('y', y)):
+        if getattr(var, 'name', None) is not None:
+            getattr(ax, 'set_%slabel' % axis)(var.name)
+    return ax
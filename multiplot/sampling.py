@@ -0,0 +1,51 @@
+import numpy as np
+
+
+def strata_codes(n_rows: int, *codes: np.ndarray | None) -> np.ndarray:
+    """
+    Combines several integer codes into a single stratum code per row. Rows with a missing code get -1. Strata are
+    renumbered in order when there are more combinations of codes than rows, so that they can be counted densely.
+
+    @param n_rows: Number of rows
+    @param codes: Integer codes of each variable, -1 for missing values. None entries are ignored, so that all rows
+    are in the same stratum if there are only None entries
+    """
+    combined = np.zeros(n_rows, dtype=np.int64)
+    valid = np.ones(n_rows, dtype=bool)
+    for code in (np.asarray(code) for code in codes if code is not None):
+        valid &= code >= 0
+        combined = combined * (int(code.max(initial=0)) + 1) + np.maximum(code, 0)
+    if n_rows and combined.max() >= n_rows:
+        combined[valid] = np.unique(combined[valid], return_inverse=True)[1]
+    combined[~valid] = -1
+    return combined
+
+
+def stratified_sample(strata: np.ndarray, max_points: int, min_per_stratum: int = 10,
+                      rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    Draws a sample of rows keeping the proportion of each stratum, with at least a minimum of rows per stratum.
+
+    Each stratum keeps a share of max_points proportional to its size, but no less than min_per_stratum rows (or all
+    its rows if it has fewer), so that rare strata remain visible. The sample can thus exceed max_points by at most
+    min_per_stratum rows per stratum. Rows with a missing stratum (-1) are not drawn anyway, and are dropped.
+
+    @param strata: Integer stratum code of each row, -1 for rows that cannot be drawn
+    @param max_points: Number of rows to draw, across all strata
+    @param min_per_stratum: Minimum number of rows drawn from each stratum
+    @param rng: Random generator, for reproducible samples
+    @return: Sorted positions of the rows of the sample. All drawable rows if they are at most max_points
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    valid = np.flatnonzero(strata >= 0)
+    if len(valid) <= max_points:
+        return valid
+    counts = np.bincount(strata[valid])
+    quotas = np.minimum(counts, np.maximum(np.floor(counts * max_points / len(valid)), min_per_stratum)).astype(int)
+
+    # Ranking rows at random inside each stratum, and keeping the first ones
+    ###########################################################################
+    order = valid[np.lexsort((rng.random(len(valid)), strata[valid]))]
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+    return np.sort(order[rank < quotas[strata[order]]])
@@ -0,0 +1,267 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from multiplot.association import (DENSE_CROSSTAB_CELLS, AssociationStats, categories_of, contingency_from_cells,
+                                   contingency_from_crosstabs, eta2_from_grouped_sums, pearson_from_moments)
+from multiplot.binning import Column
+from multiplot.columnar import Table, as_frame
+from multiplot.profiling import phase
+from multiplot.store import PanelStore, fingerprint
+
+SIGNIFICANCE_COLUMNS = ['x', 'y', 'coef', 'p_value', 'ci_low', 'ci_high']
+
+
+def association_significance(data: Table, vars: [str] = None, n_resamples: int = 999, confidence: float = .95,
+                             seed: int | np.random.SeedSequence | None = None, n_jobs: int = 1,
+                             chunk_size: int = 2 ** 23, store: PanelStore | None = None) -> pd.DataFrame:
+    """
+    Computes permutation p-values and bootstrap confidence intervals of the association coefficient of every pair of
+    variables, see association_matrix.
+
+    Resamples are drawn as index matrices, each applied to every pair of variables at once:
+    - Permutation: each resample permutes the rows of every variable against the rows of the others, giving one
+    coefficient under independence for each pair. The p-value is the share of these coefficients at least as large
+    as the observed one in absolute value, the observed one included;
+    - Bootstrap: each resample draws rows with replacement, applied as row weights to the sufficient statistics of
+    the coefficients. The confidence interval is the percentile interval of the resampled coefficients.
+
+    Resamples are computed by chunks of at most about chunk_size values, each drawn from its own seed spawned from seed,
+    so that results depend on seed and chunk_size, but not on n_jobs.
+
+    @param data: Dataframe, structured array or Arrow table containing the variables, see as_frame
+    @param vars: List of variable names to associate. All columns if None
+    @param n_resamples: Number of permutations, and of bootstrap resamples
+    @param confidence: Confidence level of the intervals
+    @param seed: Seed of the resamples. Unpredictable if None
+    @param n_jobs: Number of worker processes. 1 computes in the current process, -1 uses all cores
+    @param chunk_size: Number of values of the resampled arrays held at once, bounding memory
+    @param store: If given, the table is read from it when the same variables were tested with the same parameters,
+    and stored in it otherwise. With seed None, the stored resamples are reused
+    @return: One row per pair of variables, in the order of the upper diagonal: variable names, coefficient, p-value
+    and bounds of the confidence interval
+    """
+    data = as_frame(data, vars)
+    vars = list(data.columns if vars is None else vars)
+    categories = categories_of(data, vars)
+    if store is not None:
+        return stored_significance(data, vars, categories, store, n_resamples=n_resamples, confidence=confidence,
+                                   seed=seed, n_jobs=n_jobs, chunk_size=chunk_size)
+    with phase('coefficient', cell='grid', rows=len(data)):
+        observed = AssociationStats(vars, categories).update(data).matrix().to_numpy()
+    columns = {var: Column(np.asarray(data[var].array.codes), categories[var], np.asarray(data[var].array.codes))
+               if var in categories else Column(data[var].to_numpy(dtype=float), None, None) for var in vars}
+
+    # Resampling by chunks
+    #######################
+    # Resampled arrays hold one value per row and numeric variable, or per row for crosstabs
+    width = len(data) * max(len(vars) - len(categories), 1)
+    chunk_resamples = max(chunk_size // max(width, 1), 1)
+    sizes = [min(chunk_resamples, n_resamples - start) for start in range(0, n_resamples, chunk_resamples)]
+    seeds = iter((seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed))
+                 .spawn(2 * len(sizes)))
+    tasks = [{'kind': kind, 'size': size, 'seed': next(seeds), 'vars': vars}
+             for kind in ('permutation', 'bootstrap') for size in sizes]
+    with phase('coefficient', cell='grid', rows=len(data) * 2 * n_resamples):
+        results = resample_chunks(columns, tasks, n_jobs)
+    null = np.concatenate([result for task, result in zip(tasks, results) if task['kind'] == 'permutation'])
+    boot = np.concatenate([result for task, result in zip(tasks, results) if task['kind'] == 'bootstrap'])
+
+    # Gathering the upper diagonal
+    ###############################
+    rows, cols = np.triu_indices(len(vars), 1)
+    coefs = observed[rows, cols]
+    null, boot = null[:, rows, cols], boot[:, rows, cols]
+    # Ties with the observed coefficient are counted, despite rounding errors
+    extreme = np.abs(null) >= np.abs(coefs) - 1e-12 * np.maximum(np.abs(coefs), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_values = (1 + extreme.sum(axis=0)) / (1 + np.isfinite(null).sum(axis=0))
+    p_values[np.isnan(coefs)] = np.nan
+    ci_low, ci_high = np.full(len(coefs), np.nan), np.full(len(coefs), np.nan)
+    computed = np.isfinite(boot).any(axis=0)
+    if computed.any():
+        ci_low[computed], ci_high[computed] = np.nanquantile(boot[:, computed], [(1 - confidence) / 2,
+                                                                                 (1 + confidence) / 2], axis=0)
+    return pd.DataFrame({'x': [vars[i] for i in rows], 'y': [vars[j] for j in cols], 'coef': coefs,
+                         'p_value': p_values, 'ci_low': ci_low, 'ci_high': ci_high}, columns=SIGNIFICANCE_COLUMNS)
+
+
+def stored_significance(data: pd.DataFrame, vars: [str], categories: dict[str, pd.Index], store: PanelStore,
+                        **parameters) -> pd.DataFrame:
+    """
+    Reads the significance table of variables from a store, computing and storing it if missing
+
+    @param data: Dataframe containing the variables
+    @param vars: List of variable names to associate
+    @param categories: Categories of the categorical variables, by name
+    @param store: Store of the table
+    @param parameters: Other parameters of association_significance
+    """
+    seed = parameters['seed']
+    task = {'kind': 'significance', 'vars': vars, **parameters,
+            'seed': (seed.entropy, seed.spawn_key) if isinstance(seed, np.random.SeedSequence) else seed}
+    fingerprints = {var: fingerprint(data[var], categories.get(var)) for var in vars}
+
+    def compute(tasks: [dict]) -> [dict]:
+        table = association_significance(data, vars, **parameters)
+        return [{'kind': 'significance', **{column: table[column].to_numpy() for column in SIGNIFICANCE_COLUMNS[2:]}}]
+
+    payload, = store.memoize([task], fingerprints, compute)
+    rows, cols = np.triu_indices(len(vars), 1)
+    return pd.DataFrame({'x': [vars[i] for i in rows], 'y': [vars[j] for j in cols],
+                         **{column: payload[column] for column in SIGNIFICANCE_COLUMNS[2:]}},
+                        columns=SIGNIFICANCE_COLUMNS)
+
+
+def resample_chunks(columns: dict[str, Column], tasks: [dict], n_jobs: int = 1) -> [np.ndarray]:
+    """
+    Computes chunks of resampled coefficients, in a pool of worker processes reading shared columns
+
+    @param columns: Columns, by variable name
+    @param tasks: Descriptions of the chunks, see resampled_coefficients
+    @param n_jobs: Number of worker processes. 1 computes in the current process, -1 uses all cores
+    @return: The coefficients of each chunk, in order
+    """
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if n_jobs == 1 or len(tasks) <= 1:
+        return [resampled_coefficients(task, columns) for task in tasks]
+    # Workers attach the columns shared by the panels of pair grids
+    from multiplot.panels import SharedColumns, _attach_columns
+    with SharedColumns(columns) as shared, ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_columns,
+                                                               initargs=(shared.specs,)) as executor:
+        return list(executor.map(_resample_in_worker, tasks))
+
+
+def _resample_in_worker(task: dict) -> np.ndarray:
+    from multiplot.panels import _worker_columns
+    return resampled_coefficients(task, _worker_columns)
+
+
+def resampled_coefficients(task: dict, columns: dict[str, Column]) -> np.ndarray:
+    """
+    Computes the association coefficients of every pair of variables on a chunk of resamples.
+
+    Pure function of the task and the columns, so that it can run in any process. Task kinds are:
+    - 'permutation': [k, i, j] is the coefficient of variables i and j once the rows of one of them are put in the
+    order of the k-th permutation: those of j for numeric pairs and for categorical pairs with i before j, those of the
+    numeric variable for mixed pairs;
+    - 'bootstrap': [k, i, j] is the coefficient of variables i and j on the k-th draw of rows with replacement.
+    Tasks have the number of resamples in 'size', the seed they are drawn from in 'seed', and the names of the
+    variables in 'vars'.
+
+    @param task: Description of the chunk
+    @param columns: Columns, by variable name. Categorical columns hold category codes, -1 for missing values
+    @return: Array of shape (size, variables, variables), NaN on the diagonal
+    """
+    vars, size = task['vars'], task['size']
+    rng = np.random.default_rng(task['seed'])
+    n = len(columns[vars[0]].values)
+    if task['kind'] == 'permutation':
+        index, weights = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1), None
+    else:
+        # Number of times each row is drawn, in each resample
+        draws = rng.integers(0, n, (size, n)) + n * np.arange(size)[:, np.newaxis]
+        index, weights = None, np.bincount(draws.ravel(), minlength=size * n).reshape(size, n).astype(float)
+    numeric_vars = [var for var in vars if columns[var].categories is None]
+    categorical_vars = [var for var in vars if columns[var].categories is not None]
+    numeric_positions = [vars.index(var) for var in numeric_vars]
+    n_numeric = len(numeric_vars)
+    coefs = np.full((size, len(vars), len(vars)), np.nan)
+
+    # Moments of numeric variables, on the rows and on the resampled rows
+    ######################################################################
+    values = np.column_stack([columns[var].values for var in numeric_vars]) if numeric_vars else np.empty((n, 0))
+    present = ~np.isnan(values)
+    shift = np.zeros(n_numeric)
+    present_any = present.any(axis=0)
+    shift[present_any] = np.nanmean(values[:, present_any], axis=0)
+    values = np.where(present, values - shift, 0.)
+    present = present.astype(float)
+    if index is not None:
+        # Resamples side by side, so that each statistic of every resample is a single matrix product:
+        # array of shape (rows, size * numeric variables)
+        right_values, right_present = (array[index.T].reshape(n, size * n_numeric) for array in (values, present))
+        right_squares = right_values ** 2
+
+        def moments(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+            # [k, i, j]: sum over rows of the products of left column i with column j of the k-th resample
+            return (left.T @ right).reshape(-1, size, n_numeric).transpose(1, 0, 2)
+    else:
+        # Weighted columns of every resample: array of shape (size * numeric variables, rows)
+        right_values, right_present = ((array.T * weights[:, np.newaxis]).reshape(size * n_numeric, n)
+                                       for array in (values, present))
+        right_squares = right_values * np.tile(values.T, (size, 1))
+
+        def moments(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+            # [k, i, j]: sum over rows of the products of left column i with column j weighted by the k-th resample
+            return (right @ left).reshape(size, n_numeric, -1).transpose(0, 2, 1)
+
+    # Numeric - Numeric: co-moments
+    ################################
+    if numeric_vars:
+        count, products = moments(present, right_present), moments(values, right_values)
+        sums, sums_y = moments(values, right_present), moments(present, right_values)
+        squares, squares_y = moments(values ** 2, right_present), moments(present, right_squares)
+        coefs[np.ix_(range(size), numeric_positions, numeric_positions)] = pearson_from_moments(
+            count, sums, squares, products, sums_y, squares_y)
+
+    # Categorical - Numeric: resampled numeric variables grouped by categories
+    ###########################################################################
+    from scipy import sparse
+    for var in categorical_vars if numeric_vars else []:
+        codes, n_categories = columns[var].values.astype(np.int64), len(columns[var].categories)
+        valid = np.flatnonzero(codes >= 0)
+        # Rows of each category, as a sparse indicator matrix
+        indicator = sparse.csr_array((np.ones(len(valid)), (valid, codes[valid])), shape=(n, n_categories))
+        # Counts, sums and sums of squares of each numeric variable and category
+        grouped = [moments(indicator, right).transpose(0, 2, 1) for right in (right_present, right_values, right_squares)]
+        position = vars.index(var)
+        coefs[:, position, numeric_positions] = coefs[:, numeric_positions, position] = eta2_from_grouped_sums(*grouped)
+
+    # Categorical - Categorical: crosstabs of the codes against the resampled codes
+    ################################################################################
+    offsets = np.arange(size)[:, np.newaxis]
+    for a, x_var in enumerate(categorical_vars):
+        x_codes, x_len = columns[x_var].values.astype(np.int64), len(columns[x_var].categories)
+        for y_var in categorical_vars[a + 1:]:
+            y_codes, y_len = columns[y_var].values.astype(np.int64), len(columns[y_var].categories)
+            if index is not None:
+                y_codes = y_codes[index]
+                valid = (x_codes >= 0) & (y_codes >= 0)
+                pair_codes, pair_weights = (offsets * x_len * y_len + x_codes * y_len + y_codes)[valid], None
+            else:
+                valid = (x_codes >= 0) & (y_codes >= 0)
+                pair_codes = (offsets * x_len * y_len + (x_codes * y_len + y_codes)[valid]).ravel()
+                pair_weights = weights[:, valid].ravel()
+            i, j = vars.index(x_var), vars.index(y_var)
+            if size * x_len * y_len <= max(DENSE_CROSSTAB_CELLS, len(pair_codes)):
+                tables = np.bincount(pair_codes, pair_weights, minlength=size * x_len * y_len)
+                coefs[:, i, j] = coefs[:, j, i] = contingency_from_crosstabs(tables.reshape(size, x_len, y_len))
+                continue
+            # Crosstabs of many categories: only the pairs that occur are counted
+            cells, inverse = np.unique(pair_codes, return_inverse=True)
+            tables, cells = np.divmod(cells, x_len * y_len)
+            coefs[:, i, j] = coefs[:, j, i] = contingency_from_cells(tables, *np.divmod(cells, y_len),
+                                                                     np.bincount(inverse, pair_weights), size, x_len,
+                                                                     y_len)
+    coefs[:, np.arange(len(vars)), np.arange(len(vars))] = np.nan
+    return coefs
+
+
+def significance_of(significance: pd.DataFrame | None, x: str, y: str) -> dict:
+    """
+    Returns the p-value and confidence interval of a pair of variables, as keyword arguments of coefplot
+
+    @param significance: Table returned by association_significance. Nothing if None
+    @param x: Name of a variable
+    @param y: Name of the other variable
+    """
+    if significance is None:
+        return {}
+    pair = significance[((significance['x'] == x) & (significance['y'] == y)) |
+                        ((significance['x'] == y) & (significance['y'] == x))]
+    if pair.empty:
+        return {}
+    return {'p_value': pair['p_value'].iloc[0], 'ci': (pair['ci_low'].iloc[0], pair['ci_high'].iloc[0])}
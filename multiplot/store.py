@@ -0,0 +1,162 @@
+import hashlib
+import os
+import pickle
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# Version of the payload computations, part of every key: stored payloads are not reused once it changes
+STORE_VERSION = 1
+
+# Task fields naming variables, or lists of variables, whose data is keyed by fingerprint rather than by name
+VARIABLE_FIELDS = ('x', 'y', 'hue', 'vars')
+
+
+def fingerprint(series: pd.Series, categories: pd.Index | None = None) -> str:
+    """
+    Hashes the values of a variable, to recognize it whatever its name or the dataframe it belongs to.
+
+    Numeric columns are hashed from their buffer and categorical ones from their codes and categories, without copy.
+    Other columns, like strings, are hashed from the hashes pandas gives to their values.
+
+    @param series: Values of the variable
+    @param categories: Categories the variable is encoded with, if categorical
+    @return: Hexadecimal digest of the dtype and values
+    """
+    digest = hashlib.blake2b(str(series.dtype).encode(), digest_size=16)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        buffers = [series.cat.codes.to_numpy(), pd.util.hash_pandas_object(series.cat.categories, index=False)]
+    elif isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+        buffers = [series.to_numpy()]
+    else:
+        buffers = [pd.util.hash_pandas_object(series, index=False)]
+    if categories is not None:
+        buffers.append(pd.util.hash_pandas_object(pd.Index(categories), index=False))
+    for buffer in buffers:
+        digest.update(np.ascontiguousarray(np.asarray(buffer)).view(np.uint8))
+    return digest.hexdigest()
+
+
+class PanelStore:
+    """
+    Payloads of grid cells kept on disk, one npz file per payload, so that drawing the same data again, with other
+    colors or markers for instance, reads them instead of computing them.
+
+    Payloads are keyed by the fingerprints of the variables they are computed from and by the parameters of their
+    computation, like bin edges, hue or seed, but not by style. The least recently used ones are removed once the
+    files exceed max_bytes.
+    """
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int = 2 ** 30):
+        """
+        @param directory: Directory of the payload files, created if needed. It can be shared by several processes
+        @param max_bytes: Size of the payload files above which the least recently used ones are removed
+        """
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, task: dict, fingerprints: dict[str, str]) -> str:
+        """
+        Returns the key of the payload of a task, see compute_panel
+
+        @param task: Description of the computation. Its 'key' in the grid is left out
+        @param fingerprints: Fingerprints of the variables of the task, by name
+        """
+        digest = hashlib.blake2b(b'%d' % STORE_VERSION, digest_size=20)
+        for field in sorted(set(task) - {'key'}):
+            value = task[field]
+            if field in VARIABLE_FIELDS and isinstance(value, list):
+                value = [fingerprints[var] for var in value]
+            elif field in VARIABLE_FIELDS and value is not None:
+                value = fingerprints[value]
+            if isinstance(value, np.ndarray):
+                value = (value.dtype.str, value.shape, value.tobytes())
+            digest.update(pickle.dumps((field, value), protocol=4))
+        return digest.hexdigest()
+
+    def memoize(self, tasks: [dict], fingerprints: dict[str, str], compute: Callable[[list[dict]], list[dict]]) -> [dict]:
+        """
+        Returns the payloads of tasks: stored ones are read, and the others are computed at once then stored
+
+        @param tasks: Descriptions of the computations, see compute_panel
+        @param fingerprints: Fingerprints of the variables of the tasks, by name
+        @param compute: Function computing the payloads of a list of tasks, only called if some are missing
+        @return: The payload of each task, in order
+        """
+        keys = [self.key(task, fingerprints) for task in tasks]
+        payloads = [self.load(key) for key in keys]
+        missing = [i for i, payload in enumerate(payloads) if payload is None]
+        if missing:
+            for i, payload in zip(missing, compute([tasks[i] for i in missing])):
+                self.save(keys[i], payload)
+                payloads[i] = payload
+            self.evict()
+        return payloads
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key: str) -> dict | None:
+        """
+        Returns a stored payload, marking it as recently used, or None if it is not stored
+        """
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                payload = {name: array.item() if array.ndim == 0 else array for name, array in arrays.items()}
+            os.utime(path)
+        except (OSError, ValueError, EOFError):
+            # Missing, removed by another process, or partially written by a process that died
+            return None
+        return payload
+
+    def save(self, key: str, payload: dict):
+        """
+        Stores a payload of arrays, numbers and strings. See evict to bound the size of the files
+        """
+        path = self.path(key)
+        # Written under a temporary name then renamed, so that other processes never read a partial file
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary, 'wb') as file:
+            np.savez(file, **{name: np.asarray(value) for name, value in payload.items()})
+        os.replace(temporary, path)
+
+    def evict(self):
+        """
+        Removes the least recently used payloads until the files take at most max_bytes
+        """
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.npz'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= file_size
+
+    def clear(self):
+        """
+        Removes every stored payload
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, name))
+
+
+def as_store(store: 'str | os.PathLike | PanelStore | None') -> PanelStore | None:
+    """
+    Returns the store of a directory, or the store itself
+    """
+    return store if store is None or isinstance(store, PanelStore) else PanelStore(store)
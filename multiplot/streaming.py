@@ -0,0 +1,204 @@
+import itertools
+import os
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.patches import Patch
+
+from multiplot.association import AssociationStats
+from multiplot.binning import BinningCache
+from multiplot.columnar import as_frame
+from multiplot.histograms import numeric_edges, categorical_edges
+from multiplot.panels import draw_panels
+from multiplot.profiling import phase, profilable
+
+ChunkSource = str | os.PathLike | pd.DataFrame | Iterable[pd.DataFrame] | Callable[[], Iterator[pd.DataFrame]]
+
+
+@profilable
+def pairplot_chunked(source: ChunkSource, vars: [str] = None, hue: str | None = None, chunksize: int = 100_000,
+                     bins: int = 20, ranges: dict[str, tuple[float, float]] = None,
+                     categories: dict[str, list] = None, color: tuple[float, ...] | str = (.7, .7, 0),
+                     cmap='Greens', palette='Set1', profile=False) -> sns.PairGrid:
+    """
+    Same grid as pairplot with density=True, for tables too large to fit in memory.
+
+    The table is read chunk by chunk, and only sufficient statistics are kept: fixed-edge bivariate histograms for the
+    lower diagonal, histograms for the diagonal, and co-moments, crosstabs and grouped sums for the coefficients of the
+    upper diagonal. Peak memory is bounded by the chunk size.
+
+    Variables with an object, boolean or categorical type are categorical. Histogram edges need the range of numeric
+    variables and the categories of categorical variables: if not all given, the source is read once more beforehand,
+    which a one-shot iterator of chunks does not allow.
+
+    @param source: CSV or Parquet file path, dataframe, iterable of dataframe chunks, or function returning such an
+    iterator each time it is called
+    @param vars: List of variable names to display. All columns if None
+    @param hue: Categorical variable name to distinguish points with
+    @param chunksize: Number of rows per chunk, when reading a file or a dataframe
+    @param bins: Bins for histograms of numeric variables
+    @param ranges: Minimum and maximum of numeric variables, by name
+    @param categories: Categories of categorical variables, by name
+    @param color: Used for histograms if hue=None
+    @param cmap: color map for densities
+    @param palette: color map for hue
+    @param profile: Whether to time each phase of each cell, and the rendering of the grid. The report is kept in the
+    profile attribute of the grid, as a dataframe with one row per phase of each cell
+    @return: The PairGrid, with the coefficients of the upper diagonal in its association_matrix attribute
+    """
+    ranges, categories = dict(ranges or {}), {var: pd.Index(cats) for var, cats in (categories or {}).items()}
+    columns = None if vars is None else list(dict.fromkeys(list(vars) + ([hue] if hue is not None else [])))
+    read_chunks, reusable = chunk_reader(source, chunksize, columns)
+
+    # Reading variable types from first chunk
+    ##########################################
+    chunks = read_chunks()
+    try:
+        first = next(chunks)
+    except StopIteration:
+        # Not left to propagate, as it would end a generator calling this function without any error
+        raise ValueError('The source produced no rows: %r' % (source,)) from None
+    chunks = itertools.chain([first], chunks)
+    vars = list(first.columns if vars is None else vars)
+    all_vars = list(dict.fromkeys(vars + ([hue] if hue is not None else [])))
+    categorical_vars = [var for var in all_vars if var in categories or is_categorical(first[var])]
+    numeric_vars = [var for var in all_vars if var not in categorical_vars]
+
+    # Reading ranges and categories, if not all given
+    ##################################################
+    missing = [var for var in numeric_vars if var not in ranges] + \
+              [var for var in categorical_vars if var not in categories]
+    if missing:
+        if not reusable:
+            raise ValueError("A one-shot iterator of chunks can only be read once: give ranges and categories for %s, "
+                             "or pass a file path or a function returning chunks" % missing)
+        scanned_ranges, scanned_categories = scan_chunks(chunks, numeric_vars, categorical_vars)
+        ranges = {**scanned_ranges, **ranges}
+        categories = {**scanned_categories, **categories}
+        chunks = read_chunks()
+
+    # Accumulating histograms and coefficient statistics
+    #####################################################
+    edges = {var: categorical_edges(len(categories[var])) if var in categorical_vars
+             else numeric_edges(*ranges[var], bins) for var in vars}
+    n_hue = 1 if hue is None else len(categories[hue])
+    diag_hists = {var: np.zeros((n_hue, len(edges[var]) - 1), dtype=np.int64) for var in vars}
+    lower_hists = {(vars[j], vars[i]): np.zeros((n_hue, len(edges[vars[j]]) - 1, len(edges[vars[i]]) - 1),
+                                                dtype=np.int64)
+                   for i in range(len(vars)) for j in range(i)}
+    stats = AssociationStats(vars, {var: categories[var] for var in vars if var in categorical_vars})
+    for chunk in chunks:
+        cache = BinningCache(chunk, hue, bins, categories={var: categories[var] for var in categorical_vars},
+                             edges=edges)
+        with phase('binning', cell='grid', rows=len(chunk)):
+            for var, hist in diag_hists.items():
+                hist += cache.hist1d(var)
+            for (x_var, y_var), hist in lower_hists.items():
+                hist += cache.hist2d(x_var, y_var)
+        with phase('coefficient', cell='grid', rows=len(chunk)):
+            cache.update_stats(stats)
+
+    # Drawing the grid from the accumulated statistics
+    ###################################################
+    empty = pd.DataFrame({var: pd.Categorical([], categories=categories[var]) if var in categorical_vars
+                          else pd.Series([], dtype=float) for var in all_vars})
+    hue_order = None if hue is None else categories[hue]
+    grid = sns.PairGrid(empty, hue=hue, hue_order=hue_order, vars=vars, diag_sharey=False)
+    payloads = {('diag', var): {'kind': 'hist1d', 'counts': hist, 'edges': edges[var]}
+                for var, hist in diag_hists.items()}
+    payloads.update({('lower', x_var, y_var): {'kind': 'hist2d', 'counts': hist, 'x_edges': edges[x_var],
+                                               'y_edges': edges[y_var]}
+                     for (x_var, y_var), hist in lower_hists.items()})
+    draw_panels(grid, payloads, stats.matrix(), {var: categories[var] for var in vars if var in categorical_vars},
+                hue=None if hue is None else empty[hue], hue_order=hue_order, color=color, cmap=cmap,
+                palette=palette)
+    if hue is not None:
+        hue_colors = sns.color_palette(palette, n_hue)
+        grid.add_legend(legend_data={str(cat): Patch(color=c) for cat, c in zip(hue_order, hue_colors)}, title=hue)
+    return grid
+
+
+def is_categorical(series: pd.Series) -> bool:
+    """
+    Whether a chunk column is treated as categorical
+    """
+    return isinstance(series.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(series) \
+        or pd.api.types.is_bool_dtype(series)
+
+
+def chunk_reader(source: ChunkSource, chunksize: int = 100_000,
+                 columns: [str] = None) -> tuple[Callable[[], Iterator[pd.DataFrame]], bool]:
+    """
+    Returns a function iterating over the chunks of a source, and whether it can be called more than once
+
+    @param source: CSV or Parquet file path, dataframe, iterable of dataframe chunks, or function returning such an
+    iterator each time it is called
+    @param chunksize: Number of rows per chunk, when reading a file or a dataframe
+    @param columns: Columns to read from files. All if None
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.endswith(('.parquet', '.pq')):
+            return lambda: read_parquet_chunks(path, chunksize, columns), True
+        return lambda: iter(pd.read_csv(path, chunksize=chunksize, usecols=columns)), True
+    if isinstance(source, pd.DataFrame):
+        return lambda: (source.iloc[start:start + chunksize] for start in range(0, max(len(source), 1), chunksize)), \
+            True
+    if callable(source):
+        return lambda: iter(source()), True
+    if iter(source) is not source:
+        # Collections of chunks can be iterated over again
+        return lambda: iter(source), True
+    return lambda: source, False
+
+
+def read_parquet_chunks(path: str, chunksize: int, columns: [str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Iterates over the record batches of a Parquet file, as dataframes of compact columns, see as_frame. Requires
+    pyarrow.
+    """
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        yield as_frame(batch)
+
+
+def scan_chunks(chunks: Iterable[pd.DataFrame], numeric_vars: [str],
+                categorical_vars: [str]) -> tuple[dict[str, tuple[float, float]], dict[str, pd.Index]]:
+    """
+    Reads the range of numeric variables and the categories of categorical variables over all chunks.
+
+    Categories keep their order if every chunk holds them as a categorical column, else they are sorted.
+
+    @param chunks: Iterable of dataframe chunks
+    @param numeric_vars: Numeric variable names
+    @param categorical_vars: Categorical variable names
+    @return: Ranges and categories, by variable name
+    """
+    mins, maxs = {var: np.inf for var in numeric_vars}, {var: -np.inf for var in numeric_vars}
+    seen = {var: {} for var in categorical_vars}  # Dicts keep insertion order
+    ordered = {var: True for var in categorical_vars}
+    for chunk in chunks:
+        for var in numeric_vars:
+            values = chunk[var].to_numpy(dtype=float)
+            if np.isfinite(values).any():
+                mins[var] = min(mins[var], np.nanmin(values[np.isfinite(values)]))
+                maxs[var] = max(maxs[var], np.nanmax(values[np.isfinite(values)]))
+        for var in categorical_vars:
+            if isinstance(chunk[var].dtype, pd.CategoricalDtype):
+                seen[var].update(dict.fromkeys(chunk[var].cat.categories))
+            else:
+                ordered[var] = False
+                seen[var].update(dict.fromkeys(chunk[var].dropna().unique()))
+    ranges = {var: (mins[var], maxs[var]) if mins[var] <= maxs[var] else (0., 1.) for var in numeric_vars}
+    categories = {}
+    for var in categorical_vars:
+        values = list(seen[var])
+        if not ordered[var]:
+            try:
+                values = sorted(values)
+            except TypeError:
+                pass
+        categories[var] = pd.Index(values)
+    return ranges, categories
@@ -0,0 +1,27 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    yield
+    plt.close('all')
+
+
+@pytest.fixture
+def mixed():
+    """
+    Two numeric variables, a categorical one and a hue, 600 rows
+    """
+    rng = np.random.default_rng(0)
+    n = 600
+    a = rng.uniform(0, 1, n)
+    return pd.DataFrame({'a': a, 'b': a + rng.normal(scale=.5, size=n),
+                         'c': pd.Categorical(rng.choice(list('xyz'), n)),
+                         'h': pd.Categorical(rng.choice(list('pq'), n), categories=list('pq'))})
@@ -0,0 +1,26 @@
+import matplotlib
+import matplotlib.pyplot as plt
+import pytest
+
+from multiplot import render_groups
+
+PLOTS = {'pairplot': dict(vars=['a', 'b'], hue='h'), 'parallelplot': dict(hue='h')}
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_render_groups(mixed, n_jobs):
+    opened = plt.figure()
+    backend = matplotlib.get_backend()
+    report = render_groups(mixed[['a', 'b', 'c', 'h']], by='c', plots=PLOTS, n_jobs=n_jobs)
+
+    assert report['status'].tolist() == ['ok'] * 6
+    assert report['image'].map(lambda image: image[:8] == b'\x89PNG\r\n\x1a\n').all()
+    # The pyplot state of the caller is left as it was
+    assert matplotlib.get_backend() == backend
+    assert plt.get_fignums() == [opened.number]
+
+
+def test_render_groups_reports_failures(mixed):
+    report = render_groups(mixed, by='c', plots={'pairplot': dict(vars=['a', 'missing'])}, n_jobs=1)
+    assert report['status'].tolist() == ['error'] * 3
+    assert report['error'].str.contains('missing').all()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from multiplot import pairplot, pairplot_quali
+from multiplot.matrixplot import matrixplot
+
+
+@pytest.fixture
+def labelled():
+    """
+    A categorical variable of 6 categories, one of which is literally 'other', and a numeric one
+    """
+    rng = np.random.default_rng(0)
+    n = 300
+    categories = ['other', 'u', 'v', 'w', 'x', 'y']
+    return pd.DataFrame({'k': pd.Categorical(rng.choice(categories, n, p=[.5, .2, .1, .1, .05, .05])),
+                         'a': rng.normal(size=n)})
+
+
+def test_other_label_colliding_with_a_category(labelled):
+    with pytest.raises(ValueError, match='other_label'):
+        pairplot(labelled, max_categories=3)
+    grid = pairplot(labelled, max_categories=3, other_label='rest', density=True)
+    categories = grid.data['k'].cat.categories.tolist()
+    assert len(categories) == 4 and categories[0] == 'other' and categories[-1] == 'rest'
+
+    heights = [bar.get_height() for bar in grid.diag_axes[0].containers[0]]
+    # Rows of the folded categories are counted in 'rest' again
+    grid.update(labelled)
+    updated = [bar.get_height() for bar in grid.diag_axes[0].containers[0]]
+    np.testing.assert_array_equal(updated, np.multiply(heights, 2))
+
+
+def test_other_label_of_every_entry_point(labelled):
+    labelled = labelled.assign(j=labelled['k'])
+    grid = pairplot_quali(labelled, max_categories=3, other_label='rest')
+    assert grid.data['k'].cat.categories[-1] == 'rest'
+    matrix = matrixplot(labelled, max_categories=3, other_label='rest')
+    assert list(matrix.x_vars) == ['k', 'a', 'j']
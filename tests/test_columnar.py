@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from multiplot import association_matrix
+from multiplot.columnar import as_frame
+
+@pytest.fixture
+def pa():
+    return pytest.importorskip('pyarrow')
+
+
+def chunked(pa, values: list, chunks: int, type=None):
+    bounds = np.linspace(0, len(values), chunks + 1).astype(int)
+    return pa.chunked_array([pa.array(values[start:stop], type=type) for start, stop in zip(bounds[:-1], bounds[1:])],
+                            type=type)
+
+
+@pytest.mark.parametrize('chunks', [1, 3])
+def test_arrow_strings_are_coded_in_sorted_order(pa, chunks):
+    # Later chunks hold values absent from the first one
+    values = ['b', 'a', 'b', 'c', None, 'a', 'e', 'd', 'e']
+    column = as_frame(pa.table({'s': chunked(pa, values, chunks)}))['s']
+    assert isinstance(column.dtype, pd.CategoricalDtype)
+    assert list(column.cat.categories) == ['a', 'b', 'c', 'd', 'e']
+    assert column.tolist()[:4] == ['b', 'a', 'b', 'c'] and column.tolist()[5:] == values[5:]
+    assert column.isna().tolist() == [value is None for value in values]
+
+
+@pytest.mark.parametrize('chunks', [1, 3])
+def test_arrow_dictionaries_are_unified(pa, chunks):
+    values = ['x', 'y', None, 'z', 'x', 'w']
+    bounds = np.linspace(0, len(values), chunks + 1).astype(int)
+    # Each chunk with its own dictionary
+    arrays = [pa.array(values[start:stop]).dictionary_encode() for start, stop in zip(bounds[:-1], bounds[1:])]
+    column = as_frame(pa.table({'d': pa.chunked_array(arrays)}))['d']
+    assert isinstance(column.dtype, pd.CategoricalDtype)
+    assert set(column.cat.categories) == {'w', 'x', 'y', 'z'}
+    assert column.astype(object).where(column.notna(), None).tolist() == values
+
+
+@pytest.mark.parametrize('chunks', [1, 3])
+def test_arrow_integers_are_float32(pa, chunks):
+    values = [1, 5, None, 7, 2, 3]
+    column = as_frame(pa.table({'i': chunked(pa, values, chunks, pa.int64())}))['i']
+    assert column.dtype == np.float32
+    np.testing.assert_array_equal(column.to_numpy(), [1, 5, np.nan, 7, 2, 3])
+
+
+@pytest.mark.parametrize('chunks', [1, 3])
+def test_arrow_floats_keep_nulls_as_nan(pa, chunks):
+    values = [.5, None, 1.5, 2., None, 3.]
+    column = as_frame(pa.table({'f': chunked(pa, values, chunks, pa.float64())}))['f']
+    assert column.dtype == np.float64
+    np.testing.assert_array_equal(column.to_numpy(), [.5, np.nan, 1.5, 2., np.nan, 3.])
+
+
+def test_arrow_float_single_chunk_is_not_copied(pa):
+    array = pa.array(np.arange(6, dtype=float))
+    values = as_frame(pa.table({'f': array}))['f'].to_numpy()
+    assert np.shares_memory(values, array.to_numpy())
+
+
+def test_arrow_table_matches_dataframe(pa, mixed):
+    table = pa.Table.from_pandas(mixed.astype({'c': str, 'h': str}), preserve_index=False)
+    pd.testing.assert_frame_equal(association_matrix(table, ['a', 'b', 'c']),
+                                  association_matrix(mixed, ['a', 'b', 'c']), check_exact=False)
+
+
+def test_structured_array_matches_dataframe(mixed):
+    array = np.zeros(len(mixed), dtype=[('a', 'f8'), ('b', 'f4'), ('c', 'U1')])
+    for var in ('a', 'b', 'c'):
+        array[var] = mixed[var].to_numpy()
+    pd.testing.assert_frame_equal(association_matrix(array, ['a', 'b', 'c']),
+                                  association_matrix(mixed, ['a', 'b', 'c']), check_exact=False, rtol=1e-5)
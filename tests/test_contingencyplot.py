@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from multiplot.contingencyplot import category_codes, hue_jitter
+
+
+class ConstantGenerator:
+    """
+    Stands for a random generator drawing a single value, so that jitter returns the bounds of hue shares
+    """
+
+    def __init__(self, value: float):
+        self.value = value
+
+    def random(self, size: int) -> np.ndarray:
+        return np.full(size, self.value)
+
+
+def pivot_bounds(x: pd.Series, y: pd.Series, hue: pd.Series, square_len: float) -> pd.DataFrame:
+    """
+    Bounds of the hue share of each point, computed with a pivot table as contingency plots used to
+    """
+    data = pd.concat([x, y, hue], axis=1)
+    ptable = pd.pivot_table(data=data.reset_index(), values='index', index=[x.name, y.name], columns=hue.name,
+                            aggfunc='count', observed=True).fillna(0)
+    ptable = square_len * ptable.div(ptable.sum(axis=1), axis=0)
+    ptable_max = ptable.cumsum(axis=1) - square_len / 2
+    ptable_min = ptable_max.shift(periods=1, axis=1).fillna(-square_len / 2)
+    bounds = pd.concat([ptable_min.stack().rename('min'), ptable_max.stack().rename('max')], axis=1)
+    return data.join(bounds, on=[x.name, y.name, hue.name])[['min', 'max']]
+
+
+@pytest.mark.parametrize('n_categories', [4, 3000])
+def test_hue_jitter_matches_pivot_layout(n_categories):
+    # 3000 categories per variable: more (x, y) cells than points, which are then renumbered
+    rng = np.random.default_rng(0)
+    n = 2000
+    categories = ['v%d' % k for k in range(n_categories)]
+    x = pd.Series(pd.Categorical(rng.choice(categories, n), categories=categories), name='x')
+    y = pd.Series(pd.Categorical(rng.choice(categories, n), categories=categories), name='y')
+    hue = pd.Series(pd.Categorical(rng.choice(list('pqr'), n, p=[.5, .3, .2]), categories=list('pqr')), name='hue')
+    codes = category_codes(x), category_codes(y), category_codes(hue)
+
+    expected = pivot_bounds(x, y, hue, .5)
+    np.testing.assert_allclose(hue_jitter(*codes, .5, ConstantGenerator(0.)), expected['min'], atol=1e-12)
+    np.testing.assert_allclose(hue_jitter(*codes, .5, ConstantGenerator(1.)), expected['max'], atol=1e-12)
+
+
+def test_hue_jitter_of_missing_codes():
+    x_codes, y_codes, hue_codes = np.array([0, -1, 1, 1]), np.array([0, 0, -1, 1]), np.array([0, 0, 0, -1])
+    noise = hue_jitter(x_codes, y_codes, hue_codes, .5, np.random.default_rng(0))
+    assert np.isnan(noise[1:]).all() and -.25 <= noise[0] <= .25
@@ -0,0 +1,17 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+PLOTTING = ['matplotlib', 'seaborn', 'scipy']
+
+
+@pytest.mark.parametrize('statement', ['import multiplot', 'from multiplot import association_matrix',
+                                       'from multiplot import association_significance',
+                                       'from multiplot.binning import BinningCache'])
+def test_numeric_imports_load_no_plotting_library(statement):
+    probe = '%s\nimport json, sys\nprint(json.dumps([name for name in %r if name in sys.modules]))' % (statement,
+                                                                                                      PLOTTING)
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+    assert json.loads(output) == []
@@ -0,0 +1,76 @@
+import warnings
+
+import matplotlib as mpl
+import numpy as np
+import pandas as pd
+import pytest
+
+from multiplot import pairplot
+
+VARS = ['a', 'b', 'c']
+
+
+def diag_heights(grid, i: int) -> np.ndarray:
+    return np.array([[bar.get_height() for bar in bars] for bars in grid.diag_axes[i].containers])
+
+
+def mesh_counts(grid, i: int, j: int) -> np.ndarray:
+    return np.array([np.ma.filled(mesh.get_array(), 0) for mesh in grid.axes[i, j].collections])
+
+
+@pytest.mark.parametrize('hue', [None, 'h'])
+def test_update_matches_full_redraw(mixed, hue):
+    history, new_rows = mixed[:300], mixed[300:]
+    # New rows within the range of the history, so that both grids share their bins
+    new_rows = new_rows[new_rows['a'].between(history['a'].min(), history['a'].max())
+                        & new_rows['b'].between(history['b'].min(), history['b'].max())]
+    grid = pairplot(history, vars=VARS, hue=hue, density=True)
+    grid.update(new_rows)
+    full = pairplot(pd.concat([history, new_rows]), vars=VARS, hue=hue, density=True)
+
+    pd.testing.assert_frame_equal(grid.association_matrix, full.association_matrix)
+    for i in range(len(VARS)):
+        np.testing.assert_array_equal(diag_heights(grid, i), diag_heights(full, i))
+        for j in range(i):
+            np.testing.assert_array_equal(mesh_counts(grid, i, j), mesh_counts(full, i, j))
+
+
+@pytest.mark.parametrize('options', [dict(), dict(density=True), dict(render='raster')])
+def test_update_extends_bins_to_new_values(mixed, options):
+    grid = pairplot(mixed[:500], vars=VARS, hue='h', **options)
+    new_rows = mixed[500:].assign(a=lambda data: data['a'] + 2)
+    grid.update(new_rows)
+
+    assert diag_heights(grid, 0).sum() == len(mixed)
+    assert grid.diag_axes[0].get_xlim()[1] >= new_rows['a'].max()
+    full = pairplot(pd.concat([mixed[:500], new_rows]), vars=VARS, hue='h')
+    pd.testing.assert_frame_equal(grid.association_matrix, full.association_matrix)
+    if options.get('density'):
+        assert mesh_counts(grid, 1, 0).sum() == len(mixed)
+    if options.get('render') == 'raster':
+        assert grid.axes[1, 0].images[0].get_extent()[1] >= new_rows['a'].max()
+
+
+def test_update_warns_beyond_maximum_widening(mixed):
+    grid = pairplot(mixed, vars=['a', 'b'], density=True)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        grid.update(mixed.assign(a=lambda data: data['a'] + 1000)[['a', 'b']])
+    assert any('left out' in str(warning.message) for warning in caught)
+
+
+def test_update_from_structured_array(mixed):
+    grid = pairplot(mixed, vars=['a', 'b'], density=True)
+    new_rows = np.zeros(10, dtype=[('a', 'f8'), ('b', 'f8')])
+    new_rows['a'], new_rows['b'] = .5, .5
+    grid.update(new_rows)
+    assert diag_heights(grid, 0).sum() == len(mixed) + 10
+
+
+@pytest.mark.parametrize('options', [dict(), dict(density=True)])
+def test_update_keeps_coefficient_colors(mixed, options):
+    grid = pairplot(mixed[:300], vars=VARS, coef_cmap='viridis', **options)
+    grid.update(mixed[300:])
+    coef = grid.association_matrix.loc['b', 'a']
+    expected = mpl.cm.ScalarMappable(norm=mpl.colors.Normalize(-1, 1), cmap='viridis').to_rgba(coef)
+    np.testing.assert_allclose(grid.axes[0, 1].patches[-1].get_facecolor(), expected)
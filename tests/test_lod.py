@@ -0,0 +1,100 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import pytest
+from matplotlib.backend_bases import CloseEvent
+
+from multiplot import pairplot
+from multiplot.contingencyplot import contingencyplot
+from multiplot.lod import ZoomScatter
+
+
+def zoom_scatters(ax: plt.Axes) -> [ZoomScatter]:
+    return [scatter for scatter in map(ZoomScatter.of, ax.collections) if scatter is not None]
+
+
+@pytest.mark.parametrize('lod', [True, False, 0, -1, 2.5, '100'])
+def test_invalid_lod_is_rejected(mixed, lod):
+    with pytest.raises(ValueError, match='lod'):
+        pairplot(mixed, vars=['a', 'c'], lod=lod)
+    with pytest.raises(ValueError, match='lod'):
+        contingencyplot(mixed['c'], mixed['a'], lod=lod)
+    with pytest.raises(ValueError, match='max_points'):
+        ZoomScatter(mixed['a'], mixed['b'], max_points=lod)
+
+
+def test_pairplot_draws_zoomable_cells(mixed):
+    grid = pairplot(mixed, vars=['a', 'c'], hue='h', lod=np.int64(100))
+    scatters = zoom_scatters(grid.axes[1, 0])
+    assert len(scatters) == 1 and scatters[0].max_points == 100
+    assert len(scatters[0].points.get_offsets()) <= 100
+
+
+def test_view_is_capped_then_complete_when_zoomed_in():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=(2, 100_000))
+    scatter = ZoomScatter(x, y, max_points=500, ax=plt.figure().add_subplot(), rng=rng)
+    overview = scatter.points.get_offsets()
+    assert 0 < len(overview) <= 500
+
+    scatter.ax.set_xlim(-.05, .05)
+    scatter.ax.set_ylim(-.05, .05)
+    inside = (np.abs(x) <= .05) & (np.abs(y) <= .05)
+    assert 0 < inside.sum() <= 500
+    np.testing.assert_array_equal(np.sort(scatter.points.get_offsets()[:, 0]), np.sort(x[inside]))
+
+
+def test_empty_and_missing_points():
+    ax = plt.figure().add_subplot()
+    scatter = ZoomScatter(np.full(10, np.nan), np.arange(10.), max_points=5, ax=ax)
+    assert len(scatter.points.get_offsets()) == 0
+    scatter.append([1., 2.], [3., 4.])
+    assert len(scatter.points.get_offsets()) == 2
+    assert len(ZoomScatter(np.empty(0), np.empty(0), max_points=5, ax=ax).points.get_offsets()) == 0
+
+
+def test_appended_points_are_drawn():
+    ax = plt.figure().add_subplot()
+    scatter = ZoomScatter(np.arange(10.), np.arange(10.), np.zeros(10, dtype=int), ['r', 'b'], max_points=50, ax=ax)
+    scatter.append(np.arange(10., 20.), np.arange(10., 20.), np.ones(10, dtype=int))
+    assert len(scatter.points.get_offsets()) == 20
+    assert len(np.unique(scatter.points.get_facecolors(), axis=0)) == 2
+
+
+def test_disconnected_scatter_stops_refreshing():
+    rng = np.random.default_rng(0)
+    ax = plt.figure().add_subplot()
+    scatter = ZoomScatter(*rng.normal(size=(2, 10_000)), max_points=100, ax=ax)
+    scatter.disconnect()
+    drawn = scatter.points.get_offsets().copy()
+    ax.set_xlim(-.1, .1)
+    np.testing.assert_array_equal(scatter.points.get_offsets(), drawn)
+    assert not ax.callbacks.callbacks.get('xlim_changed')
+
+
+def test_removed_scatter_is_disconnected():
+    rng = np.random.default_rng(0)
+    scatter = ZoomScatter(*rng.normal(size=(2, 10_000)), max_points=100, ax=plt.figure().add_subplot())
+    scatter.points.remove()
+    scatter.ax.set_xlim(-.1, .1)
+    assert scatter._callbacks == [] and scatter.view[0] != (-.1, .1)
+    assert not scatter.ax.callbacks.callbacks.get('xlim_changed')
+
+
+def test_closed_figure_is_disconnected():
+    rng = np.random.default_rng(0)
+    ax = plt.figure().add_subplot()
+    scatter = ZoomScatter(*rng.normal(size=(2, 10_000)), max_points=100, ax=ax)
+    # Agg canvases are never shown, hence never closed by a window: the event is sent as a window would
+    CloseEvent('close_event', ax.figure.canvas)._process()
+    assert scatter._callbacks == []
+    assert not ax.callbacks.callbacks.get('xlim_changed')
+    assert not ax.figure.canvas.callbacks.callbacks.get('close_event')
+
+
+def test_cleared_axis_stops_refreshing():
+    rng = np.random.default_rng(0)
+    scatter = ZoomScatter(*rng.normal(size=(2, 10_000)), max_points=100, ax=plt.figure().add_subplot())
+    view = scatter.view
+    scatter.ax.cla()
+    scatter.ax.set_xlim(-.1, .1)
+    assert scatter.view == view
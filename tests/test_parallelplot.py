@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import pytest
+from matplotlib.path import Path
+
+from multiplot import parallelplot
+from multiplot.parallelplot import bezier_curves, compound_paths
+
+
+@pytest.mark.parametrize('hue', ['h', 'a'])
+def test_bezier_rows_are_drawn_by_compound_paths(mixed, hue):
+    ax = plt.figure().add_subplot()
+    parallelplot(mixed[['a', 'b', 'h']].assign(e=mixed['b'] ** 2), hue=hue, bezier=True, ax=ax)
+    lines, = ax.collections
+    paths = lines.get_paths()
+    assert len(paths) < len(mixed)
+    assert sum((path.codes == Path.MOVETO).sum() for path in paths) == len(mixed)
+    # Curves of each path share its color
+    colors = {tuple(color) for color in lines.get_edgecolors()}
+    assert len(colors) <= (2 if hue == 'h' else 256)
+
+
+def test_compound_paths_keep_rows_and_colors():
+    rng = np.random.default_rng(0)
+    vertices, codes = bezier_curves(rng.normal(size=(50, 3)))
+    row_colors = np.array([[1., 0, 0, 1], [0, 0, 1., 1]])[rng.integers(2, size=50)]
+    paths, path_colors = compound_paths(vertices, codes, row_colors, rows_per_path=8)
+
+    assert all(len(path.vertices) <= 8 * len(codes) for path in paths)
+    for color in row_colors:
+        rows = vertices[(row_colors == color).all(axis=1)].reshape(-1, 2)
+        drawn = [path.vertices for path, path_color in zip(paths, path_colors) if (path_color == color).all()]
+        np.testing.assert_array_equal(np.concatenate(drawn), rows)
+    assert compound_paths(vertices[:0], codes, row_colors[:0])[0] == []
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from multiplot import association_significance
+
+
+def test_significance_does_not_depend_on_n_jobs(mixed):
+    # Chunks of 25 resamples: several tasks, spread over the workers
+    options = dict(vars=['a', 'b', 'c', 'h'], n_resamples=99, seed=0, chunk_size=25 * len(mixed) * 2)
+    serial = association_significance(mixed, n_jobs=1, **options)
+    parallel = association_significance(mixed, n_jobs=2, **options)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert len(serial) == 6 and serial['p_value'].between(.01, 1).all()
+
+
+def test_significance_depends_on_seed(mixed):
+    options = dict(vars=['a', 'b', 'c'], n_resamples=99)
+    first = association_significance(mixed, seed=0, **options)
+    pd.testing.assert_frame_equal(first, association_significance(mixed, seed=0, **options))
+    assert not np.allclose(first['ci_low'], association_significance(mixed, seed=1, **options)['ci_low'])
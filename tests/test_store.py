@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from multiplot import pairplot
+from multiplot.store import PanelStore, fingerprint
+
+
+def stored_files(store: PanelStore) -> [str]:
+    return sorted(name for name in os.listdir(store.directory) if name.endswith('.npz'))
+
+
+def test_payload_round_trip(tmp_path):
+    store = PanelStore(tmp_path)
+    payload = {'counts': np.arange(12, dtype=np.int64).reshape(3, 4), 'coef': .25, 'kind': 'hist2d', 'n': 7}
+    store.save('cell', payload)
+    loaded = store.load('cell')
+    assert loaded.keys() == payload.keys()
+    np.testing.assert_array_equal(loaded['counts'], payload['counts'])
+    assert (loaded['coef'], loaded['kind'], loaded['n']) == (.25, 'hist2d', 7)
+    assert store.load('missing') is None
+
+
+def test_memoize_computes_missing_payloads_only(tmp_path):
+    store = PanelStore(tmp_path)
+    fingerprints = {'a': 'fa', 'b': 'fb', 'c': 'fc'}
+    computed = []
+
+    def compute(tasks):
+        computed.append([task['key'] for task in tasks])
+        return [{'total': np.array([len(task['x'])])} for task in tasks]
+
+    first = [{'key': 1, 'kind': 'hist1d', 'x': 'a'}, {'key': 2, 'kind': 'hist1d', 'x': 'b'}]
+    store.memoize(first, fingerprints, compute)
+    # Same computation of b under another grid key, and a new one of c
+    payloads = store.memoize([{'key': 3, 'kind': 'hist1d', 'x': 'b'}, {'key': 4, 'kind': 'hist1d', 'x': 'c'}],
+                             fingerprints, compute)
+    assert computed == [[1, 2], [4]]
+    assert len(payloads) == 2 and len(stored_files(store)) == 3
+
+
+def test_least_recently_used_payloads_are_evicted(tmp_path):
+    payload = {'counts': np.zeros(1000)}
+    store = PanelStore(tmp_path)
+    for time, key in enumerate(['old', 'used', 'new']):
+        store.save(key, payload)
+        os.utime(store.path(key), (time, time))
+    size = os.path.getsize(store.path('old'))
+    # Reading a payload marks it as the most recently used
+    store.load('used')
+    store.max_bytes = 2 * size
+    store.evict()
+    assert stored_files(store) == ['new.npz', 'used.npz']
+    store.max_bytes = 0
+    store.evict()
+    assert stored_files(store) == []
+
+
+def test_fingerprint_ignores_names_not_values():
+    values = pd.Series([1., 2., 3.], name='a')
+    assert fingerprint(values) == fingerprint(values.rename('b'))
+    assert fingerprint(values) != fingerprint(values + 1)
+    categorical = values.astype('category')
+    assert fingerprint(categorical) != fingerprint(categorical.cat.rename_categories([3., 2., 1.]))
+
+
+def test_stored_grid_is_redrawn_with_another_style(mixed, tmp_path):
+    store = PanelStore(tmp_path)
+    options = dict(vars=['a', 'b', 'c'], hue='h', density=True, store=store)
+    grid = pairplot(mixed, palette='Set1', **options)
+    files = stored_files(store)
+    computed = []
+    memoize = store.memoize
+    store.memoize = lambda tasks, fingerprints, compute: memoize(
+        tasks, fingerprints, lambda missing: computed.extend(missing) or compute(missing))
+    restyled = pairplot(mixed, palette='Set2', cmap='Blues', **options)
+
+    assert files and stored_files(store) == files and computed == []
+    pd.testing.assert_frame_equal(grid.association_matrix, restyled.association_matrix)
+    for i in range(3):
+        for j in range(i):
+            assert len(grid.axes[i, j].collections) == len(restyled.axes[i, j].collections) > 0
+            for mesh, restyled_mesh in zip(grid.axes[i, j].collections, restyled.axes[i, j].collections):
+                np.testing.assert_array_equal(np.ma.filled(mesh.get_array(), 0),
+                                              np.ma.filled(restyled_mesh.get_array(), 0))
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from multiplot import pairplot, pairplot_chunked
+
+
+@pytest.mark.parametrize('source', [lambda: iter([]), lambda: []])
+def test_empty_source_is_rejected(source):
+    with pytest.raises(ValueError, match='no rows'):
+        pairplot_chunked(source(), vars=['a', 'b'])
+    with pytest.raises(ValueError, match='no rows'):
+        pairplot_chunked(source, vars=['a', 'b'])
+
+
+def test_chunks_match_whole_table(mixed):
+    grid = pairplot_chunked(lambda: (mixed[start:start + 100] for start in range(0, len(mixed), 100)),
+                            vars=['a', 'b', 'c'], hue='h', chunksize=100)
+    full = pairplot(mixed, vars=['a', 'b', 'c'], hue='h', density=True)
+    np.testing.assert_allclose(grid.association_matrix, full.association_matrix, atol=1e-12)